@@ -0,0 +1,143 @@
+"""Structured, non-blocking logging.
+
+Modules log with ``logging.getLogger(__name__)`` and pass context fields
+through ``extra``::
+
+    logger.info('Bid placed', extra={'fund_id': 3, 'round_id': 7, 'user_id': 12})
+
+``init_app`` routes every record through a QueueHandler, so request threads
+only enqueue. A single QueueListener thread formats the records, as one JSON
+object per line (or plain text with LOG_FORMAT=text), and writes them to
+stdout. DEBUG records are sampled at LOG_DEBUG_SAMPLE_RATE. Each request
+also emits one ``request`` record with the route, status and duration_ms.
+
+Settings: LOG_LEVEL (INFO), LOG_FORMAT (json), LOG_DEBUG_SAMPLE_RATE (0.01),
+LOG_REQUESTS (true).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from flask import g, request, session
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+_queue_handler = None
+
+def record_fields(record):
+    """The `extra` fields attached to a record"""
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message and extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Readable lines for local development, with fields as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def formatMessage(self, record):
+        # Fields go on the first line, before any traceback
+        line = super().formatMessage(record)
+        fields = record_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+class DebugSampler(logging.Filter):
+    """Let through only a fraction of DEBUG records; other levels always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Keep extra fields and exc_info for the formatter; only resolve the
+        # message now, as the arguments may change after we return
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def _stop_listener():
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+def configure(level='INFO', fmt='json', debug_sample_rate=0.01):
+    """Install the queue handler on the root logger (replacing an earlier one)"""
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    _stop_listener()
+    if _queue_handler:
+        root.removeHandler(_queue_handler)
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _EnqueueHandler(log_queue)
+    _queue_handler.addFilter(DebugSampler(debug_sample_rate))
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+atexit.register(_stop_listener)
+
+request_logger = logging.getLogger('request')
+
+def init_app(app):
+    configure(
+        level=app.config['LOG_LEVEL'],
+        fmt=app.config['LOG_FORMAT'],
+        debug_sample_rate=app.config['LOG_DEBUG_SAMPLE_RATE']
+    )
+    if not app.config['LOG_REQUESTS']:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        request_logger.info('request', extra={
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'user_id': session.get('user_id'),
+        })
+        return response
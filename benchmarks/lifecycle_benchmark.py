@@ -0,0 +1,285 @@
+"""Load test of the whole chit-fund lifecycle through the real routes.
+
+Seeds --users members through the models, registers --register more
+through /register, then for each of --funds funds (--fund-size members
+each) drives every round through Flask's test client:
+
+    login -> create_chitfund -> (fund_state, make_payment x members,
+    place_bid x eligible members [the last bid queues settlement],
+    dashboard x members) per round
+
+The final round settles itself when its last payment arrives. Settlement
+jobs run on the app's job workers (or inline with --jobs-inline); the
+benchmark waits for each one outside the timed requests. Every request
+is timed and its SQL statements counted. The report shows p50/p95/p99
+latency, throughput and queries per request for each endpoint.
+
+Usage:
+    python benchmarks/lifecycle_benchmark.py [--users 200] [--funds 10] [--fund-size 5]
+        [--uri sqlite:///bench.db] [--output results.json] [--compare baseline.json]
+
+--uri is dropped and recreated; it defaults to a temporary SQLite file.
+--output writes the results as JSON (with the git revision), and --compare
+prints p50/p95 changes against an earlier --output file.
+"""
+import os
+import sys
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event
+from app import create_app
+from models import db, User
+from passwords import hasher
+import jobs
+
+PASSWORD = 'lifecycle-password'
+CONTRIBUTION = 1000.0
+
+class Recorder:
+    """Latency, status and statement count of every request, by endpoint"""
+
+    def __init__(self):
+        self.samples = {}  # endpoint -> [(ms, queries, status)]
+        self.statements = 0
+        self.thread = threading.get_ident()
+
+    def count_statement(self, *args):
+        # Only the requests' own statements, not the job workers'
+        if threading.get_ident() == self.thread:
+            self.statements += 1
+
+    def call(self, endpoint, send, *args, **kwargs):
+        before = self.statements
+        started = time.perf_counter()
+        response = send(*args, **kwargs)
+        ms = (time.perf_counter() - started) * 1000
+        self.samples.setdefault(endpoint, []).append((ms, self.statements - before, response.status_code))
+        return response
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def seed_users(count):
+    """Bulk insert members sharing one precomputed password hash"""
+    password_hash = hasher.hash(PASSWORD)
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [{
+        'username': f'member{i}',
+        'full_name': f'Member {i}',
+        'mobile_number': f'6{i:09d}',
+        'password_hash': password_hash,
+        'savings_paise': 0,
+        'created_at': now
+    } for i in range(count)])
+    db.session.commit()
+    return [(user_id, username) for user_id, username in db.session.query(User.id, User.username).order_by(User.id)]
+
+def run_fund(app, recorder, members, rng, name):
+    """Drive one fund from creation to its final round"""
+    clients = {}
+    for user_id, username in members:
+        client = app.test_client()
+        response = recorder.call('login', client.post, '/login', data={'username': username, 'password': PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError(f'Login failed for {username}: {response.status_code}')
+        clients[user_id] = client
+
+    creator_id = members[0][0]
+    creator = clients[creator_id]
+    response = recorder.call('create_chitfund', creator.post, '/create-chitfund', json={
+        'name': name,
+        'members': [user_id for user_id, _ in members[1:]],
+        'monthly_contribution': CONTRIBUTION,
+        'duration': len(members)
+    })
+    if response.status_code != 200:
+        raise RuntimeError(f'Fund creation failed: {response.get_json()}')
+    fund_id = response.get_json()['chitfund_id']
+
+    winners = set()
+    pool = CONTRIBUTION * len(members)
+    for round_number in range(1, len(members) + 1):
+        state = recorder.call('fund_state', creator.get, f'/api/fund/{fund_id}/state').get_json()
+        round_id = state['round']['id']
+
+        for user_id, client in clients.items():
+            recorder.call('make_payment', client.post, '/api/make_payment', json={
+                'chitfund_id': fund_id,
+                'round_id': round_id
+            })
+
+        if round_number < len(members):
+            bidders = [user_id for user_id in clients if user_id not in winners]
+            rng.shuffle(bidders)
+            bids = {}
+            for position, user_id in enumerate(bidders):
+                amount = round(pool * rng.uniform(0.5, 0.95), 2)
+                endpoint = 'place_bid (settles round)' if position == len(bidders) - 1 else 'place_bid'
+                response = recorder.call(endpoint, clients[user_id].post, '/api/place_bid', json={
+                    'chitfund_id': fund_id,
+                    'round_id': round_id,
+                    'amount': amount
+                })
+                if response.status_code == 200:
+                    bids[user_id] = amount
+                    job_id = response.get_json().get('job_id')
+                    if job_id:
+                        # Settlement runs on a job worker; wait for it (untimed)
+                        with app.app_context():
+                            if jobs.wait_for(job_id) != 'done':
+                                raise RuntimeError(f'Settlement job {job_id} did not finish')
+            if bids:
+                winners.add(min(bids, key=bids.get))
+
+        for client in clients.values():
+            recorder.call('dashboard', client.get, '/dashboard')
+
+def register_users(app, recorder, count):
+    client = app.test_client()
+    for i in range(count):
+        recorder.call('register', client.post, '/register', data={
+            'username': f'newcomer{i}',
+            'password': PASSWORD,
+            'full_name': f'Newcomer {i}',
+            'mobile_number': f'5{i:09d}'
+        })
+
+def summarize(recorder, wall_seconds):
+    endpoints = {}
+    for endpoint, samples in recorder.samples.items():
+        latencies = [ms for ms, _, _ in samples]
+        queries = [count for _, count, _ in samples]
+        endpoints[endpoint] = {
+            'requests': len(samples),
+            'errors': sum(1 for _, _, status in samples if status >= 400),
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'mean_ms': round(statistics.mean(latencies), 2),
+            'throughput_rps': round(len(samples) / (sum(latencies) / 1000), 1),
+            'queries_mean': round(statistics.mean(queries), 2),
+            'queries_max': max(queries),
+        }
+    total = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        'requests': total,
+        'wall_seconds': round(wall_seconds, 2),
+        'throughput_rps': round(total / wall_seconds, 1),
+        'endpoints': endpoints,
+    }
+
+def print_report(summary, baseline=None):
+    print(f"{'Endpoint':<27} {'Requests':>8} {'Errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'Req/s':>8} {'Queries':>8} {'Max q':>6}")
+    for endpoint, stats in sorted(summary['endpoints'].items()):
+        print(f"{endpoint:<27} {stats['requests']:>8} {stats['errors']:>6} {stats['p50_ms']:>8.2f} "
+              f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['throughput_rps']:>8.1f} "
+              f"{stats['queries_mean']:>8.2f} {stats['queries_max']:>6}")
+    print(f"\n{summary['requests']} requests in {summary['wall_seconds']}s "
+          f"({summary['throughput_rps']} req/s overall)")
+
+    if baseline:
+        print(f"\nChange against {baseline.get('revision') or 'baseline'}:")
+        for endpoint, stats in sorted(summary['endpoints'].items()):
+            before = baseline['results']['endpoints'].get(endpoint)
+            if not before:
+                continue
+            p50 = (stats['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            p95 = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            queries = stats['queries_mean'] - before['queries_mean']
+            print(f"    {endpoint:<27} p50 {p50:+6.1f}%  p95 {p95:+6.1f}%  queries {queries:+.2f}")
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Chit-fund lifecycle load test')
+    parser.add_argument('--users', type=int, default=200, help='Members seeded through the models')
+    parser.add_argument('--register', type=int, default=10, help='Members registered through /register')
+    parser.add_argument('--funds', type=int, default=10)
+    parser.add_argument('--fund-size', type=int, default=5, help='Members (and rounds) per fund')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for members and bids')
+    parser.add_argument('--password-cost', type=int, default=0, help='Hash cost, 0 for the app default')
+    parser.add_argument('--jobs-inline', action='store_true', help='Settle rounds inside place_bid')
+    parser.add_argument('--uri', help='Scratch database URI (dropped and recreated)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Earlier --output file to compare against')
+    args = parser.parse_args()
+    if args.fund_size > args.users:
+        parser.error('--fund-size cannot exceed --users')
+
+    path = None
+    uri = args.uri
+    if not uri:
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        uri = f'sqlite:///{path}'
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'TESTING': True,
+        'LOG_LEVEL': 'WARNING',
+        'PASSWORD_COST': args.password_cost,
+        'JOBS_INLINE': args.jobs_inline
+    })
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+
+    try:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            users = seed_users(args.users)
+            event.listen(db.engine, 'before_cursor_execute', recorder.count_statement)
+
+        started = time.perf_counter()
+        register_users(app, recorder, args.register)
+        for fund in range(args.funds):
+            run_fund(app, recorder, rng.sample(users, args.fund_size), rng, f'Load fund {fund}')
+        summary = summarize(recorder, time.perf_counter() - started)
+    finally:
+        if path:
+            os.remove(path)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(summary, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'recorded_at': datetime.utcnow().isoformat(),
+                'revision': git_revision(),
+                'python': sys.version.split()[0],
+                'database': uri.split(':', 1)[0],
+                'parameters': {
+                    'users': args.users,
+                    'register': args.register,
+                    'funds': args.funds,
+                    'fund_size': args.fund_size,
+                    'seed': args.seed,
+                    'password_cost': args.password_cost,
+                    'jobs_inline': args.jobs_inline,
+                },
+                'results': summary,
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
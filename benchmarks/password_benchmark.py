@@ -0,0 +1,94 @@
+"""Password hashing throughput through the bounded pool.
+
+Simulates a login storm: --clients threads verify a password as fast as they
+can for --seconds. Reports verifications per second, latency percentiles
+and how many attempts were turned away because the queue was full.
+
+Usage:
+    python benchmarks/password_benchmark.py [--algorithm pbkdf2] [--cost 0]
+        [--pool thread] [--workers 2,4] [--max-queue 32] [--clients 32] [--seconds 5]
+
+--workers takes a comma separated list; 0 means hash inline on the client
+thread (the old behaviour, no limit).
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import statistics
+import threading
+import time
+from passwords import PasswordHasher, HashingBusy
+
+PASSWORD = 'benchmark-password'
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def storm(hasher, password_hash, clients, seconds):
+    """Run the login storm and return (latencies in ms, rejected count)"""
+    latencies = []
+    rejected = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    barrier = threading.Barrier(clients)
+
+    def client():
+        barrier.wait()
+        mine, busy = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if not hasher.verify(password_hash, PASSWORD):
+                    raise RuntimeError('Verification failed')
+            except HashingBusy:
+                busy += 1
+                # A real client would back off before retrying
+                time.sleep(0.01)
+                continue
+            mine.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(mine)
+            rejected[0] += busy
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, rejected[0]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Password hashing throughput benchmark')
+    parser.add_argument('--algorithm', default='pbkdf2', choices=['pbkdf2', 'bcrypt'])
+    parser.add_argument('--cost', type=int, default=0, help='0 uses the algorithm default')
+    parser.add_argument('--pool', default='thread', choices=['thread', 'process'])
+    parser.add_argument('--workers', default=f'0,{max(1, (os.cpu_count() or 2) // 2)},{os.cpu_count() or 2}')
+    parser.add_argument('--max-queue', type=int, default=32)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.algorithm} cost={args.cost or 'default'}, {args.pool} pool, "
+          f"{args.clients} clients for {args.seconds:g}s on {os.cpu_count()} CPUs\n")
+    print(f"{'Workers':>8} {'Verify/s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'Rejected':>9}")
+
+    for workers in dict.fromkeys(int(w) for w in args.workers.split(',')):
+        hasher = PasswordHasher()
+        hasher.configure(
+            algorithm=args.algorithm,
+            cost=args.cost,
+            pool=args.pool,
+            workers=workers,
+            max_queue=args.max_queue
+        )
+        password_hash = hasher.hash(PASSWORD)
+        latencies, rejected = storm(hasher, password_hash, args.clients, args.seconds)
+        label = workers if workers else 'inline'
+        print(f"{label:>8} {len(latencies) / args.seconds:>9.1f} "
+              f"{statistics.median(latencies) if latencies else 0:>9.1f} "
+              f"{percentile(latencies, 0.95):>9.1f} {percentile(latencies, 0.99):>9.1f} {rejected:>9}")
@@ -0,0 +1,108 @@
+"""Benchmark the member search index at 100k and 1M users.
+
+Builds the index from synthetic users (no database needed) and reports build
+time, memory and lookup latency for cold and cached prefixes. With
+--compare-sql it also times the old leading-wildcard ILIKE query against an
+SQLite table of the same size.
+
+Usage:
+    python benchmarks/search_benchmark.py [--sizes 100000,1000000] [--compare-sql]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import resource
+import statistics
+import string
+import time
+from search_index import MemberSearchIndex
+
+FIRST_NAMES = ['sita', 'gita', 'radha', 'lakshmi', 'meena', 'kavita', 'sunita', 'anita', 'pooja', 'rekha',
+               'asha', 'usha', 'savitri', 'parvati', 'durga', 'kamala', 'shanti', 'geeta', 'nirmala', 'saroj']
+LAST_NAMES = ['devi', 'kumari', 'sharma', 'verma', 'yadav', 'patel', 'singh', 'gupta', 'das', 'reddy']
+
+def synthetic_users(count, seed=42):
+    rng = random.Random(seed)
+    for user_id in range(1, count + 1):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        suffix = ''.join(rng.choices(string.ascii_lowercase + string.digits, k=5))
+        yield user_id, f'{first}{suffix}', f'{first.title()} {last.title()}', f'9{user_id:09d}'
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def sample_queries(count, seed=7):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            name = rng.choice(FIRST_NAMES)
+            queries.append(name[:rng.randint(3, len(name))])
+        elif kind < 0.8:
+            queries.append(rng.choice(LAST_NAMES)[:3])
+        else:
+            queries.append('9' + ''.join(rng.choices(string.digits, k=rng.randint(2, 6))))
+    return queries
+
+def time_lookups(index, queries):
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, limit=10)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def time_sql(size, queries):
+    import sqlite3
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE user (id INTEGER PRIMARY KEY, username TEXT, full_name TEXT, mobile_number TEXT)')
+    connection.executemany('INSERT INTO user VALUES (?, ?, ?, ?)', synthetic_users(size))
+    samples = []
+    for query in queries:
+        pattern = f'%{query}%'
+        started = time.perf_counter()
+        connection.execute(
+            'SELECT * FROM user WHERE username LIKE ? OR full_name LIKE ? OR mobile_number LIKE ? LIMIT 10',
+            (pattern, pattern, pattern)
+        ).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    connection.close()
+    return samples
+
+def report(label, samples):
+    print(f"    {label:14} p50 {statistics.median(samples):8.3f} ms   p99 {percentile(samples, 0.99):8.3f} ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the member search index')
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--compare-sql', action='store_true', help='Also time the ILIKE query on SQLite')
+    args = parser.parse_args()
+
+    for size in [int(size) for size in args.sizes.split(',')]:
+        index = MemberSearchIndex()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        index.bulk_add(synthetic_users(size))
+        build_seconds = time.perf_counter() - started
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Skip the database refresh; the index was filled directly
+        index._loaded = True
+        index._refreshed_at = float('inf')
+
+        queries = sample_queries(args.queries)
+        print(f"{size:,} users: {len(index):,} terms, built in {build_seconds:.2f} s, "
+              f"peak RSS grew {(rss_after - rss_before) / 1024:.0f} MB")
+        index.cache_ttl = 0
+        report('uncached', time_lookups(index, queries))
+        index.cache_ttl = 30
+        time_lookups(index, queries)
+        report('cached', time_lookups(index, queries))
+        if args.compare_sql:
+            report('sqlite ILIKE', time_sql(size, queries[:200]))
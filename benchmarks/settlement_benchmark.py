@@ -0,0 +1,124 @@
+"""Time round settlement for funds with 50 to 500 members.
+
+Usage:
+    python benchmarks/settlement_benchmark.py [--uri sqlite:///bench.db] [--sizes 50,100,250,500]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from datetime import datetime
+from sqlalchemy import event
+from app import create_app
+from money import to_paise
+from models import db, User, ChitFund, Round, Bid, Payment, chitfund_members
+from settlement import settle_round
+
+CONTRIBUTION = 1000.0
+
+def seed_fund(member_count):
+    """Create a fund whose first round is fully paid and fully bid"""
+    now = datetime.utcnow()
+    db.session.execute(User.__table__.insert(), [{
+        'username': f'bench{i}',
+        'full_name': f'Bench Member {i}',
+        'mobile_number': f'7{i:09d}',
+        'savings_paise': 0,
+        'created_at': now
+    } for i in range(member_count)])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+
+    fund = ChitFund(
+        name=f'Bench {member_count}',
+        creator_id=user_ids[0],
+        member_count=member_count,
+        monthly_contribution=CONTRIBUTION,
+        duration=member_count,
+        current_round=1,
+        start_date=now
+    )
+    db.session.add(fund)
+    db.session.flush()
+
+    round = Round(
+        chitfund_id=fund.id,
+        round_number=1,
+        status='bidding',
+        start_date=now,
+        paid_count=member_count,
+        pooled_amount=CONTRIBUTION * member_count,
+        bid_count=member_count,
+        min_bid=CONTRIBUTION * member_count / 2
+    )
+    db.session.add(round)
+    db.session.flush()
+
+    db.session.execute(chitfund_members.insert(), [
+        {'chitfund_id': fund.id, 'user_id': user_id} for user_id in user_ids
+    ])
+    db.session.execute(Payment.__table__.insert(), [{
+        'chitfund_id': fund.id,
+        'round_id': round.id,
+        'user_id': user_id,
+        'amount_paise': to_paise(CONTRIBUTION),
+        'status': 'completed',
+        'payment_date': now,
+        'created_at': now
+    } for user_id in user_ids])
+    db.session.execute(Bid.__table__.insert(), [{
+        'chitfund_id': fund.id,
+        'round_id': round.id,
+        'user_id': user_id,
+        'amount_paise': to_paise(CONTRIBUTION * member_count / 2 + i),
+        'timestamp': now
+    } for i, user_id in enumerate(user_ids)])
+    db.session.commit()
+    return round.id
+
+def run(sizes):
+    statements = []
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    try:
+        results = []
+        for size in sizes:
+            db.drop_all()
+            db.create_all()
+            round_id = seed_fund(size)
+
+            statements.clear()
+            started = time.perf_counter()
+            success, result = settle_round(round_id)
+            elapsed = time.perf_counter() - started
+            if not success:
+                raise RuntimeError(f'Settlement failed for {size} members: {result}')
+
+            # A second call must be a no-op
+            success, again = settle_round(round_id)
+            if not again.get('already_settled'):
+                raise RuntimeError('Second settlement was not detected as a duplicate')
+
+            pending = Payment.query.filter_by(status='pending').count()
+            results.append((size, elapsed * 1000, len(statements), pending))
+        return results
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark round settlement')
+    parser.add_argument('--uri', default='sqlite://', help='Scratch database URI (it is dropped and recreated)')
+    parser.add_argument('--sizes', default='50,100,250,500', help='Comma separated member counts')
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.uri})
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    with app.app_context():
+        print(f"{'Members':>8} {'Time (ms)':>10} {'Statements':>11} {'Next-round payments':>20}")
+        for size, elapsed_ms, statement_count, pending in run(sizes):
+            print(f"{size:>8} {elapsed_ms:>10.2f} {statement_count:>11} {pending:>20}")
@@ -0,0 +1,129 @@
+"""Measure cold-start cost: import time and time to first response.
+
+Every run starts a fresh interpreter, imports the entry point and serves one
+request through plain WSGI (no test client, so werkzeug.test is not counted).
+A separate `-X importtime` run lists the slowest imports.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--entry wsgi] [--path /] [--runs 5] [--output startup.jsonl]
+
+--output appends one JSON line per invocation, so results can be compared
+across releases.
+"""
+import os
+import sys
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+import argparse
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+# Runs inside the child interpreter; prints import and first-response times in ms
+PROBE = '''
+import time
+started = time.perf_counter()
+import importlib, sys
+from wsgiref.util import setup_testing_defaults
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+
+environ = {'PATH_INFO': sys.argv[2], 'REQUEST_METHOD': 'GET'}
+setup_testing_defaults(environ)
+status = []
+body = b''.join(module.app(environ, lambda s, h, exc_info=None: status.append(s)))
+responded = time.perf_counter()
+print(f"{(imported - started) * 1000:.2f} {(responded - started) * 1000:.2f} {status[0].split()[0]} {len(body)}")
+'''
+
+def child_env():
+    env = dict(os.environ)
+    # Serve from a throwaway in-memory database so no server is needed
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    # Keep the probe's stdout to the timing line
+    env['LOG_LEVEL'] = 'WARNING'
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+def measure_once(entry, path):
+    """Return (import ms, first response ms, process wall ms, status, bytes)"""
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, entry, path],
+        cwd=ROOT, env=child_env(), capture_output=True, text=True, check=True
+    ).stdout
+    wall = (time.perf_counter() - started) * 1000
+    import_ms, response_ms, status, size = output.split()
+    return float(import_ms), float(response_ms), wall, int(status), int(size)
+
+def slowest_imports(entry, path, limit):
+    """Top and second-level modules by cumulative import time (µs), including the first request"""
+    probe = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE, entry, path],
+        cwd=ROOT, env=child_env(), capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in probe.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Each nesting level adds two spaces; deeper imports are already
+        # counted in their parent's cumulative time
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            modules.append((int(cumulative), name.strip()))
+    modules.sort(reverse=True)
+    return modules[:limit]
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cold-start benchmark')
+    parser.add_argument('--entry', default='wsgi', help='Module exposing a WSGI `app` (wsgi or app)')
+    parser.add_argument('--path', default='/', help='Path of the first request')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='How many slow imports to list')
+    parser.add_argument('--output', help='Append a JSON line with the results to this file')
+    args = parser.parse_args()
+
+    runs = [measure_once(args.entry, args.path) for _ in range(args.runs)]
+    import_ms = statistics.median(run[0] for run in runs)
+    response_ms = statistics.median(run[1] for run in runs)
+    wall_ms = statistics.median(run[2] for run in runs)
+    status, size = runs[-1][3], runs[-1][4]
+
+    print(f"Entry point:          {args.entry}")
+    print(f"First request:        GET {args.path} -> {status} ({size} bytes)")
+    print(f"Import (median):      {import_ms:.1f} ms")
+    print(f"First response:       {response_ms:.1f} ms")
+    print(f"Process wall clock:   {wall_ms:.1f} ms")
+    print("\nSlowest imports up to the first response (-X importtime):")
+    top = slowest_imports(args.entry, args.path, args.top)
+    for cumulative, name in top:
+        print(f"    {cumulative / 1000:>8.1f} ms  {name}")
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps({
+                'recorded_at': datetime.utcnow().isoformat(),
+                'revision': git_revision(),
+                'python': sys.version.split()[0],
+                'entry': args.entry,
+                'path': args.path,
+                'runs': args.runs,
+                'import_ms': round(import_ms, 2),
+                'first_response_ms': round(response_ms, 2),
+                'wall_ms': round(wall_ms, 2),
+                'status': status,
+                'slowest_imports': [{'module': name, 'ms': round(us / 1000, 2)} for us, name in top],
+            }) + '\n')
@@ -1,5 +1,5 @@
 from app import app
-from models import db, User, ChitFund, Round, Payment, Bid, chitfund_members
+from models import db, User, ChitFund, Round, Payment, Bid, LedgerEntry, BalanceSnapshot, chitfund_members
 
 def clean_database():
     print("\n=== Cleaning Database ===")
@@ -10,6 +10,11 @@ def clean_database():
             users = User.query.all()
             print(f"Found {len(users)} registered users")
             
+            # Delete the savings ledger
+            BalanceSnapshot.query.delete()
+            num_entries = LedgerEntry.query.delete()
+            print(f"Deleted {num_entries} ledger entries")
+            
             # Delete all bids
             num_bids = Bid.query.delete()
             print(f"Deleted {num_bids} bids")
@@ -0,0 +1,199 @@
+"""Application settings read from the environment (and .env).
+
+Database:
+    DATABASE_URL             Full SQLAlchemy URI; wins over everything below
+    MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_PORT, MYSQL_DATABASE
+                             Used to build a mysql+pymysql URI when MYSQL_HOST is set
+    (neither)                SQLite file instance/sakhicircle.db
+
+Connection pool (server databases only):
+    DB_POOL_SIZE             Connections kept open per worker process (5)
+    DB_MAX_OVERFLOW          Extra connections allowed under bursts (10)
+    DB_POOL_TIMEOUT          Seconds to wait for a free connection (30)
+    DB_POOL_RECYCLE          Reconnect connections older than this many seconds (280)
+    DB_POOL_PRE_PING         Check connections before use (true)
+    DB_STATEMENT_TIMEOUT_MS  MySQL max_execution_time for SELECTs, 0 to disable (10000)
+
+SQLite:
+    SQLITE_WAL               Use write-ahead logging (true)
+    SQLITE_BUSY_TIMEOUT      Seconds to wait on a locked database (15)
+
+Passwords (see passwords.py):
+    PASSWORD_ALGORITHM       pbkdf2 or bcrypt (pbkdf2)
+    PASSWORD_COST            PBKDF2 iterations or bcrypt log rounds, 0 for the default
+    PASSWORD_POOL            thread or process (thread; process under gevent)
+    PASSWORD_WORKERS         Hashes computed at once, 0 to hash inline (half the CPUs)
+    PASSWORD_MAX_QUEUE       Extra requests allowed to wait for a worker (32)
+    PASSWORD_TIMEOUT         Seconds a request waits for its hash (10)
+
+Logging (see app_logging.py):
+    LOG_LEVEL                Minimum level written (INFO)
+    LOG_FORMAT               json or text (json)
+    LOG_DEBUG_SAMPLE_RATE    Fraction of DEBUG records kept (0.01)
+    LOG_REQUESTS             One record per request with its duration (true)
+
+SQL profiling (see sql_profiler.py):
+    SQL_PROFILING            Time statements per request, serve /metrics (false)
+    SQL_PROFILE_SLOWEST      Slowest statements kept per request (3)
+    SQL_NPLUSONE_THRESHOLD   Runs of one statement shape that count as N+1 (5)
+    SLOW_REQUEST_MS          Log requests slower than this (500)
+    METRICS_TOKEN            Bearer token required by /metrics; unset hides it (404)
+
+Background jobs (see jobs.py):
+    JOBS_INLINE              Run jobs in the request that queued them (true when serverless)
+    JOBS_WORKERS             Worker threads per web process (2; 0 under gevent,
+                             so run `python jobs.py` beside the web workers)
+    JOBS_POLL_SECONDS        How often idle workers look for jobs (1)
+    JOBS_MAX_ATTEMPTS        Attempts before a job is marked failed (5)
+    JOBS_RETRY_SECONDS       First retry delay, doubled on each attempt (2)
+    JOBS_LOCK_TIMEOUT        Seconds before a running job is presumed dead (300)
+
+Bidding deadlines (see deadlines.py):
+    BIDDING_WINDOW_HOURS     Hours a round stays open for bids; also the
+                             extension when a round closes with no bids (72)
+    DEADLINE_SCHEDULER       Close rounds from a thread in each web process
+                             (true unless serverless; use `python deadlines.py --once`
+                             from cron otherwise)
+    DEADLINE_REFRESH_SECONDS How often the scheduler loads upcoming deadlines (60)
+
+Savings ledger (see ledger.py):
+    LEDGER_SNAPSHOT_ENTRIES  New entries that make `python ledger.py snapshot`
+                             snapshot a user's balance (50)
+
+Forecasts (see forecast.py):
+    FORECAST_SCENARIOS       Monte Carlo scenarios per forecast (2000)
+    FORECAST_MAX_COST        Largest forecast, in scenarios x members^2
+                             (50000000, about 6 s of CPU)
+    FORECAST_INLINE_COST     Larger forecasts run as background jobs (2000000)
+    FORECAST_CACHE_SIZE      Forecasts kept in each process's cache (128)
+
+Live updates (see events.py):
+    EVENT_QUEUE_SIZE         Events buffered per stream before a resync (64)
+    EVENT_HEARTBEAT_SECONDS  Idle time before a keep-alive comment (15)
+    EVENT_MAX_STREAMS        Open streams per process; /api/events answers 503
+                             beyond it. Each holds a thread under a threaded
+                             server (16), a greenlet under gevent (3000)
+
+Under gunicorn.conf.py's gevent workers a blocked request yields to the
+others, so an idle stream is cheap. CPU-bound work would stall them all,
+hence the different job and password defaults there.
+
+Runtime:
+    SERVERLESS               Read-only deployment: skip .env loading and
+                             instance/ creation (true when VERCEL is set)
+"""
+import os
+import sys
+import urllib.parse
+from datetime import timedelta
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, '') else default
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def is_serverless():
+    return env_bool('SERVERLESS', bool(os.environ.get('VERCEL')))
+
+def is_green():
+    """True under gevent workers (gunicorn.conf.py), where waiting costs a greenlet, not a thread"""
+    monkey = sys.modules.get('gevent.monkey')
+    return bool(monkey and monkey.is_module_patched('socket'))
+
+def database_uri(instance_path):
+    if os.environ.get('DATABASE_URL'):
+        return os.environ['DATABASE_URL']
+
+    if os.environ.get('MYSQL_HOST'):
+        # URL encode the password to handle special characters
+        password = urllib.parse.quote_plus(os.environ.get('MYSQL_PASSWORD', ''))
+        user = os.environ.get('MYSQL_USER', 'root')
+        host = os.environ['MYSQL_HOST']
+        port = os.environ.get('MYSQL_PORT', '3306')
+        database = os.environ.get('MYSQL_DATABASE', 'chit_fund')
+        return f'mysql+pymysql://{user}:{password}@{host}:{port}/{database}?charset=utf8mb4'
+
+    return 'sqlite:///' + os.path.join(instance_path, 'sakhicircle.db')
+
+def engine_options(uri):
+    """SQLALCHEMY_ENGINE_OPTIONS tuned for the database in use"""
+    if uri.startswith('sqlite'):
+        # SQLite has no server-side pool; just wait on locks instead of failing
+        return {'connect_args': {'timeout': env_float('SQLITE_BUSY_TIMEOUT', 15)}}
+
+    options = {
+        'pool_size': env_int('DB_POOL_SIZE', 5),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+        # Below MySQL's wait_timeout and typical proxy idle limits
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 280),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+    }
+
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT_MS', 10000)
+    if statement_timeout and uri.startswith('mysql'):
+        options['connect_args'] = {
+            'init_command': f'SET SESSION max_execution_time={statement_timeout}'
+        }
+    return options
+
+def load_config(instance_path):
+    """Settings for create_app(), read from the current environment"""
+    uri = database_uri(instance_path)
+    serverless = is_serverless()
+    green = is_green()
+    return {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'dev'),
+        'SQLALCHEMY_DATABASE_URI': uri,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options(uri),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SQLITE_WAL': env_bool('SQLITE_WAL', True),
+        'SERVERLESS': serverless,
+        'SESSION_COOKIE_NAME': 'chit_fund_session',
+        'SESSION_COOKIE_HTTPONLY': True,
+        'PERMANENT_SESSION_LIFETIME': timedelta(hours=1),
+        'PROFILE_CACHE_TTL': env_int('PROFILE_CACHE_TTL', 0),
+        'EVENT_QUEUE_SIZE': env_int('EVENT_QUEUE_SIZE', 64),
+        'EVENT_HEARTBEAT_SECONDS': env_int('EVENT_HEARTBEAT_SECONDS', 15),
+        'EVENT_MAX_STREAMS': env_int('EVENT_MAX_STREAMS', 3000 if green else 16),
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'INFO').upper(),
+        'LOG_FORMAT': os.environ.get('LOG_FORMAT', 'json'),
+        'LOG_DEBUG_SAMPLE_RATE': env_float('LOG_DEBUG_SAMPLE_RATE', 0.01),
+        'LOG_REQUESTS': env_bool('LOG_REQUESTS', True),
+        'SQL_PROFILING': env_bool('SQL_PROFILING', False),
+        'SQL_PROFILE_SLOWEST': env_int('SQL_PROFILE_SLOWEST', 3),
+        'SQL_NPLUSONE_THRESHOLD': env_int('SQL_NPLUSONE_THRESHOLD', 5),
+        'SLOW_REQUEST_MS': env_float('SLOW_REQUEST_MS', 500),
+        'METRICS_TOKEN': os.environ.get('METRICS_TOKEN'),
+        'JOBS_INLINE': env_bool('JOBS_INLINE', serverless),
+        # CPU-bound jobs would stall every greenlet; run `python jobs.py` beside gevent workers
+        'JOBS_WORKERS': env_int('JOBS_WORKERS', 0 if green else 2),
+        'JOBS_POLL_SECONDS': env_float('JOBS_POLL_SECONDS', 1),
+        'JOBS_MAX_ATTEMPTS': env_int('JOBS_MAX_ATTEMPTS', 5),
+        'JOBS_RETRY_SECONDS': env_float('JOBS_RETRY_SECONDS', 2),
+        'JOBS_LOCK_TIMEOUT': env_int('JOBS_LOCK_TIMEOUT', 300),
+        'BIDDING_WINDOW_HOURS': env_float('BIDDING_WINDOW_HOURS', 72),
+        'DEADLINE_SCHEDULER': env_bool('DEADLINE_SCHEDULER', not serverless),
+        'DEADLINE_REFRESH_SECONDS': env_float('DEADLINE_REFRESH_SECONDS', 60),
+        'LEDGER_SNAPSHOT_ENTRIES': env_int('LEDGER_SNAPSHOT_ENTRIES', 50),
+        'FORECAST_SCENARIOS': env_int('FORECAST_SCENARIOS', 2000),
+        'FORECAST_MAX_COST': env_int('FORECAST_MAX_COST', 50_000_000),
+        'FORECAST_INLINE_COST': env_int('FORECAST_INLINE_COST', 2_000_000),
+        'FORECAST_CACHE_SIZE': env_int('FORECAST_CACHE_SIZE', 128),
+        'PASSWORD_ALGORITHM': os.environ.get('PASSWORD_ALGORITHM', 'pbkdf2'),
+        'PASSWORD_COST': env_int('PASSWORD_COST', 0),
+        'PASSWORD_POOL': os.environ.get('PASSWORD_POOL', 'process' if green else 'thread'),
+        # Leave the other half of the cores for serving pages
+        'PASSWORD_WORKERS': env_int('PASSWORD_WORKERS', max(1, (os.cpu_count() or 2) // 2)),
+        'PASSWORD_MAX_QUEUE': env_int('PASSWORD_MAX_QUEUE', 32),
+        'PASSWORD_TIMEOUT': env_float('PASSWORD_TIMEOUT', 10),
+    }
@@ -0,0 +1,213 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from models import db, ChitFund, Round, Bid, Payment, chitfund_members
+
+
+def ensure_pending_payments(user, fund_ids=None):
+    """Create missing pending payments for the user's open current rounds in one insert"""
+    query = db.session.query(
+        ChitFund.id, Round.id, ChitFund.monthly_contribution_paise
+    ).join(
+        chitfund_members, chitfund_members.c.chitfund_id == ChitFund.id
+    ).join(
+        Round, and_(
+            Round.chitfund_id == ChitFund.id,
+            Round.round_number == ChitFund.current_round
+        )
+    ).outerjoin(
+        Payment, and_(
+            Payment.round_id == Round.id,
+            Payment.user_id == user.id
+        )
+    ).filter(
+        chitfund_members.c.user_id == user.id,
+        Round.status != 'completed',
+        Payment.id.is_(None)
+    )
+    if fund_ids is not None:
+        query = query.filter(ChitFund.id.in_(fund_ids))
+    missing = query.all()
+
+    if not missing:
+        return 0
+
+    now = datetime.utcnow()
+    db.session.execute(Payment.__table__.insert(), [{
+        'chitfund_id': fund_id,
+        'round_id': round_id,
+        'user_id': user.id,
+        'amount_paise': amount,
+        'status': 'pending',
+        'created_at': now
+    } for fund_id, round_id, amount in missing])
+    db.session.commit()
+    return len(missing)
+
+
+def load_dashboard_funds(user, fund_ids=None):
+    """Build the dashboard's funds_info list for a user in a fixed number of queries.
+
+    Issues one query each for the user's funds, their rounds (with winners),
+    the current rounds' payments and the current rounds' bids (with bidders),
+    regardless of how many funds the user belongs to. Pass fund_ids to load
+    only some of the user's funds.
+    """
+    ensure_pending_payments(user, fund_ids)
+
+    # Get all chitfunds where the user is a member
+    query = ChitFund.query.join(
+        chitfund_members
+    ).filter(
+        chitfund_members.c.user_id == user.id
+    )
+    if fund_ids is not None:
+        query = query.filter(ChitFund.id.in_(fund_ids))
+    funds = query.order_by(ChitFund.id).all()
+
+    if not funds:
+        return []
+
+    fund_ids = [fund.id for fund in funds]
+
+    # Every round of every fund, newest first, with the winner joined in
+    rounds = Round.query.options(
+        joinedload(Round.winner)
+    ).filter(
+        Round.chitfund_id.in_(fund_ids)
+    ).order_by(Round.chitfund_id, Round.round_number.desc()).all()
+
+    rounds_by_fund = defaultdict(list)
+    for round in rounds:
+        rounds_by_fund[round.chitfund_id].append(round)
+
+    current_rounds = {}
+    for fund in funds:
+        for round in rounds_by_fund[fund.id]:
+            if round.round_number == fund.current_round:
+                current_rounds[fund.id] = round
+                break
+
+    current_round_ids = [round.id for round in current_rounds.values()]
+    payments_by_round = defaultdict(list)
+    bids_by_round = defaultdict(list)
+
+    if current_round_ids:
+        payments = Payment.query.filter(
+            Payment.round_id.in_(current_round_ids)
+        ).order_by(Payment.id).all()
+        for payment in payments:
+            payments_by_round[payment.round_id].append(payment)
+
+        bids = Bid.query.options(
+            joinedload(Bid.user)
+        ).filter(
+            Bid.round_id.in_(current_round_ids)
+        ).order_by(Bid.id).all()
+        for bid in bids:
+            bids_by_round[bid.round_id].append(bid)
+
+    funds_info = []
+    for fund in funds:
+        current_round = current_rounds.get(fund.id)
+        fund_rounds = rounds_by_fund[fund.id]
+
+        # Get payment status for current round
+        payment = None
+        can_bid = False
+        total_pooled = 0
+
+        if current_round:
+            round_payments = payments_by_round[current_round.id]
+            round_bids = bids_by_round[current_round.id]
+
+            # Populate the relationships so the template never lazy-loads them
+            set_committed_value(current_round, 'payments', round_payments)
+            set_committed_value(current_round, 'bids', round_bids)
+
+            total_pooled = current_round.pooled_amount
+
+            payment = next((p for p in round_payments if p.user_id == user.id), None)
+
+            # Check if user can bid
+            if current_round.status == 'bidding' and payment and payment.status == 'completed':
+                # Check if all users have made their payments
+                if fund.member_count == current_round.paid_count:
+                    existing_bid = any(bid.user_id == user.id for bid in round_bids)
+                    previous_wins = any(
+                        r.winner_id == user.id and r.status == 'completed'
+                        for r in fund_rounds
+                    )
+                    # User can bid if they haven't bid in this round and haven't won before
+                    can_bid = not existing_bid and not previous_wins
+
+        # Get previous completed rounds
+        previous_rounds = [
+            r for r in fund_rounds
+            if r.status == 'completed' and r.round_number < fund.current_round
+        ]
+
+        funds_info.append({
+            'fund': fund,
+            'current_round': current_round,
+            'payment': payment,
+            'can_bid': can_bid,
+            'total_pooled': total_pooled,
+            'previous_rounds': previous_rounds
+        })
+
+    return funds_info
+
+
+def fund_state(fund_info):
+    """JSON-serializable state of one fund card"""
+    fund = fund_info['fund']
+    current_round = fund_info['current_round']
+    payment = fund_info['payment']
+
+    round_state = None
+    bids = []
+    if current_round:
+        round_state = {
+            'id': current_round.id,
+            'round_number': current_round.round_number,
+            'status': current_round.status,
+            'paid_count': current_round.paid_count,
+            'bid_count': current_round.bid_count,
+            'winner_id': current_round.winner_id,
+            'winner': current_round.winner.username if current_round.winner else None,
+            'winning_bid': current_round.winning_bid,
+            'bidding_deadline': current_round.bidding_deadline.isoformat() if current_round.bidding_deadline else None
+        }
+        bids = [{
+            'user_id': bid.user_id,
+            'username': bid.user.username,
+            'amount': bid.amount
+        } for bid in current_round.bids]
+
+    return {
+        'fund': {
+            'id': fund.id,
+            'name': fund.name,
+            'member_count': fund.member_count,
+            'monthly_contribution': fund.monthly_contribution,
+            'duration': fund.duration,
+            'current_round': fund.current_round
+        },
+        'round': round_state,
+        'total_pooled': fund_info['total_pooled'],
+        'bids': bids,
+        'payment': {
+            'id': payment.id,
+            'status': payment.status,
+            'transaction_id': payment.transaction_id
+        } if payment else None,
+        'can_bid': fund_info['can_bid'],
+        'previous_rounds': [{
+            'round_number': r.round_number,
+            'winner': r.winner.username if r.winner else None,
+            'winning_bid': r.winning_bid
+        } for r in fund_info['previous_rounds']]
+    }
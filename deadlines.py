@@ -0,0 +1,214 @@
+"""Close bidding rounds when their deadline passes.
+
+Every round that opens for bidding gets a ``bidding_deadline``
+BIDDING_WINDOW_HOURS away (the final round has none; it settles itself when
+the last payment arrives). When the deadline passes, a ``close_round`` job
+settles the round with the bids received so far, or, if nobody has bid,
+pushes the deadline out by another window.
+
+Each web process runs one ``DeadlineScheduler`` thread. Instead of scanning
+every open round it keeps a heap of the deadlines due within the next two
+refresh periods, loaded with one indexed range query on
+(status, bidding_deadline) every DEADLINE_REFRESH_SECONDS, and sleeps until
+the earliest of them. Far-off deadlines stay in the database until they come
+into range, so memory and wake-ups track the rounds about to close, not the
+number open. Several processes may see the same deadline; the job dedup key
+(``close:<round_id>:<deadline>``) lets only one of them close the round.
+
+Without the scheduler (DEADLINE_SCHEDULER=false, the default on serverless
+deployments) run ``python deadlines.py --once`` from cron; a bid that arrives
+after the deadline also triggers the close.
+"""
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models import db, Round
+from jobs import enqueue, dispatch
+
+logger = logging.getLogger(__name__)
+
+def bidding_deadline(round_number, duration, start=None):
+    """Deadline for a round opening at `start`; None for the final round"""
+    if round_number >= duration:
+        return None
+    window = timedelta(hours=current_app.config['BIDDING_WINDOW_HOURS'])
+    return (start or datetime.utcnow()) + window
+
+def request_close(round_id, deadline):
+    """Queue (once per deadline) and dispatch the job that closes a round.
+
+    Returns (status, result) from dispatch, or (None, None) if another
+    process queued the job first.
+    """
+    try:
+        job_id = enqueue(
+            'close_round',
+            {'round_id': round_id},
+            dedup_key=f"close:{round_id}:{deadline:%Y%m%d%H%M%S}"
+        ).id
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None, None
+    return dispatch(job_id)
+
+def extend_deadline(round_id, deadline):
+    """Push a deadline out by one window; returns the new deadline, or None if it changed meanwhile"""
+    extended = datetime.utcnow() + timedelta(hours=current_app.config['BIDDING_WINDOW_HOURS'])
+    updated = Round.query.filter(
+        Round.id == round_id,
+        Round.status == 'bidding',
+        Round.bidding_deadline == deadline
+    ).update({Round.bidding_deadline: extended}, synchronize_session=False)
+    db.session.commit()
+    if not updated:
+        return None
+    scheduler.schedule(round_id, extended)
+    return extended
+
+def due_rounds(until):
+    """(round_id, deadline) of open rounds whose deadline is before `until`"""
+    return db.session.query(Round.id, Round.bidding_deadline).filter(
+        Round.status == 'bidding',
+        Round.bidding_deadline <= until
+    ).order_by(Round.bidding_deadline).all()
+
+def close_overdue():
+    """Close every round past its deadline; returns how many were handed to jobs"""
+    overdue = due_rounds(datetime.utcnow())
+    db.session.rollback()
+    for round_id, deadline in overdue:
+        request_close(round_id, deadline)
+    return len(overdue)
+
+class DeadlineScheduler:
+    """A heap of upcoming (deadline, round_id) and the thread that waits on it"""
+
+    def __init__(self):
+        self._heap = []
+        self._queued = set()  # Entries on the heap, so refreshes do not add duplicates
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def __len__(self):
+        with self._condition:
+            return len(self._heap)
+
+    def schedule(self, round_id, deadline):
+        """Wake at `deadline` to close the round (no-op if already scheduled)"""
+        entry = (deadline, round_id)
+        with self._condition:
+            if entry in self._queued:
+                return
+            self._queued.add(entry)
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] == entry:
+                # The new entry is now the earliest; shorten the current wait
+                self._condition.notify()
+
+    def pop_due(self, now):
+        """Remove and return the entries due at `now`, earliest first"""
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard(entry)
+                due.append(entry)
+        return due
+
+    def refresh(self, horizon_seconds):
+        """Load open rounds due within the horizon (including overdue ones)"""
+        upcoming = due_rounds(datetime.utcnow() + timedelta(seconds=horizon_seconds))
+        db.session.rollback()
+        for round_id, deadline in upcoming:
+            self.schedule(round_id, deadline)
+        return len(upcoming)
+
+    def _wait(self, until_refresh):
+        with self._condition:
+            timeout = until_refresh
+            if self._heap:
+                until_due = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+                timeout = min(timeout, until_due)
+            if timeout > 0 and not self._stopping:
+                self._condition.wait(timeout)
+
+    def run(self, app):
+        interval = app.config['DEADLINE_REFRESH_SECONDS']
+        next_refresh = 0
+        while not self._stopping:
+            try:
+                with app.app_context():
+                    if time.monotonic() >= next_refresh:
+                        self.refresh(2 * interval)
+                        next_refresh = time.monotonic() + interval
+                    for deadline, round_id in self.pop_due(datetime.utcnow()):
+                        request_close(round_id, deadline)
+            except Exception:
+                logger.exception('Deadline scheduler error')
+                next_refresh = 0
+                time.sleep(1)
+            self._wait(next_refresh - time.monotonic())
+
+    def start(self, app):
+        with self._condition:
+            if self._thread:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self.run, args=(app,), name='deadline-scheduler', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._stopping = True
+            self._condition.notify()
+        if thread:
+            thread.join()
+
+scheduler = DeadlineScheduler()
+
+def init_app(app):
+    if not app.config['DEADLINE_SCHEDULER']:
+        return
+
+    @app.before_request
+    def start_deadline_scheduler():
+        # Started lazily, like the job workers
+        if not scheduler.running:
+            scheduler.start(app)
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+    import deadlines  # The module the app uses, not __main__
+
+    parser = argparse.ArgumentParser(description='Close bidding rounds whose deadline has passed')
+    parser.add_argument('--once', action='store_true', help='Close overdue rounds, then exit')
+    args = parser.parse_args()
+
+    if args.once:
+        # Close the rounds here rather than leaving jobs for workers that may not run
+        app = create_app({'JOBS_INLINE': True})
+        with app.app_context():
+            print(f"Closed {deadlines.close_overdue()} overdue rounds")
+    else:
+        app = create_app()
+        deadlines.scheduler.start(app)
+        print("Deadline scheduler running; press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            deadlines.scheduler.stop()
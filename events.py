@@ -0,0 +1,161 @@
+"""Live round updates pushed to members as Server-Sent Events.
+
+Routes publish through the module-level ``broker`` after committing. The
+default InProcessBackend only reaches streams held by this process; any
+object with the same subscribe/unsubscribe/publish methods can replace it.
+Each stream has a bounded queue, and a client that falls behind gets a
+single ``resync`` event instead of an ever-growing backlog.
+
+A stream waits on its queue for as long as it is open. Under gunicorn.conf.py's
+gevent workers that costs a greenlet, so one worker holds thousands; under a
+threaded server it ties up a thread. Each process serves at most
+EVENT_MAX_STREAMS (3000 under gevent, 16 otherwise); beyond that
+/api/events answers 503 and the page falls back to polling until a slot
+frees up.
+"""
+import itertools
+import json
+import logging
+import queue
+import threading
+from models import db, chitfund_members
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_HEARTBEAT_SECONDS = 15
+DEFAULT_MAX_STREAMS = 16  # Threaded servers; config.py raises it under gevent
+
+class Subscription:
+    """One open event stream with a bounded backlog"""
+
+    def __init__(self, user_id, maxsize=DEFAULT_QUEUE_SIZE):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Drop the backlog; the client will be told to refetch everything
+            self.overflowed = True
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within timeout seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class InProcessBackend:
+    """Delivers events to subscriptions held by this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.setdefault(subscription.user_id, set()).add(subscription)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_ids, event):
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in user_ids
+                for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in targets:
+            subscription.put(event)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+class EventBroker:
+    """Publishes events to users and turns subscriptions into SSE streams"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or InProcessBackend()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._open_streams = 0  # Streams held by this process, whatever the backend
+
+    def publish(self, event_type, user_ids, data):
+        event = {'id': next(self._ids), 'type': event_type, 'data': data}
+        self.backend.publish(set(user_ids), event)
+
+    def subscribe(self, user_id, queue_size=DEFAULT_QUEUE_SIZE, max_streams=None):
+        """A new subscription, or None if this process already holds max_streams"""
+        with self._lock:
+            if max_streams is not None and self._open_streams >= max_streams:
+                return None
+            self._open_streams += 1
+        subscription = Subscription(user_id, queue_size)
+        self.backend.subscribe(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Close a subscription; safe to call more than once"""
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            self._open_streams -= 1
+        self.backend.unsubscribe(subscription)
+
+    def open_streams(self):
+        with self._lock:
+            return self._open_streams
+
+    def stream(self, subscription, heartbeat=DEFAULT_HEARTBEAT_SECONDS):
+        """Yield SSE frames for a subscription until the client disconnects"""
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                event = subscription.get(timeout=heartbeat)
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield 'event: resync\ndata: {}\n\n'
+                    continue
+                if event is None:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ': heartbeat\n\n'
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+broker = EventBroker()
+
+def publish_fund_event(chitfund_id, event_type, **data):
+    """Send an event to every member of a chit fund.
+
+    Called after the change is committed; a failure here is reported but
+    never undoes or fails the request that triggered it.
+    """
+    try:
+        member_ids = [
+            user_id for (user_id,) in db.session.query(chitfund_members.c.user_id).filter(
+                chitfund_members.c.chitfund_id == chitfund_id
+            )
+        ]
+        data['chitfund_id'] = chitfund_id
+        broker.publish(event_type, member_ids, data)
+    except Exception:
+        logger.exception('Error publishing event', extra={'fund_id': chitfund_id, 'event_type': event_type})
@@ -0,0 +1,135 @@
+"""Run EXPLAIN on the app's hot query shapes and flag full table scans.
+
+Usage:
+    python explain_queries.py                 # database configured for the app
+    python explain_queries.py --uri sqlite:// # fresh in-memory schema
+"""
+import argparse
+import sys
+from datetime import datetime
+from app import app, create_app
+from sqlalchemy import func
+from models import db, User, ChitFund, Round, Bid, Payment, LedgerEntry, BalanceSnapshot, chitfund_members
+
+# Sample parameters only need to be plausible; the plan is what matters
+FUND_ID, ROUND_ID, USER_ID = 1, 1, 1
+
+def query_shapes():
+    """The query shapes issued by the request hot paths, keyed by name"""
+    return {
+        'payment_for_user': Payment.query.filter_by(
+            chitfund_id=FUND_ID, round_id=ROUND_ID, user_id=USER_ID
+        ),
+        'completed_payments_for_round': Payment.query.filter_by(
+            chitfund_id=FUND_ID, round_id=ROUND_ID, status='completed'
+        ),
+        'payments_for_rounds': Payment.query.filter(
+            Payment.round_id.in_([ROUND_ID, ROUND_ID + 1])
+        ),
+        'payments_by_transaction_id': db.session.query(Payment.transaction_id).filter(
+            Payment.transaction_id.in_(['UTR1', 'UTR2']),
+            Payment.status == 'completed'
+        ),
+        'bid_for_user': Bid.query.filter_by(
+            chitfund_id=FUND_ID, round_id=ROUND_ID, user_id=USER_ID
+        ),
+        'lowest_bid_for_round': Bid.query.filter_by(
+            round_id=ROUND_ID, amount_paise=10000
+        ),
+        'bids_for_rounds': Bid.query.filter(
+            Bid.round_id.in_([ROUND_ID, ROUND_ID + 1])
+        ),
+        'round_by_number': Round.query.filter_by(
+            chitfund_id=FUND_ID, round_number=1
+        ),
+        'previous_wins': Round.query.filter_by(
+            chitfund_id=FUND_ID, winner_id=USER_ID, status='completed'
+        ),
+        'completed_rounds_for_fund': Round.query.filter(
+            Round.chitfund_id == FUND_ID, Round.status == 'completed'
+        ),
+        'rounds_due_for_closing': Round.query.filter(
+            Round.status == 'bidding', Round.bidding_deadline <= datetime(2030, 1, 1)
+        ).order_by(Round.bidding_deadline),
+        'rounds_for_funds': Round.query.filter(
+            Round.chitfund_id.in_([FUND_ID, FUND_ID + 1])
+        ),
+        'latest_snapshot_for_user': BalanceSnapshot.query.filter(
+            BalanceSnapshot.user_id == USER_ID
+        ).order_by(BalanceSnapshot.entry_id.desc()).limit(1),
+        'ledger_tail_for_user': db.session.query(func.sum(LedgerEntry.credit_paise)).filter(
+            LedgerEntry.user_id == USER_ID, LedgerEntry.id > 100
+        ),
+        'ledger_entries_since': LedgerEntry.query.filter(
+            LedgerEntry.user_id == USER_ID, LedgerEntry.created_at >= datetime(2030, 1, 1)
+        ),
+        'ledger_entries_for_round': LedgerEntry.query.filter(
+            LedgerEntry.round_id == ROUND_ID, LedgerEntry.user_id == USER_ID
+        ),
+        'members_of_fund': db.session.query(User).join(chitfund_members).filter(
+            chitfund_members.c.chitfund_id == FUND_ID
+        ),
+        'funds_of_member': ChitFund.query.join(chitfund_members).filter(
+            chitfund_members.c.user_id == USER_ID
+        ),
+    }
+
+def _compile(query):
+    return str(query.statement.compile(
+        dialect=db.engine.dialect,
+        compile_kwargs={'literal_binds': True}
+    ))
+
+def explain(query):
+    """Return (plan lines, full scan lines) for a query on the current engine"""
+    sql = _compile(query)
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+        plan = [row[-1] for row in rows]
+        # "SCAN <table>" without an index is a full table scan
+        full_scans = [line for line in plan if line.startswith('SCAN') and 'INDEX' not in line]
+    elif dialect == 'mysql':
+        rows = db.session.execute(db.text(f'EXPLAIN {sql}')).mappings().all()
+        plan = [
+            f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']}"
+            for row in rows
+        ]
+        full_scans = [line for line, row in zip(plan, rows) if row['type'] == 'ALL']
+    else:
+        raise RuntimeError(f'EXPLAIN is not supported for the {dialect} dialect')
+
+    return plan, full_scans
+
+def audit(shapes=None):
+    """EXPLAIN every query shape and return {name: (plan, full_scans)}"""
+    shapes = shapes or query_shapes()
+    return {name: explain(query) for name, query in shapes.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Flag full table scans in the hot query shapes')
+    parser.add_argument('--uri', help='Database URI to audit instead of the configured one')
+    parser.add_argument('--verbose', action='store_true', help='Print the full plan for every query')
+    args = parser.parse_args(argv)
+
+    target = create_app({'SQLALCHEMY_DATABASE_URI': args.uri}) if args.uri else app
+
+    with target.app_context():
+        if args.uri and args.uri.startswith('sqlite://'):
+            db.create_all()
+
+        results = audit()
+        flagged = 0
+        for name, (plan, full_scans) in results.items():
+            status = 'FULL SCAN' if full_scans else 'ok'
+            print(f"{name:32} {status}")
+            for line in (plan if args.verbose else full_scans):
+                print(f"    {line}")
+            flagged += bool(full_scans)
+
+        print(f"\n{flagged} of {len(results)} query shapes do a full table scan")
+        return 1 if flagged else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
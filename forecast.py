@@ -0,0 +1,388 @@
+"""Monte Carlo forecast of what members get out of a chit fund.
+
+"What will I get if I win in round k?" depends on the contribution, the
+number of members and how the others bid. The simulator plays the fund
+forward with settle_round's rules:
+
+- every member pays the contribution each round (pool = members x contribution)
+- the lowest bid among members who have not won yet wins and takes their bid
+- every other member receives an equal share of the rest of the pool, in
+  whole paise, split as money.split() does: the leftover paise go one each
+  to the members with the lowest user ids
+- the last round has no bidding: the remaining member takes the whole pool
+
+Bids are drawn as discounts on the pool: max_discount x Beta, with the
+mean and spread measured from the fund's recorded bids when it has enough
+of them, else the defaults. Rounds already settled are replayed as they
+happened. All scenarios advance a round at a time as NumPy arrays
+(scenarios x members), and every member's monthly cash flows are reduced
+to a (modified) IRR in the same arrays, so thousands of scenarios take a
+fraction of a second.
+
+Results depend only on the parameters (members, contribution, settled
+rounds, bid model, scenarios) and a fixed seed, so they are cached by those
+parameters and shared by funds that have the same ones. The work grows with
+scenarios x members^2, so scenario counts are rounded up to one of
+SCENARIO_STEPS (arbitrary counts never make new cache entries) and capped at
+FORECAST_MAX_COST; runs above FORECAST_INLINE_COST are left to a
+``forecast`` job (see routes.py), whose stored result any process can use.
+
+NumPy is imported by the functions that simulate, not at module level, so
+importing routes (and every cold start) does not pay for it.
+
+Usage:
+    python forecast.py --fund ID
+    python forecast.py --members 20 --contribution 5000 [--scenarios 2000]
+"""
+import argparse
+import hashlib
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+from flask import current_app
+from models import db, ChitFund, Round, Bid, chitfund_members
+
+# Discount on the pool in an individual bid, when the fund has too few bids to measure
+DEFAULT_MEAN_DISCOUNT = 0.15
+DEFAULT_DISCOUNT_SPREAD = 0.08
+MAX_DISCOUNT = 0.40
+MIN_CALIBRATION_BIDS = 8
+
+PERCENTILES = (10, 50, 90)
+# Annual rate money earns outside the fund (a bank deposit), used by the modified IRR
+REFERENCE_RATE = 0.07
+# Scenario chunk size keeps the (scenarios x members x rounds) cash flows within a few MB
+CHUNK_ELEMENTS = 1_000_000
+# The scenario counts a forecast can run with
+SCENARIO_STEPS = (500, 1000, 2000, 5000, 10000, 20000)
+# Part of every job dedup key; bump when a change to the model changes results
+MODEL_VERSION = 1
+
+BidModel = namedtuple('BidModel', 'mean_discount spread max_discount')
+
+# history is ((winner index, winning bid in paise), ...) for the rounds already settled
+ForecastParams = namedtuple(
+    'ForecastParams', 'member_count contribution_paise history bid_model scenarios seed'
+)
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_totals = {'hits': 0, 'misses': 0}
+
+def _beta_shape(model):
+    """Beta(a, b) parameters for discount / max_discount with the model's mean and spread"""
+    mean = min(max(model.mean_discount / model.max_discount, 0.01), 0.99)
+    variance = (model.spread / model.max_discount) ** 2
+    # A Beta's variance is below mean * (1 - mean); stay inside that
+    variance = min(max(variance, 1e-4), mean * (1 - mean) * 0.95)
+    common = mean * (1 - mean) / variance - 1
+    return mean * common, (1 - mean) * common
+
+def simulate(params):
+    """Play out every round of every scenario.
+
+    Returns (winners, bids, dividends, remainders), each scenarios x rounds:
+    the winning member's index, the amount they took, each other member's
+    share and the paise left over from the shares, all in whole paise.
+    """
+    import numpy as np
+    members, scenarios = params.member_count, params.scenarios
+    pool = members * params.contribution_paise
+    a, b = _beta_shape(params.bid_model)
+    rng = np.random.default_rng(params.seed)
+    everyone = np.arange(scenarios)
+
+    won = np.zeros((scenarios, members), dtype=bool)
+    winners = np.empty((scenarios, members), dtype=np.int64)
+    bids = np.empty((scenarios, members), dtype=np.int64)
+    for t in range(members):
+        if t < len(params.history):
+            winner, bid = params.history[t]
+            winners[:, t] = winner
+            bids[:, t] = bid
+        elif t == members - 1:
+            # The member who has not won takes the whole pool
+            winners[:, t] = np.argmin(won, axis=1)
+            bids[:, t] = pool
+        else:
+            discounts = params.bid_model.max_discount * rng.beta(a, b, size=(scenarios, members))
+            discounts[won] = -1.0  # Winners cannot bid again
+            winners[:, t] = np.argmax(discounts, axis=1)  # Highest discount = lowest bid
+            # Bids are made in whole paise
+            bids[:, t] = np.floor(pool * (1 - discounts[everyone, winners[:, t]]))
+        won[everyone, winners[:, t]] = True
+
+    # money.split() of what the winner leaves among the other members
+    dividends, remainders = np.divmod(pool - bids, members - 1)
+    dividends[:, -1] = remainders[:, -1] = 0  # The last round pays no dividend
+    return winners, bids, dividends, remainders
+
+def irr(flows):
+    """Annualised modified IRR of monthly cash flows along the last axis.
+
+    A member who wins mid-fund pays in, takes the pool, then pays in again,
+    so their flows have no IRR or two. The modified IRR is always defined:
+    money received is reinvested, and payments are discounted, at
+    REFERENCE_RATE, and the IRR is the rate that turns the one into the other.
+    Higher is better whether the member won early or late.
+    """
+    import numpy as np
+    months = flows.shape[-1]
+    monthly = (1 + REFERENCE_RATE) ** (1 / 12) - 1
+    growth = (1 + monthly) ** np.arange(months)
+    received = (np.maximum(flows, 0) * growth[::-1]).sum(axis=-1)
+    paid = (np.maximum(-flows, 0) / growth).sum(axis=-1)
+    with np.errstate(all='ignore'):
+        rate = (received / paid) ** (1 / (months - 1)) - 1
+        return np.where((received > 0) & (paid > 0), (1 + rate) ** 12 - 1, np.nan)
+
+def member_outcomes(params, winners, bids, dividends, remainders):
+    """Per scenario and member: the round won, the payout, the dividends received and the IRR.
+
+    Members are indexed in user id order, so a round's leftover paise go to
+    the lowest indices other than the winner's, as in settle_round().
+    """
+    import numpy as np
+    scenarios, members = winners.shape
+    contribution = params.contribution_paise
+    win_round = np.empty((scenarios, members), dtype=np.int64)
+    payout = np.empty((scenarios, members), dtype=np.int64)
+    received = np.empty((scenarios, members), dtype=np.int64)
+    rates = np.empty((scenarios, members))
+
+    chunk = max(1, CHUNK_ELEMENTS // (members * members))
+    ids = np.arange(members)
+    for start in range(0, scenarios, chunk):
+        part = slice(start, start + chunk)
+        # (scenario, member, round): did this member win this round?
+        winner = winners[part][:, None, :]
+        is_winner = winner == ids[None, :, None]
+        # Position among the members sharing the dividend
+        rank = ids[None, :, None] - (winner < ids[None, :, None])
+        shares = dividends[part][:, None, :] + (rank < remainders[part][:, None, :])
+        receipts = np.where(is_winner, bids[part][:, None, :], shares)
+        win_round[part] = np.argmax(is_winner, axis=2)
+        payout[part] = np.take_along_axis(bids[part], win_round[part], axis=1)
+        received[part] = receipts.sum(axis=2) - payout[part]
+        rates[part] = irr(receipts - contribution)
+
+    paid_in = contribution * members
+    return win_round, payout, received, payout + received - paid_in, rates
+
+def _summary(values, scale=1.0):
+    """Mean and percentiles, scaled (paise to rupees), with None for undefined values"""
+    import numpy as np
+    values = values[~np.isnan(values)]
+    if not values.size:
+        return None
+    stats = {'mean': float(values.mean()) / scale}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        stats[f'p{percentile}'] = float(value) / scale
+    return {key: round(value, 2 if scale != 1.0 else 4) for key, value in stats.items()}
+
+def run_forecast(params):
+    """Simulate and summarise: outcomes by winning round and by member"""
+    import numpy as np
+    if params.member_count < 2:
+        raise ValueError('A forecast needs at least two members')
+    win_round, payout, received, net, rates = member_outcomes(params, *simulate(params))
+
+    by_round = []
+    for t in range(params.member_count):
+        mask = win_round == t
+        by_round.append({
+            'round_number': t + 1,
+            'settled': t < len(params.history),
+            'payout': _summary(payout[mask], 100),
+            'dividends': _summary(received[mask], 100),
+            'net_gain': _summary(net[mask], 100),
+            'annual_irr': _summary(rates[mask])
+        })
+
+    by_member = []
+    for member in range(params.member_count):
+        rounds = np.bincount(win_round[:, member], minlength=params.member_count) / params.scenarios
+        by_member.append({
+            'expected_win_round': round(float(win_round[:, member].mean()) + 1, 2),
+            'win_probability_by_round': [round(float(p), 4) for p in rounds],
+            'payout': _summary(payout[:, member], 100),
+            'dividends': _summary(received[:, member], 100),
+            'net_gain': _summary(net[:, member], 100),
+            'annual_irr': _summary(rates[:, member])
+        })
+
+    return {
+        'member_count': params.member_count,
+        'monthly_contribution': params.contribution_paise / 100,
+        'pool': params.member_count * params.contribution_paise / 100,
+        'rounds_settled': len(params.history),
+        'scenarios': params.scenarios,
+        'bid_model': params.bid_model._asdict(),
+        'by_round': by_round,
+        'by_member': by_member
+    }
+
+def cost(params):
+    """Work of a forecast in scenario x member x round units"""
+    return params.scenarios * params.member_count ** 2
+
+def scenario_count(member_count, requested=None):
+    """The scenarios to run for a fund of this size.
+
+    A requested count is rounded up to the next of SCENARIO_STEPS; without
+    one, FORECAST_SCENARIOS is used, or the largest step within
+    FORECAST_MAX_COST if that is too many. Raises ValueError when the
+    request (or any forecast at all) costs more than FORECAST_MAX_COST.
+    """
+    max_cost = current_app.config['FORECAST_MAX_COST']
+    affordable = [step for step in SCENARIO_STEPS if step * member_count ** 2 <= max_cost]
+    if not affordable:
+        raise ValueError(f'Funds of {member_count} members are too large to forecast')
+    if requested is None:
+        default = current_app.config['FORECAST_SCENARIOS']
+        return min(default, affordable[-1])
+    if requested < 1:
+        raise ValueError('scenarios must be at least 1')
+    step = next((step for step in SCENARIO_STEPS if step >= requested), SCENARIO_STEPS[-1])
+    if step > affordable[-1]:
+        raise ValueError(f'A fund of {member_count} members can be forecast with at most '
+                         f'{affordable[-1]} scenarios')
+    return step
+
+def job_key(params):
+    """Dedup key of the job that computes a forecast"""
+    digest = hashlib.sha1(repr((MODEL_VERSION, tuple(params))).encode()).hexdigest()
+    return f'forecast:{digest}'
+
+def params_to_json(params):
+    return dict(params._asdict(), bid_model=params.bid_model._asdict(),
+                history=[list(entry) for entry in params.history])
+
+def params_from_json(data):
+    return ForecastParams(**dict(
+        data,
+        bid_model=BidModel(**data['bid_model']),
+        history=tuple(tuple(entry) for entry in data['history'])
+    ))
+
+def cached(params):
+    """The cached forecast for these parameters, or None"""
+    with _lock:
+        if params in _cache:
+            _cache.move_to_end(params)
+            _totals['hits'] += 1
+            return _cache[params]
+        _totals['misses'] += 1
+        return None
+
+def remember(params, result):
+    with _lock:
+        _cache[params] = result
+        while len(_cache) > current_app.config['FORECAST_CACHE_SIZE']:
+            _cache.popitem(last=False)
+
+def cached_forecast(params):
+    """run_forecast() through a bounded LRU cache keyed by the parameters"""
+    result = cached(params)
+    if result is None:
+        result = run_forecast(params)
+        remember(params, result)
+    return result
+
+def stats():
+    with _lock:
+        return dict(_totals, size=len(_cache))
+
+def calibrate(discounts):
+    """Bid model from observed discounts on the pool (fractions), or the default with too few"""
+    if len(discounts) < MIN_CALIBRATION_BIDS:
+        return BidModel(DEFAULT_MEAN_DISCOUNT, DEFAULT_DISCOUNT_SPREAD, MAX_DISCOUNT)
+    discounts = [min(max(d, 0.0), MAX_DISCOUNT) for d in discounts]
+    mean = sum(discounts) / len(discounts)
+    spread = (sum((d - mean) ** 2 for d in discounts) / (len(discounts) - 1)) ** 0.5
+    # Rounded so funds with similar bidding share cache entries
+    return BidModel(round(mean, 3), round(max(spread, 0.01), 3), MAX_DISCOUNT)
+
+def fund_params(chitfund, scenarios=None):
+    """ForecastParams for a fund: members in user id order, its settled rounds and its bidding so far.
+
+    `scenarios` is the count asked for, if any (see scenario_count()).
+    Returns (params, member_ids) where member_ids[i] is the user behind index i.
+    """
+    member_ids = [
+        user_id for (user_id,) in db.session.query(chitfund_members.c.user_id).filter(
+            chitfund_members.c.chitfund_id == chitfund.id
+        ).order_by(chitfund_members.c.user_id)
+    ]
+    index = {user_id: i for i, user_id in enumerate(member_ids)}
+    pool = len(member_ids) * chitfund.monthly_contribution_paise
+
+    # Settled rounds before the last, replayed as they happened
+    history = []
+    settled = db.session.query(Round.round_number, Round.winner_id, Round.winning_bid_paise).filter(
+        Round.chitfund_id == chitfund.id,
+        Round.status == 'completed',
+        Round.round_number < len(member_ids)
+    ).order_by(Round.round_number)
+    for round_number, winner_id, winning_bid in settled:
+        if round_number != len(history) + 1 or winner_id not in index:
+            break
+        history.append((index[winner_id], winning_bid))
+
+    bids = db.session.query(Bid.amount_paise, Round.pooled_amount_paise).join(
+        Round, Round.id == Bid.round_id
+    ).filter(Round.chitfund_id == chitfund.id)
+    discounts = [1 - amount / (round_pool or pool) for amount, round_pool in bids if round_pool or pool]
+
+    params = ForecastParams(
+        member_count=len(member_ids),
+        contribution_paise=chitfund.monthly_contribution_paise,
+        history=tuple(history),
+        bid_model=calibrate(discounts),
+        scenarios=scenario_count(len(member_ids), scenarios),
+        seed=0
+    )
+    return params, member_ids
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Forecast member outcomes of a chit fund')
+    parser.add_argument('--fund', type=int, help='Forecast this fund, including its settled rounds')
+    parser.add_argument('--members', type=int, help='Members (and rounds) of a hypothetical fund')
+    parser.add_argument('--contribution', type=float, help='Monthly contribution in rupees')
+    parser.add_argument('--scenarios', type=int, help='Monte Carlo scenarios, rounded up to one of '
+                        'SCENARIO_STEPS (default FORECAST_SCENARIOS)')
+    args = parser.parse_args(argv)
+    if not args.fund and not (args.members and args.contribution):
+        parser.error('Give --fund, or --members and --contribution')
+
+    from app import app
+    from money import to_paise
+    with app.app_context():
+        try:
+            if args.fund:
+                chitfund = ChitFund.query.get(args.fund)
+                if not chitfund:
+                    parser.error(f'No chit fund {args.fund}')
+                params, _ = fund_params(chitfund, args.scenarios)
+            else:
+                params = ForecastParams(
+                    args.members, to_paise(args.contribution), (), calibrate([]),
+                    scenario_count(args.members, args.scenarios), 0
+                )
+            result = run_forecast(params)
+        except (RuntimeError, ValueError) as e:
+            parser.error(str(e))
+
+    print(f"{result['member_count']} members, pool Rs.{result['pool']:,.2f}, "
+          f"{result['scenarios']} scenarios, bid model {result['bid_model']}")
+    print(f"{'round':>5}  {'payout (p10 / p50 / p90)':>36}  {'net gain':>12}  {'annual IRR p50':>14}")
+    for row in result['by_round']:
+        payout, net, rate = row['payout'], row['net_gain'], row['annual_irr']
+        rate = f"{rate['p50']:.1%}" if rate else 'n/a'
+        print(f"{row['round_number']:>5}  "
+              f"{payout['p10']:>11,.2f} / {payout['p50']:>9,.2f} / {payout['p90']:>9,.2f}  "
+              f"{net['mean']:>12,.2f}  {rate:>14}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
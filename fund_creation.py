@@ -0,0 +1,130 @@
+from datetime import datetime
+from models import db, User, ChitFund, Round, Payment, chitfund_members
+from money import to_paise
+
+# Upper bound on funds created by one request
+MAX_FUNDS_PER_REQUEST = 200
+
+
+def fund_spec_from_json(data):
+    """Fund fields from one JSON object; raises ValueError on bad numbers"""
+    if not isinstance(data, dict):
+        raise ValueError('Each fund must be a JSON object')
+    return {
+        'name': data.get('name'),
+        'member_ids': [int(member_id) for member_id in data.get('members', [])],
+        'monthly_contribution_paise': to_paise(data.get('monthly_contribution', 0)),
+        'duration': int(data.get('duration', 0))
+    }
+
+
+def fund_spec_from_form(form):
+    member_ids = form.get('member_ids', '').strip().split(',')
+    return {
+        'name': form.get('name'),
+        'member_ids': [int(member_id) for member_id in member_ids if member_id.strip()],
+        'monthly_contribution_paise': to_paise(form.get('monthly_contribution', 0)),
+        'duration': int(form.get('duration', 0))
+    }
+
+
+def _validate(spec, creator_id):
+    """Error message for a fund spec, or None; adds the creator to its members"""
+    if not all([spec['name'], spec['monthly_contribution_paise'], spec['duration']]):
+        return 'Missing required fields'
+
+    # Add creator to members if not already included
+    if creator_id not in spec['member_ids']:
+        spec['member_ids'].append(creator_id)
+
+    if len(set(spec['member_ids'])) != len(spec['member_ids']):
+        return 'Each member can only be added once'
+
+    # Validate member count matches duration
+    member_count = len(spec['member_ids'])
+    if member_count != spec['duration']:
+        return f"Number of members ({member_count}) must match duration ({spec['duration']})"
+    return None
+
+
+def create_funds(creator_id, specs):
+    """Create chit funds with their members, first rounds and pending payments.
+
+    All member IDs across every fund are checked with one query, and
+    memberships and first-round payments for all funds are written with one
+    executemany INSERT each. Either every fund is created or none is.
+
+    Returns (success, result) where result is a list of
+    {chitfund_id, first_round_id, member_count} on success and an error
+    message otherwise.
+    """
+    if not specs:
+        return False, 'No chit funds provided'
+    if len(specs) > MAX_FUNDS_PER_REQUEST:
+        return False, f'At most {MAX_FUNDS_PER_REQUEST} chit funds can be created at once'
+
+    for index, spec in enumerate(specs):
+        error = _validate(spec, creator_id)
+        if error:
+            return False, error if len(specs) == 1 else f'Fund {index + 1}: {error}'
+
+    member_ids = {member_id for spec in specs for member_id in spec['member_ids']}
+    known_ids = {
+        user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(member_ids))
+    }
+    unknown_ids = sorted(member_ids - known_ids)
+    if unknown_ids:
+        return False, f"Unknown member IDs: {', '.join(str(user_id) for user_id in unknown_ids)}"
+
+    now = datetime.utcnow()
+    try:
+        funds = [ChitFund(
+            name=spec['name'],
+            creator_id=creator_id,
+            member_count=len(spec['member_ids']),
+            monthly_contribution_paise=spec['monthly_contribution_paise'],
+            duration=spec['duration'],
+            current_round=1,
+            start_date=now,
+            created_at=now
+        ) for spec in specs]
+        db.session.add_all(funds)
+        db.session.flush()  # Get the fund ids without committing
+
+        db.session.execute(Round.__table__.insert(), [{
+            'chitfund_id': fund.id,
+            'round_number': 1,
+            'status': 'upcoming',  # Bidding opens once every member has paid
+            'start_date': now
+        } for fund in funds])
+        round_ids = dict(db.session.query(Round.chitfund_id, Round.id).filter(
+            Round.chitfund_id.in_([fund.id for fund in funds]),
+            Round.round_number == 1
+        ))
+
+        db.session.execute(chitfund_members.insert(), [
+            {'chitfund_id': fund.id, 'user_id': member_id}
+            for fund, spec in zip(funds, specs)
+            for member_id in spec['member_ids']
+        ])
+        db.session.execute(Payment.__table__.insert(), [{
+            'chitfund_id': fund.id,
+            'round_id': round_ids[fund.id],
+            'user_id': member_id,
+            'amount_paise': spec['monthly_contribution_paise'],
+            'status': 'pending',
+            'created_at': now
+        } for fund, spec in zip(funds, specs) for member_id in spec['member_ids']])
+
+        # Read before committing, which expires the new funds
+        created = [{
+            'chitfund_id': fund.id,
+            'first_round_id': round_ids[fund.id],
+            'member_count': fund.member_count
+        } for fund in funds]
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return True, created
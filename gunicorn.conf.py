@@ -0,0 +1,18 @@
+"""Gunicorn settings for a long-running server: gunicorn -c gunicorn.conf.py wsgi:app
+
+gevent workers serve each connection on a greenlet, so an idle live-update
+stream (see events.py) costs a few kilobytes instead of a thread and one
+worker holds thousands. config.py notices the gevent worker and raises
+EVENT_MAX_STREAMS to match. Run the job workers beside it with
+``python jobs.py``. Vercel deployments (vercel.json) do not use this file.
+
+Settings: PORT (8000), WEB_CONCURRENCY (CPU count), GUNICORN_WORKER_CONNECTIONS
+(4000, which must stay above EVENT_MAX_STREAMS to leave room for page requests).
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'gevent'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 4000))
@@ -0,0 +1,110 @@
+"""Primary-key lookups of users, funds and rounds cached for the request.
+
+Each request keeps an identity map on ``flask.g`` so repeated lookups of the
+same row cost nothing, and hit/miss counts are reported in the
+X-Identity-Cache response header and, process-wide, by ``stats()``, which
+sql_profiler serves at /metrics.
+
+With PROFILE_CACHE_TTL set, the session user's profile row is also kept
+across requests for that many seconds and merged into each request's
+session without a query. Savings credited by settlement can then show up
+to PROFILE_CACHE_TTL seconds late, so it is off (0) by default.
+"""
+import threading
+import time
+from flask import g, current_app
+from sqlalchemy.orm import make_transient_to_detached
+from models import db, User, ChitFund, Round
+
+_lock = threading.Lock()
+_totals = {'hits': 0, 'misses': 0, 'profile_hits': 0, 'profile_misses': 0}
+_profiles = {}  # user_id -> (expires_at, column values)
+
+PROFILE_COLUMNS = [column.key for column in User.__table__.columns]
+
+def _count(name):
+    with _lock:
+        _totals[name] += 1
+    if 'identity_stats' in g:
+        g.identity_stats[name] += 1
+
+def _request_cache():
+    if 'identity_cache' not in g:
+        g.identity_cache = {}
+        g.identity_stats = dict.fromkeys(_totals, 0)
+    return g.identity_cache
+
+def load(model, pk):
+    """Get a row by primary key, at most once per request"""
+    if pk is None:
+        return None
+    cache = _request_cache()
+    key = (model.__name__, int(pk))
+    if key in cache:
+        _count('hits')
+        return cache[key]
+
+    _count('misses')
+    obj = model.query.get(pk)
+    cache[key] = obj
+    return obj
+
+def get_user(user_id):
+    return load(User, user_id)
+
+def get_chitfund(chitfund_id):
+    return load(ChitFund, chitfund_id)
+
+def get_round(round_id):
+    return load(Round, round_id)
+
+def get_session_user(user_id):
+    """The logged-in user, served from the cross-request profile cache when enabled"""
+    ttl = current_app.config.get('PROFILE_CACHE_TTL', 0)
+    if not ttl:
+        return get_user(user_id)
+
+    cache = _request_cache()
+    key = ('User', int(user_id))
+    if key in cache:
+        _count('hits')
+        return cache[key]
+
+    cached = _profiles.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        _count('profile_hits')
+        # Rebuild a detached instance and attach it without touching the database
+        user = User(**cached[1])
+        make_transient_to_detached(user)
+        user = db.session.merge(user, load=False)
+        cache[key] = user
+        return user
+
+    _count('profile_misses')
+    user = get_user(user_id)
+    if user:
+        _profiles[user_id] = (
+            time.monotonic() + ttl,
+            {column: getattr(user, column) for column in PROFILE_COLUMNS}
+        )
+    return user
+
+def invalidate_profile(user_id):
+    """Drop a user's cached profile, e.g. after changing their details"""
+    _profiles.pop(user_id, None)
+
+def stats():
+    """Process-wide hit and miss counters since startup"""
+    with _lock:
+        return dict(_totals)
+
+def init_app(app):
+    @app.after_request
+    def add_identity_cache_header(response):
+        if 'identity_stats' in g:
+            counts = g.identity_stats
+            response.headers['X-Identity-Cache'] = (
+                f"hits={counts['hits'] + counts['profile_hits']}; "
+                f"misses={counts['misses']}"
+            )
+        return response
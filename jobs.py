@@ -0,0 +1,263 @@
+"""Background jobs stored in the database, with no external broker.
+
+``enqueue`` adds a row to the ``job`` table inside the caller's transaction,
+so a job exists exactly when the change that needed it is committed. After
+committing, the caller passes the job to ``dispatch``. Worker threads pick
+jobs up; they are started by the first request, or run on their own with
+``python jobs.py``.
+
+- Workers claim a job with a conditional UPDATE, so each attempt runs once
+  even with several worker processes.
+- A failed job is retried with exponential backoff until max_attempts.
+- A job whose worker died is reclaimed after JOBS_LOCK_TIMEOUT seconds.
+- A dedup key (e.g. ``settle:<round_id>``) keeps at most one job per key.
+- What a handler returns is stored as JSON in ``job.result``, so any
+  process can read the outcome of a job another one ran.
+
+With JOBS_INLINE (the default on serverless deployments) ``dispatch`` runs
+the job straight away in the calling request instead.
+
+Settings: JOBS_INLINE, JOBS_WORKERS (2), JOBS_POLL_SECONDS (1),
+JOBS_MAX_ATTEMPTS (5), JOBS_RETRY_SECONDS (2), JOBS_LOCK_TIMEOUT (300).
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_wake = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+def job_handler(kind):
+    """Register a function(payload) that runs jobs of this kind"""
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+def enqueue(kind, payload=None, dedup_key=None, max_attempts=None):
+    """Add a job in the current transaction and return it; commit to make it runnable.
+
+    If a job with the same dedup key exists it is returned instead, and
+    re-queued if it had failed. Callers that can race on the same key should
+    hold a lock on the row the job is about (place_bid holds the round's);
+    the unique index on dedup_key is the backstop.
+    """
+    if dedup_key:
+        job = Job.query.filter_by(dedup_key=dedup_key).first()
+        if job:
+            if job.status == 'failed':
+                job.status = 'queued'
+                job.attempts = 0
+                job.run_after = datetime.utcnow()
+                job.last_error = None
+            return job
+
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        dedup_key=dedup_key,
+        status='queued',
+        attempts=0,
+        max_attempts=max_attempts or current_app.config['JOBS_MAX_ATTEMPTS'],
+        run_after=datetime.utcnow()
+    )
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+def dispatch(job_id):
+    """Hand a committed job over to be run.
+
+    Returns (status, result): inline mode runs the job now and returns its
+    outcome; otherwise the workers are woken and ('queued', None) returned.
+    """
+    if current_app.config['JOBS_INLINE']:
+        return run_job(job_id, 'inline')
+    _wake.set()
+    return 'queued', None
+
+def _claim(job_id, worker):
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config['JOBS_LOCK_TIMEOUT'])
+    claimed = Job.query.filter(
+        Job.id == job_id,
+        db.or_(
+            Job.status == 'queued',
+            db.and_(Job.status == 'running', Job.locked_at < stale)
+        )
+    ).update({
+        Job.status: 'running',
+        Job.locked_at: now,
+        Job.locked_by: worker,
+        Job.attempts: Job.attempts + 1
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(claimed)
+
+def run_job(job_id, worker):
+    """Claim and run one job. Returns (status, result), or (None, None) if another worker has it"""
+    if not _claim(job_id, worker):
+        return None, None
+
+    job = Job.query.get(job_id)
+    kind, payload = job.kind, json.loads(job.payload)
+    started = time.perf_counter()
+    try:
+        handler = _handlers.get(kind)
+        if handler is None:
+            raise LookupError(f'No handler registered for {kind} jobs')
+        result = handler(payload)
+    except Exception as e:
+        db.session.rollback()
+        job = Job.query.get(job_id)
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+        else:
+            delay = current_app.config['JOBS_RETRY_SECONDS'] * 2 ** (job.attempts - 1)
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+        job.last_error = str(e)
+        db.session.commit()
+        # Only the final attempt is an error; earlier ones will be retried
+        level = logging.ERROR if job.status == 'failed' else logging.WARNING
+        logger.log(level, 'Job failed', exc_info=True, extra={
+            'job_id': job_id,
+            'job_kind': kind,
+            'attempts': job.attempts,
+            'job_status': job.status
+        })
+        return job.status, None
+
+    Job.query.filter_by(id=job_id).update({
+        Job.status: 'done',
+        Job.finished_at: datetime.utcnow(),
+        Job.last_error: None,
+        Job.result: json.dumps(result, default=str) if result is not None else None
+    }, synchronize_session=False)
+    db.session.commit()
+    logger.info('Job done', extra={
+        'job_id': job_id,
+        'job_kind': kind,
+        'worker': worker,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+    return 'done', result
+
+def run_next(worker):
+    """Run the oldest runnable job; returns False if there was none"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=current_app.config['JOBS_LOCK_TIMEOUT'])
+    job_id = db.session.query(Job.id).filter(
+        db.or_(
+            db.and_(Job.status == 'queued', Job.run_after <= now),
+            db.and_(Job.status == 'running', Job.locked_at < stale)
+        )
+    ).order_by(Job.id).limit(1).scalar()
+    db.session.rollback()  # End the read so the claim sees fresh data
+    if job_id is None:
+        return False
+    run_job(job_id, worker)
+    return True
+
+def wait_for(job_id, timeout=30.0, interval=0.05):
+    """Block until a job is done or failed; returns its status (None on timeout)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = db.session.query(Job.status).filter_by(id=job_id).scalar()
+        db.session.rollback()  # Start a new snapshot for the next poll
+        if status in ('done', 'failed'):
+            return status
+        time.sleep(interval)
+    return None
+
+class Worker(threading.Thread):
+    """Polls for jobs until stopped; woken early by dispatch() in this process"""
+
+    def __init__(self, app, number):
+        super().__init__(name=f'job-worker-{number}', daemon=True)
+        self.app = app
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{number}'
+        self.stopping = threading.Event()
+
+    def run(self):
+        poll = self.app.config['JOBS_POLL_SECONDS']
+        while not self.stopping.is_set():
+            try:
+                with self.app.app_context():
+                    ran = run_next(self.worker_id)
+            except Exception:
+                logger.exception('Job worker error', extra={'worker': self.worker_id})
+                ran = False
+            if not ran:
+                _wake.wait(poll)
+                _wake.clear()
+
+    def stop(self):
+        self.stopping.set()
+        _wake.set()
+
+def start_workers(app, count=None):
+    """Start this process's worker threads (once)"""
+    with _workers_lock:
+        if _workers:
+            return _workers
+        for number in range(count if count is not None else app.config['JOBS_WORKERS']):
+            worker = Worker(app, number)
+            worker.start()
+            _workers.append(worker)
+        return _workers
+
+def stop_workers():
+    with _workers_lock:
+        for worker in _workers:
+            worker.stop()
+        for worker in _workers:
+            worker.join()
+        _workers.clear()
+
+def init_app(app):
+    if app.config['JOBS_INLINE'] or not app.config['JOBS_WORKERS']:
+        return
+
+    @app.before_request
+    def start_job_workers():
+        # Started lazily so scripts that only build the app do not poll
+        if not _workers:
+            start_workers(app)
+
+if __name__ == '__main__':
+    import argparse
+    from app import create_app
+    import jobs  # The module the routes registered their handlers on, not __main__
+
+    parser = argparse.ArgumentParser(description='Run background job workers')
+    parser.add_argument('--workers', type=int, help='Worker threads (default JOBS_WORKERS)')
+    parser.add_argument('--once', action='store_true', help='Run every runnable job, then exit')
+    args = parser.parse_args()
+
+    app = create_app()
+    if args.once:
+        with app.app_context():
+            count = 0
+            while jobs.run_next(f'{socket.gethostname()}:{os.getpid()}:once'):
+                count += 1
+        print(f"Ran {count} jobs")
+    else:
+        workers = jobs.start_workers(app, args.workers)
+        print(f"Started {len(workers)} job workers; press Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            jobs.stop_workers()
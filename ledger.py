@@ -0,0 +1,269 @@
+"""Savings ledger: every change to a user's savings as an append-only entry.
+
+``User.savings_paise`` is a running total; ``ledger_entry`` holds the credits
+and debits that explain it. Settlement posts a round's payouts in bulk (the
+winner's bid, and every other payer's dividend with one INSERT ... SELECT),
+then moves the balances with one UPDATE that sums those entries, so a balance
+never changes without the entries behind it.
+
+Reading a balance or a statement does not replay history. A
+``balance_snapshot`` row holds a user's balance up to some entry. A balance
+is that user's latest snapshot plus the entries after it (the tail), found
+through the (user_id, id) index. ``take_snapshots`` snapshots every user
+whose tail has reached LEDGER_SNAPSHOT_ENTRIES, in one statement, so tails
+stay short however long the history grows.
+
+Usage:
+    python ledger.py snapshot [--min-entries N]        # periodically, from cron
+    python ledger.py check [--full] [--fix]             # User.savings against the ledger
+    python ledger.py statement USER_ID [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, literal, select
+from money import format_paise
+from models import db, User, LedgerEntry, BalanceSnapshot
+
+# The entries settlement posts for a round, credited together by credit_round()
+ROUND_REASONS = ('winning_bid', 'dividend', 'final_payout')
+
+# Entry ids are assigned on insert but only visible on commit; leaving the
+# newest entries out of a snapshot keeps one whose transaction is still open
+# from ending up behind it, where no tail would ever include it
+SNAPSHOT_LAG = timedelta(seconds=60)
+
+_net = LedgerEntry.credit_paise - LedgerEntry.debit_paise
+
+def post(entries):
+    """Append entries (dicts of LedgerEntry columns) with one executemany, without committing"""
+    if entries:
+        db.session.execute(LedgerEntry.__table__.insert(), entries)
+
+def post_from_select(columns, statement):
+    """Append the rows a SELECT produces with one INSERT ... SELECT, without committing"""
+    db.session.execute(LedgerEntry.__table__.insert().from_select(columns, statement))
+
+def credit_round(round_id):
+    """Add a round's settlement entries to the users' savings in one UPDATE, without committing"""
+    entries = and_(LedgerEntry.round_id == round_id, LedgerEntry.reason.in_(ROUND_REASONS))
+    amount = select(func.sum(_net)).where(entries, LedgerEntry.user_id == User.id).scalar_subquery()
+    return User.query.filter(
+        User.id.in_(select(LedgerEntry.user_id).where(entries))
+    ).update({User.savings_paise: User.savings_paise + amount}, synchronize_session=False)
+
+def latest_snapshot(user_id, before_entry_id=None):
+    query = BalanceSnapshot.query.filter(BalanceSnapshot.user_id == user_id)
+    if before_entry_id is not None:
+        query = query.filter(BalanceSnapshot.entry_id < before_entry_id)
+    return query.order_by(BalanceSnapshot.entry_id.desc()).first()
+
+def balance(user_id, before_entry_id=None):
+    """A user's balance in paise, from their latest snapshot plus the entries after it.
+
+    With before_entry_id, the balance just before that entry was posted.
+    """
+    snapshot = latest_snapshot(user_id, before_entry_id)
+    opening, after = (snapshot.balance_paise, snapshot.entry_id) if snapshot else (0, 0)
+    tail = db.session.query(func.coalesce(func.sum(_net), 0)).filter(
+        LedgerEntry.user_id == user_id,
+        LedgerEntry.id > after
+    )
+    if before_entry_id is not None:
+        tail = tail.filter(LedgerEntry.id < before_entry_id)
+    return opening + int(tail.scalar())
+
+def statement(user_id, since=None, until=None):
+    """A user's entries created in [since, until) with running balances, in paise.
+
+    Returns (opening_balance, entries); each entry is a dict ending in the
+    balance after it. Only the entries in range are read, plus the tail
+    behind the snapshot before them for the opening balance.
+    """
+    opening = 0
+    if since is not None:
+        first = db.session.query(func.min(LedgerEntry.id)).filter(
+            LedgerEntry.user_id == user_id,
+            LedgerEntry.created_at >= since
+        ).scalar()
+        opening = balance(user_id, before_entry_id=first)
+
+    query = LedgerEntry.query.filter(LedgerEntry.user_id == user_id)
+    if since is not None:
+        query = query.filter(LedgerEntry.created_at >= since)
+    if until is not None:
+        query = query.filter(LedgerEntry.created_at < until)
+
+    running = opening
+    entries = []
+    for entry in query.order_by(LedgerEntry.id):
+        running += entry.credit_paise - entry.debit_paise
+        entries.append({
+            'id': entry.id,
+            'created_at': entry.created_at,
+            'reason': entry.reason,
+            'chitfund_id': entry.chitfund_id,
+            'round_id': entry.round_id,
+            'credit_paise': entry.credit_paise,
+            'debit_paise': entry.debit_paise,
+            'balance_paise': running
+        })
+    return opening, entries
+
+def _latest_snapshots():
+    """Each user's id with the entry_id of their latest snapshot (NULL if none)"""
+    return select(
+        User.id.label('user_id'),
+        select(func.max(BalanceSnapshot.entry_id)).where(
+            BalanceSnapshot.user_id == User.id
+        ).scalar_subquery().label('entry_id')
+    ).subquery()
+
+def take_snapshots(min_entries=None):
+    """Snapshot every user with at least min_entries entries since their last snapshot.
+
+    One INSERT ... SELECT. Each user's latest snapshot is found through the
+    unique (user_id, entry_id) index and their tail through (user_id, id),
+    so the work follows the number of users and new entries, not the size of
+    the ledger. Returns the number of snapshots written.
+    """
+    if min_entries is None:
+        min_entries = current_app.config['LEDGER_SNAPSHOT_ENTRIES']
+    now = datetime.utcnow()
+    # The newest entry old enough to be committed (see SNAPSHOT_LAG), found
+    # by walking the primary key back over the last few seconds of entries
+    last_id = db.session.query(LedgerEntry.id).filter(
+        LedgerEntry.created_at < now - SNAPSHOT_LAG
+    ).order_by(LedgerEntry.id.desc()).limit(1).scalar()
+    if last_id is None:
+        return 0
+
+    # Per-user aggregates of the tail as correlated subqueries, so each is a
+    # range on (user_id, id) whatever join order the planner would pick
+    latest = _latest_snapshots()
+    in_tail = and_(
+        LedgerEntry.user_id == latest.c.user_id,
+        LedgerEntry.id > func.coalesce(latest.c.entry_id, 0),
+        LedgerEntry.id <= last_id
+    )
+    tails = select(
+        latest.c.user_id,
+        latest.c.entry_id,
+        select(func.count(LedgerEntry.id)).where(in_tail).scalar_subquery().label('entries'),
+        select(func.max(LedgerEntry.id)).where(in_tail).scalar_subquery().label('last_entry_id'),
+        select(func.sum(_net)).where(in_tail).scalar_subquery().label('amount')
+    ).subquery()
+    snapshots = select(
+        tails.c.user_id,
+        tails.c.last_entry_id,
+        func.coalesce(BalanceSnapshot.balance_paise, 0) + tails.c.amount,
+        literal(now)
+    ).select_from(tails).outerjoin(BalanceSnapshot, and_(
+        BalanceSnapshot.user_id == tails.c.user_id,
+        BalanceSnapshot.entry_id == tails.c.entry_id
+    )).where(tails.c.entries >= max(min_entries, 1))
+
+    result = db.session.execute(BalanceSnapshot.__table__.insert().from_select(
+        ['user_id', 'entry_id', 'balance_paise', 'created_at'], snapshots
+    ))
+    db.session.commit()
+    return result.rowcount
+
+def ledger_balances(full=False):
+    """(user_id, savings_paise, ledger balance) for every user.
+
+    Normally snapshot plus tail; with full=True every entry is summed and
+    snapshots are ignored, which also catches a wrong snapshot.
+    """
+    if full:
+        return db.session.query(
+            User.id, User.savings_paise, func.coalesce(func.sum(_net), 0)
+        ).outerjoin(LedgerEntry, LedgerEntry.user_id == User.id).group_by(
+            User.id, User.savings_paise
+        ).order_by(User.id)
+
+    latest = _latest_snapshots()
+    return db.session.query(
+        User.id,
+        User.savings_paise,
+        func.coalesce(func.max(BalanceSnapshot.balance_paise), 0) + func.coalesce(func.sum(_net), 0)
+    ).join(latest, latest.c.user_id == User.id).outerjoin(BalanceSnapshot, and_(
+        BalanceSnapshot.user_id == User.id,
+        BalanceSnapshot.entry_id == latest.c.entry_id
+    )).outerjoin(LedgerEntry, and_(
+        LedgerEntry.user_id == User.id,
+        LedgerEntry.id > func.coalesce(latest.c.entry_id, 0)
+    )).group_by(User.id, User.savings_paise).order_by(User.id)
+
+def check_balances(full=False, fix=False):
+    """Compare User.savings against the ledger.
+
+    Returns a list of (user_id, stored, ledger) mismatches in paise. With
+    fix=True each stored balance is moved by the difference (not overwritten,
+    so a settlement committing meanwhile is not lost).
+    """
+    mismatches = [
+        (user_id, stored, int(ledger))
+        for user_id, stored, ledger in ledger_balances(full)
+        if stored != ledger
+    ]
+    if fix:
+        for user_id, stored, ledger in mismatches:
+            User.query.filter_by(id=user_id).update({
+                User.savings_paise: User.savings_paise + (ledger - stored)
+            }, synchronize_session=False)
+        db.session.commit()
+    return mismatches
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Savings ledger maintenance')
+    commands = parser.add_subparsers(dest='command', required=True)
+    snapshot = commands.add_parser('snapshot', help='Snapshot users with long tails')
+    snapshot.add_argument('--min-entries', type=int, help='Tail length that triggers a snapshot '
+                          '(default LEDGER_SNAPSHOT_ENTRIES)')
+    check = commands.add_parser('check', help='Compare User.savings against the ledger')
+    check.add_argument('--full', action='store_true', help='Sum every entry instead of snapshot plus tail')
+    check.add_argument('--fix', action='store_true', help='Move stored balances to the ledger balance')
+    history = commands.add_parser('statement', help="Print a user's entries with running balances")
+    history.add_argument('user_id', type=int)
+    history.add_argument('--since', type=_date, help='On or after this date (YYYY-MM-DD)')
+    history.add_argument('--until', type=_date, help='Before this date (YYYY-MM-DD)')
+    args = parser.parse_args(argv)
+
+    from app import app
+    with app.app_context():
+        if args.command == 'snapshot':
+            print(f"Wrote {take_snapshots(args.min_entries)} balance snapshots")
+            return 0
+
+        if args.command == 'statement':
+            opening, entries = statement(args.user_id, args.since, args.until)
+            print(f"Opening balance: Rs.{format_paise(opening)}")
+            for entry in entries:
+                amount = entry['credit_paise'] - entry['debit_paise']
+                print(f"{entry['created_at']:%Y-%m-%d %H:%M}  {entry['reason']:<16} "
+                      f"{'+' if amount >= 0 else '-'}{format_paise(abs(amount)):>12}  "
+                      f"{format_paise(entry['balance_paise']):>12}")
+            closing = entries[-1]['balance_paise'] if entries else opening
+            print(f"Closing balance: Rs.{format_paise(closing)}")
+            return 0
+
+        mismatches = check_balances(args.full, args.fix)
+        for user_id, stored, ledger in mismatches:
+            print(f"User {user_id}: savings is {format_paise(stored)}, ledger gives {format_paise(ledger)}")
+
+        if not mismatches:
+            print("All savings match the ledger")
+        elif args.fix:
+            print(f"Fixed {len(mismatches)} balances")
+        else:
+            print(f"Found {len(mismatches)} mismatched balances (run with --fix to repair)")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
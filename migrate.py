@@ -0,0 +1,466 @@
+"""Versioned schema migrations for SQLite and MySQL.
+
+Migrations live in migrations/NNNN_name.py and run in version order. Each
+defines ``upgrade(op)`` (and optionally ``downgrade(op)``) in terms of the
+``Operations`` helpers below, which check the live schema first, so a
+migration can be re-run safely on a database that already has its changes.
+The ``schema_migrations`` table records the version of every applied one.
+
+Backfills update rows in primary-key ranges of --batch-size, committing each
+chunk together with a checkpoint, so a long backfill holds locks only
+briefly, reports progress as it goes and, if interrupted, resumes from the
+last committed chunk. On MySQL, index builds and column drops run as online
+DDL (LOCK=NONE).
+
+Before applying anything, ``upgrade`` prints the plan with estimated timings
+(a backfill's first chunk is timed inside a transaction that is rolled
+back); ``--dry-run`` stops there.
+
+Usage:
+    python migrate.py status
+    python migrate.py upgrade [--to VERSION] [--dry-run] [--batch-size 5000]
+    python migrate.py downgrade --to VERSION
+    python migrate.py reset --yes            # drop every table, then upgrade
+"""
+import argparse
+import importlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.exc import IntegrityError
+from models import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+DEFAULT_BATCH_SIZE = 5000
+
+schema_migrations = db.Table('schema_migrations',
+    db.Column('version', db.Integer, primary_key=True, autoincrement=False),
+    db.Column('name', db.String(100), nullable=False),
+    db.Column('status', db.String(20), nullable=False),  # running, applied
+    db.Column('checkpoint', db.Text),  # JSON {backfill step: last primary key done}
+    db.Column('started_at', db.DateTime),
+    db.Column('applied_at', db.DateTime),
+    db.Column('duration_ms', db.Integer)
+)
+
+class MigrationError(Exception):
+    pass
+
+class Migration:
+    def __init__(self, version, name, module):
+        self.version = version
+        self.name = name
+        self.module = module
+
+    @property
+    def description(self):
+        return (self.module.__doc__ or self.name).strip().splitlines()[0]
+
+def load_migrations():
+    """Every migrations/NNNN_name.py, in version order"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r'^(\d{4})_(\w+)\.py$', filename)
+        if match:
+            module = importlib.import_module(f'migrations.{filename[:-3]}')
+            migrations.append(Migration(int(match.group(1)), match.group(2), module))
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise MigrationError('Two migrations share a version number')
+    return migrations
+
+class Step:
+    """One planned operation and its estimated duration"""
+
+    def __init__(self, description, rows=None, seconds=0.0, basis='instant'):
+        self.description = description
+        self.rows = rows
+        self.seconds = seconds
+        self.basis = basis  # instant, measured or estimated
+
+class Operations:
+    """Schema and data helpers handed to upgrade()/downgrade().
+
+    With dry_run set, nothing is changed: each call records a Step with its
+    estimated duration instead.
+    """
+
+    def __init__(self, version, dry_run=False, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, out=sys.stdout):
+        self.version = version
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.checkpoint = dict(checkpoint or {})
+        self.out = out
+        self.steps = []
+        self._read_seconds = {}
+
+    # -- Inspection --------------------------------------------------------
+
+    @property
+    def dialect(self):
+        return db.engine.dialect.name
+
+    def _inspector(self):
+        return inspect(db.engine)
+
+    def has_table(self, table):
+        return self._inspector().has_table(table)
+
+    def has_column(self, table, column):
+        return self.has_table(table) and any(
+            info['name'] == column for info in self._inspector().get_columns(table)
+        )
+
+    def has_index(self, table, name):
+        return self.has_table(table) and any(
+            info['name'] == name for info in self._inspector().get_indexes(table)
+        )
+
+    def quote(self, name):
+        return db.engine.dialect.identifier_preparer.quote(name)
+
+    def integer(self, expression):
+        """SQL casting an expression to an integer on either database"""
+        return f"CAST({expression} AS {'SIGNED' if self.dialect == 'mysql' else 'INTEGER'})"
+
+    def row_count(self, table):
+        if not self.has_table(table):
+            return 0
+        if self.dialect == 'mysql':
+            # The statistics estimate; COUNT(*) would scan a large table
+            rows = db.session.execute(text(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table'
+            ), {'table': table}).scalar()
+        else:
+            rows = db.session.execute(text(f'SELECT COUNT(*) FROM {self.quote(table)}')).scalar()
+        db.session.rollback()
+        return rows or 0
+
+    def _seconds_per_row_read(self, table):
+        """Time to read one row, sampled from the table (a floor for rewriting it)"""
+        if table not in self._read_seconds:
+            started = time.perf_counter()
+            rows = len(db.session.execute(
+                text(f'SELECT * FROM {self.quote(table)} LIMIT {self.batch_size}')
+            ).fetchall()) if self.has_table(table) else 0
+            db.session.rollback()
+            self._read_seconds[table] = (time.perf_counter() - started) / rows if rows else 0.0
+        return self._read_seconds[table]
+
+    # -- Running and planning ----------------------------------------------
+
+    def _plan(self, description, table=None, rewrites=0):
+        """Record a step; `rewrites` is roughly how many times the table is copied"""
+        rows = self.row_count(table) if table else None
+        if rows and rewrites:
+            # Writing costs more than reading; assume twice per copy
+            seconds = rows * self._seconds_per_row_read(table) * 2 * rewrites
+            self.steps.append(Step(description, rows, seconds, 'estimated'))
+        else:
+            self.steps.append(Step(description, rows))
+
+    def _run(self, sql, description, table=None, rewrites=0):
+        if self.dry_run:
+            self._plan(description, table, rewrites)
+            return
+        started = time.perf_counter()
+        with db.engine.begin() as connection:
+            connection.execute(text(sql))
+        self.log(f"{description} ({time.perf_counter() - started:.2f}s)")
+
+    def log(self, message):
+        print(f"  {message}", file=self.out, flush=True)
+
+    # -- Schema --------------------------------------------------------------
+
+    def create_table(self, table):
+        """Create a table from its model definition (with its indexes) if missing"""
+        if self.has_table(table.name):
+            return
+        if self.dry_run:
+            self._plan(f"create table {table.name}")
+            return
+        table.create(bind=db.engine)
+        self.log(f"created table {table.name}")
+
+    def drop_table(self, table):
+        if not self.has_table(table.name):
+            return
+        if self.dry_run:
+            self._plan(f"drop table {table.name}")
+            return
+        table.drop(bind=db.engine)
+        self.log(f"dropped table {table.name}")
+
+    # Tables that do not exist yet are created whole from their models by
+    # 0001, so column, index and backfill steps on them are skipped
+
+    def add_column(self, table, column, ddl):
+        if not self.has_table(table) or self.has_column(table, column):
+            return
+        # Adding a column is instant on SQLite and on MySQL 8 (ALGORITHM=INSTANT)
+        self._run(
+            f'ALTER TABLE {self.quote(table)} ADD COLUMN {column} {ddl}',
+            f"add column {table}.{column}"
+        )
+
+    def drop_column(self, table, column):
+        if not self.has_column(table, column):
+            return
+        online = ', ALGORITHM=INPLACE, LOCK=NONE' if self.dialect == 'mysql' else ''
+        self._run(
+            f'ALTER TABLE {self.quote(table)} DROP COLUMN {column}{online}',
+            f"drop column {table}.{column}", table, rewrites=1
+        )
+
+    def create_index(self, index):
+        """Create a model-defined index if missing; online on MySQL"""
+        table = index.table.name
+        if not self.has_table(table) or self.has_index(table, index.name):
+            return
+        columns = ', '.join(column.name for column in index.columns)
+        unique = 'UNIQUE ' if index.unique else ''
+        if self.dialect == 'mysql':
+            sql = (f'ALTER TABLE {self.quote(table)} ADD {unique}INDEX {index.name} ({columns}), '
+                   f'ALGORITHM=INPLACE, LOCK=NONE')
+        else:
+            sql = f'CREATE {unique}INDEX {index.name} ON {self.quote(table)} ({columns})'
+        try:
+            self._run(sql, f"create index {index.name} on {table}", table, rewrites=1)
+        except IntegrityError:
+            raise MigrationError(
+                f"Duplicate rows in {table} prevent creating {index.name}; clean them up and re-run"
+            )
+
+    def drop_index(self, table, name):
+        if not self.has_index(table, name):
+            return
+        sql = (f'DROP INDEX {name} ON {self.quote(table)}' if self.dialect == 'mysql'
+               else f'DROP INDEX {name}')
+        self._run(sql, f"drop index {name} on {table}")
+
+    def execute(self, sql, description, table=None):
+        """A one-off statement; keep it small, or use backfill()"""
+        self._run(sql, description, table, rewrites=1 if table else 0)
+
+    # -- Data ------------------------------------------------------------------
+
+    def backfill(self, step, table, assignments, where=None, params=None, key='id'):
+        """UPDATE `table` SET `assignments` in primary-key chunks of batch_size.
+
+        Each chunk commits with a checkpoint under `step`, so an interrupted
+        backfill continues after the last committed chunk when re-run.
+        `params` are bound into `assignments` and `where`.
+        """
+        if not self.has_table(table):
+            return
+        bounds = db.session.execute(text(
+            f'SELECT MIN({key}), MAX({key}) FROM {self.quote(table)}'
+        )).first()
+        db.session.rollback()
+        low, high = bounds
+        if low is None:
+            return
+        params = dict(params or {})
+
+        start = self.checkpoint.get(step, low - 1)
+        condition = f' AND ({where})' if where else ''
+        sql = text(
+            f'UPDATE {self.quote(table)} SET {assignments} '
+            f'WHERE {key} > :low AND {key} <= :high{condition}'
+        )
+        chunks = max(1, -(-(high - start) // self.batch_size))
+
+        if self.dry_run:
+            self.steps.append(self._estimate_backfill(step, table, sql, params, start, chunks))
+            return
+        if start >= high:
+            return
+
+        total_rows = self.row_count(table)
+        done = 0
+        chunk = 0
+        started = time.perf_counter()
+        while start < high:
+            end = min(start + self.batch_size, high)
+            result = db.session.execute(sql, dict(params, low=start, high=end))
+            self.checkpoint[step] = end
+            db.session.execute(schema_migrations.update().where(
+                schema_migrations.c.version == self.version
+            ).values(checkpoint=json.dumps(self.checkpoint)))
+            db.session.commit()
+            done += result.rowcount
+            chunk += 1
+            start = end
+
+            elapsed = time.perf_counter() - started
+            left = elapsed / chunk * (chunks - chunk)
+            self.log(f"{step}: chunk {chunk}/{chunks}, {key} <= {end}, {done:,} rows updated"
+                     f"{f', ~{left:.0f}s left' if start < high else ''}")
+        self.log(f"{step}: backfilled {done} of ~{total_rows} rows in {time.perf_counter() - started:.2f}s")
+
+    def _estimate_backfill(self, step, table, sql, params, start, chunks):
+        description = f"backfill {step} ({chunks} chunk{'s' if chunks != 1 else ''} of {self.batch_size})"
+        rows = self.row_count(table)
+        # Time the first chunk for real, then roll it back
+        try:
+            started = time.perf_counter()
+            db.session.execute(sql, dict(params, low=start, high=start + self.batch_size))
+            seconds = time.perf_counter() - started
+            db.session.rollback()
+            return Step(description, rows, seconds * chunks, 'measured')
+        except Exception:
+            # The columns it needs are added by an earlier, not yet applied step
+            db.session.rollback()
+            seconds = rows * self._seconds_per_row_read(table) * 2
+            return Step(description, rows, seconds, 'estimated')
+
+# -- Version table ---------------------------------------------------------
+
+def _records():
+    schema_migrations.create(bind=db.engine, checkfirst=True)
+    rows = db.session.execute(schema_migrations.select()).mappings().all()
+    db.session.rollback()
+    return {row['version']: dict(row) for row in rows}
+
+def status():
+    """[(migration, record or None)] for every migration"""
+    records = _records()
+    return [(migration, records.get(migration.version)) for migration in load_migrations()]
+
+def pending(target=None):
+    records = _records()
+    return [
+        (migration, records.get(migration.version))
+        for migration in load_migrations()
+        if (records.get(migration.version) or {}).get('status') != 'applied'
+        and (target is None or migration.version <= target)
+    ]
+
+def plan(target=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Dry-run every pending migration: [(migration, [Step])]"""
+    planned = []
+    for migration, record in pending(target):
+        checkpoint = json.loads(record['checkpoint']) if record and record['checkpoint'] else None
+        op = Operations(migration.version, dry_run=True, batch_size=batch_size, checkpoint=checkpoint)
+        migration.module.upgrade(op)
+        planned.append((migration, op.steps))
+    return planned
+
+def print_plan(planned, out=sys.stdout):
+    total = 0.0
+    for migration, steps in planned:
+        print(f"{migration.version:04d} {migration.name}: {migration.description}", file=out)
+        if not steps:
+            print("    nothing to do", file=out)
+        for step in steps:
+            rows = f"{step.rows:,} rows, " if step.rows is not None else ''
+            timing = 'instant' if step.basis == 'instant' else f"~{step.seconds:.1f}s {step.basis}"
+            print(f"    {step.description} ({rows}{timing})", file=out)
+            total += step.seconds
+    print(f"Estimated total: ~{total:.1f}s", file=out)
+    return total
+
+def upgrade(target=None, batch_size=DEFAULT_BATCH_SIZE, out=sys.stdout):
+    """Apply pending migrations up to `target`; returns the versions applied"""
+    applied = []
+    for migration, record in pending(target):
+        now = datetime.utcnow()
+        if record:
+            checkpoint = json.loads(record['checkpoint']) if record['checkpoint'] else None
+            print(f"Resuming {migration.version:04d} {migration.name}", file=out)
+        else:
+            checkpoint = None
+            db.session.execute(schema_migrations.insert().values(
+                version=migration.version, name=migration.name, status='running', started_at=now
+            ))
+            db.session.commit()
+            print(f"Applying {migration.version:04d} {migration.name}", file=out)
+
+        started = time.perf_counter()
+        op = Operations(migration.version, batch_size=batch_size, checkpoint=checkpoint, out=out)
+        migration.module.upgrade(op)
+        db.session.execute(schema_migrations.update().where(
+            schema_migrations.c.version == migration.version
+        ).values(
+            status='applied',
+            applied_at=datetime.utcnow(),
+            duration_ms=int((time.perf_counter() - started) * 1000)
+        ))
+        db.session.commit()
+        applied.append(migration.version)
+    return applied
+
+def downgrade(target, out=sys.stdout):
+    """Undo applied migrations above `target`, newest first"""
+    records = _records()
+    undone = []
+    for migration in reversed(load_migrations()):
+        if migration.version <= target or migration.version not in records:
+            continue
+        if not hasattr(migration.module, 'downgrade'):
+            raise MigrationError(f"{migration.version:04d} {migration.name} cannot be undone")
+        print(f"Reverting {migration.version:04d} {migration.name}", file=out)
+        migration.module.downgrade(Operations(migration.version, out=out))
+        db.session.execute(schema_migrations.delete().where(
+            schema_migrations.c.version == migration.version
+        ))
+        db.session.commit()
+        undone.append(migration.version)
+    return undone
+
+def reset(batch_size=DEFAULT_BATCH_SIZE, out=sys.stdout):
+    """Drop every table (including ones no model defines) and migrate from scratch"""
+    db.session.remove()
+    existing = MetaData()
+    existing.reflect(bind=db.engine)
+    existing.drop_all(bind=db.engine)
+    return upgrade(batch_size=batch_size, out=out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Versioned schema migrations')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help='List applied and pending migrations')
+    up = commands.add_parser('upgrade', help='Show the plan, then apply pending migrations')
+    up.add_argument('--to', type=int, help='Stop after this version')
+    up.add_argument('--dry-run', action='store_true', help='Only show the plan and timing estimates')
+    up.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per backfill chunk')
+    down = commands.add_parser('downgrade', help='Undo migrations above a version')
+    down.add_argument('--to', type=int, required=True)
+    wipe = commands.add_parser('reset', help='Drop every table and migrate from scratch')
+    wipe.add_argument('--yes', action='store_true', help='Confirm deleting all data')
+    args = parser.parse_args(argv)
+
+    from app import app
+    with app.app_context():
+        if args.command == 'status':
+            for migration, record in status():
+                state = record['status'] if record else 'pending'
+                when = f" {record['applied_at']:%Y-%m-%d %H:%M}" if record and record['applied_at'] else ''
+                print(f"{migration.version:04d} {migration.name:32} {state}{when}")
+        elif args.command == 'upgrade':
+            planned = plan(args.to, args.batch_size)
+            if not planned:
+                print("Database is up to date")
+                return 0
+            print_plan(planned)
+            if not args.dry_run:
+                applied = upgrade(args.to, args.batch_size)
+                print(f"Applied {len(applied)} migrations")
+        elif args.command == 'downgrade':
+            undone = downgrade(args.to)
+            print(f"Reverted {len(undone)} migrations")
+        elif args.command == 'reset':
+            if not args.yes:
+                parser.error('reset deletes all data; pass --yes to confirm')
+            applied = reset()
+            print(f"Rebuilt the database with {len(applied)} migrations")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,9 @@
+"""Create the core tables that do not exist yet"""
+from models import User, ChitFund, Round, Bid, Payment, chitfund_members
+
+def upgrade(op):
+    # A new database gets each table in its current form, indexes included;
+    # the later migrations then find nothing left to change
+    for table in (User.__table__, ChitFund.__table__, chitfund_members,
+                  Round.__table__, Bid.__table__, Payment.__table__):
+        op.create_table(table)
@@ -0,0 +1,28 @@
+"""Store money as integer paise instead of float rupees"""
+
+# (table, float rupee column, paise column, DDL of the paise column)
+COLUMNS = [
+    ('user', 'savings', 'savings_paise', 'BIGINT NOT NULL DEFAULT 0'),
+    ('chit_fund', 'monthly_contribution', 'monthly_contribution_paise', 'BIGINT NOT NULL DEFAULT 0'),
+    ('round', 'winning_bid', 'winning_bid_paise', 'BIGINT'),
+    ('round', 'dividend_per_member', 'dividend_per_member_paise', 'BIGINT'),
+    ('round', 'pooled_amount', 'pooled_amount_paise', 'BIGINT NOT NULL DEFAULT 0'),
+    ('round', 'min_bid', 'min_bid_paise', 'BIGINT'),
+    ('bid', 'amount', 'amount_paise', 'BIGINT NOT NULL DEFAULT 0'),
+    ('payment', 'amount', 'amount_paise', 'BIGINT NOT NULL DEFAULT 0'),
+]
+
+def upgrade(op):
+    for table, old, new, ddl in COLUMNS:
+        if not op.has_column(table, old):
+            continue
+        op.add_column(table, new, ddl)
+        # Round to the nearest paisa once, here, instead of on every read
+        default = '0' if 'NOT NULL' in ddl else 'NULL'
+        op.backfill(f'{table}.{new}', table, f'{new} = COALESCE({op.integer(f"ROUND({old} * 100)")}, {default})')
+
+    # The lowest-bid index is rebuilt on amount_paise by 0005
+    if op.has_column('bid', 'amount'):
+        op.drop_index('bid', 'ix_bid_round_amount')
+    for table, old, _, _ in COLUMNS:
+        op.drop_column(table, old)
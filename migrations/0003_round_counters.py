@@ -0,0 +1,25 @@
+"""Add the per-round payment and bid counters, computed from existing rows"""
+
+def upgrade(op):
+    missing = not op.has_column('round', 'paid_count')
+    op.add_column('round', 'paid_count', 'INTEGER NOT NULL DEFAULT 0')
+    op.add_column('round', 'pooled_amount_paise', 'BIGINT NOT NULL DEFAULT 0')
+    op.add_column('round', 'bid_count', 'INTEGER NOT NULL DEFAULT 0')
+    op.add_column('round', 'min_bid_paise', 'BIGINT')
+    if not missing:
+        return
+
+    # Each chunk of rounds reads only its own payments and bids through the
+    # (round_id, ...) indexes
+    op.backfill('round.counters', 'round', (
+        'paid_count = (SELECT COUNT(*) FROM payment'
+        " WHERE payment.round_id = round.id AND payment.status = 'completed'),"
+        ' pooled_amount_paise = (SELECT COALESCE(SUM(amount_paise), 0) FROM payment'
+        " WHERE payment.round_id = round.id AND payment.status = 'completed'),"
+        ' bid_count = (SELECT COUNT(*) FROM bid WHERE bid.round_id = round.id),'
+        ' min_bid_paise = (SELECT MIN(amount_paise) FROM bid WHERE bid.round_id = round.id)'
+    ))
+
+def downgrade(op):
+    for column in ('paid_count', 'pooled_amount_paise', 'bid_count', 'min_bid_paise'):
+        op.drop_column('round', column)
@@ -0,0 +1,12 @@
+"""Let clients retry bids safely with an idempotency key"""
+from models import Bid
+
+def upgrade(op):
+    op.add_column('bid', 'idempotency_key', 'VARCHAR(64)')
+    for index in Bid.__table__.indexes:
+        if index.name == 'uq_bid_user_idempotency_key':
+            op.create_index(index)
+
+def downgrade(op):
+    op.drop_index('bid', 'uq_bid_user_idempotency_key')
+    op.drop_column('bid', 'idempotency_key')
@@ -0,0 +1,27 @@
+"""Add the composite and unique indexes used by the request hot paths"""
+from models import Round, Bid, Payment, chitfund_members
+
+# Named rather than taken from table.indexes, so indexes added to the models
+# later (with columns later migrations create) stay with their own migration
+INDEXES = {
+    chitfund_members: ['ix_chitfund_members_chitfund'],
+    Round.__table__: ['uq_round_fund_number', 'ix_round_fund_winner_status'],
+    Bid.__table__: ['uq_bid_round_user', 'ix_bid_round_amount'],
+    Payment.__table__: ['uq_payment_round_user', 'ix_payment_round_status'],
+}
+
+def _indexes():
+    for table, names in INDEXES.items():
+        for index in table.indexes:
+            if index.name in names:
+                yield index
+
+def upgrade(op):
+    # Unique indexes fail if duplicate rows already exist; the migration
+    # stops with an error naming the table, and can be re-run once cleaned
+    for index in _indexes():
+        op.create_index(index)
+
+def downgrade(op):
+    for index in _indexes():
+        op.drop_index(index.table.name, index.name)
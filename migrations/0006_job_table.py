@@ -0,0 +1,8 @@
+"""Add the background job queue table"""
+from models import Job
+
+def upgrade(op):
+    op.create_table(Job.__table__)
+
+def downgrade(op):
+    op.drop_table(Job.__table__)
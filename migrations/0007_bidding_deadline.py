@@ -0,0 +1,22 @@
+"""Give bidding rounds a deadline, starting a full window from now for open ones"""
+from datetime import datetime, timedelta
+from flask import current_app
+from models import Round
+
+def upgrade(op):
+    op.add_column('round', 'bidding_deadline', 'DATETIME')
+    for index in Round.__table__.indexes:
+        if index.name == 'ix_round_status_deadline':
+            op.create_index(index)
+
+    # Final rounds settle on their last payment and get no deadline
+    op.backfill(
+        'round.bidding_deadline', 'round', 'bidding_deadline = :deadline',
+        where="status = 'bidding' AND bidding_deadline IS NULL AND round_number < "
+              '(SELECT duration FROM chit_fund WHERE chit_fund.id = round.chitfund_id)',
+        params={'deadline': datetime.utcnow() + timedelta(hours=current_app.config['BIDDING_WINDOW_HOURS'])}
+    )
+
+def downgrade(op):
+    op.drop_index('round', 'ix_round_status_deadline')
+    op.drop_column('round', 'bidding_deadline')
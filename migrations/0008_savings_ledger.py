@@ -0,0 +1,22 @@
+"""Add the savings ledger and balance snapshots, opening each user's ledger at their current savings"""
+from models import LedgerEntry, BalanceSnapshot
+
+def upgrade(op):
+    missing = not op.has_table('ledger_entry')
+    op.create_table(LedgerEntry.__table__)
+    op.create_table(BalanceSnapshot.__table__)
+    if not missing:
+        return
+
+    # Balances built up before the ledger existed become one opening entry
+    # each, so `python ledger.py check` agrees from the start
+    op.execute(
+        'INSERT INTO ledger_entry (user_id, reason, credit_paise, debit_paise, created_at) '
+        f"SELECT id, 'opening_balance', savings_paise, 0, CURRENT_TIMESTAMP FROM {op.quote('user')} "
+        'WHERE savings_paise <> 0',
+        'open the ledger at current savings', 'user'
+    )
+
+def downgrade(op):
+    op.drop_table(BalanceSnapshot.__table__)
+    op.drop_table(LedgerEntry.__table__)
@@ -0,0 +1,10 @@
+"""Index payments by transaction id, so statement imports can skip lines already recorded"""
+from models import Payment
+
+def upgrade(op):
+    for index in Payment.__table__.indexes:
+        if index.name == 'ix_payment_transaction_id':
+            op.create_index(index)
+
+def downgrade(op):
+    op.drop_index('payment', 'ix_payment_transaction_id')
@@ -0,0 +1,15 @@
+"""Put rounds that opened for bidding before every member paid back to upcoming.
+
+Rounds used to open for bidding (and start their deadline) as soon as they
+were created; they now open when the last payment arrives.
+"""
+
+def upgrade(op):
+    op.backfill(
+        'round.status', 'round', "status = 'upcoming', bidding_deadline = NULL",
+        where="status = 'bidding' AND paid_count < "
+              '(SELECT member_count FROM chit_fund WHERE chit_fund.id = round.chitfund_id)'
+    )
+
+def downgrade(op):
+    pass  # Upcoming rounds open for bidding as before when their payments are in
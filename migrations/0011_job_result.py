@@ -0,0 +1,7 @@
+"""Store what each job returned, so a result computed by a worker can be served by any process"""
+
+def upgrade(op):
+    op.add_column('job', 'result', 'MEDIUMTEXT' if op.dialect == 'mysql' else 'TEXT')
+
+def downgrade(op):
+    op.drop_column('job', 'result')
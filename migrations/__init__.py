@@ -0,0 +1,7 @@
+"""Schema migrations, applied in order by migrate.py.
+
+Each NNNN_name.py has a one-line docstring describing it and defines
+``upgrade(op)`` and, where it can be undone, ``downgrade(op)``, where ``op``
+is a migrate.Operations. Add a migration by copying the newest one with the
+next number; never edit one that has been applied somewhere.
+"""
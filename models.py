@@ -1,13 +1,16 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import hasher, HashingBusy
+from money import rupees
 
 db = SQLAlchemy()
 
 # Association table for ChitFund members
 chitfund_members = db.Table('chitfund_members',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
-    db.Column('chitfund_id', db.Integer, db.ForeignKey('chit_fund.id'), primary_key=True)
+    db.Column('chitfund_id', db.Integer, db.ForeignKey('chit_fund.id'), primary_key=True),
+    # The primary key leads with user_id; member lookups by fund need their own index
+    db.Index('ix_chitfund_members_chitfund', 'chitfund_id', 'user_id')
 )
 
 class User(db.Model):
@@ -19,7 +22,8 @@ class User(db.Model):
     mobile_number = db.Column(db.String(15), unique=True, nullable=False)
     password_hash = db.Column(db.String(128))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    savings = db.Column(db.Float, default=0.0)  # User's total savings from chit funds
+    savings_paise = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # Total savings from chit funds
+    savings = rupees('savings_paise')
     
     # Relationships
     created_funds = db.relationship('ChitFund', backref='creator', lazy=True, foreign_keys='ChitFund.creator_id')
@@ -30,13 +34,21 @@ class User(db.Model):
     @property
     def total_savings(self):
         """Calculate total savings including dividends"""
-        return self.savings if self.savings is not None else 0.0
+        return self.savings or 0.0
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify a password, upgrading an outdated hash when it matches"""
+        if not hasher.verify(self.password_hash, password):
+            return False
+        if hasher.needs_rehash(self.password_hash):
+            try:
+                self.set_password(password)
+            except HashingBusy:
+                pass  # Keep the old hash; it is upgraded on a later login
+        return True
 
 class ChitFund(db.Model):
     __tablename__ = 'chit_fund'
@@ -45,7 +57,8 @@ class ChitFund(db.Model):
     name = db.Column(db.String(100), nullable=False)
     creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     member_count = db.Column(db.Integer, nullable=False)
-    monthly_contribution = db.Column(db.Float, nullable=False)
+    monthly_contribution_paise = db.Column(db.BigInteger, nullable=False)
+    monthly_contribution = rupees('monthly_contribution_paise')
     duration = db.Column(db.Integer, nullable=False)  # Number of months
     current_round = db.Column(db.Integer, default=1)
     commission_rate = db.Column(db.Float, default=0.05)  # 5% commission for organizer
@@ -72,16 +85,33 @@ class ChitFund(db.Model):
 
 class Round(db.Model):
     __tablename__ = 'round'
+    __table_args__ = (
+        db.Index('uq_round_fund_number', 'chitfund_id', 'round_number', unique=True),
+        db.Index('ix_round_fund_winner_status', 'chitfund_id', 'winner_id', 'status'),
+        db.Index('ix_round_status_deadline', 'status', 'bidding_deadline'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     chitfund_id = db.Column(db.Integer, db.ForeignKey('chit_fund.id'), nullable=False)
     round_number = db.Column(db.Integer, nullable=False)
     start_date = db.Column(db.DateTime)
     end_date = db.Column(db.DateTime)
+    bidding_deadline = db.Column(db.DateTime)  # Settled with the bids so far once this passes
     status = db.Column(db.String(20), default='upcoming')  # upcoming, bidding, completed
     winner_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    winning_bid = db.Column(db.Float)  # Amount the winner will receive
-    dividend_per_member = db.Column(db.Float)  # Amount each non-winner member receives
+    winning_bid_paise = db.Column(db.BigInteger)  # Amount the winner will receive
+    dividend_per_member_paise = db.Column(db.BigInteger)  # Amount each other payer receives (some get one paisa more)
+    
+    # Maintained aggregates, kept in sync by record_payment() and record_bid()
+    paid_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Completed payments
+    pooled_amount_paise = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # Sum of completed payments
+    bid_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bids from eligible members
+    min_bid_paise = db.Column(db.BigInteger)  # Current lowest bid
+    
+    winning_bid = rupees('winning_bid_paise')
+    dividend_per_member = rupees('dividend_per_member_paise')
+    pooled_amount = rupees('pooled_amount_paise')
+    min_bid = rupees('min_bid_paise')
     
     # Relationships
     winner = db.relationship('User', foreign_keys=[winner_id])
@@ -103,6 +133,25 @@ class Round(db.Model):
             'dividend_per_member': self.dividend_per_member
         }
     
+    def record_payment(self, amount_paise, count=1):
+        """Atomically add `count` completed payments totalling amount_paise to this round's counters"""
+        Round.query.filter_by(id=self.id).update({
+            Round.paid_count: Round.paid_count + count,
+            Round.pooled_amount_paise: Round.pooled_amount_paise + amount_paise
+        }, synchronize_session=False)
+        db.session.expire(self, ['paid_count', 'pooled_amount_paise'])
+    
+    def record_bid(self, amount_paise):
+        """Atomically add a bid to this round's counters"""
+        Round.query.filter_by(id=self.id).update({
+            Round.bid_count: Round.bid_count + 1,
+            Round.min_bid_paise: db.case(
+                (db.or_(Round.min_bid_paise.is_(None), Round.min_bid_paise > amount_paise), amount_paise),
+                else_=Round.min_bid_paise
+            )
+        }, synchronize_session=False)
+        db.session.expire(self, ['bid_count', 'min_bid_paise'])
+    
     def start_bidding(self):
         """Start bidding for this round"""
         self.status = 'bidding'
@@ -111,35 +160,24 @@ class Round(db.Model):
     
     def end_bidding(self, winner_id, winning_bid):
         """End bidding and calculate dividends"""
-        chitfund = self.chitfund
-        self.winner_id = winner_id
-        self.winning_bid = winning_bid
-        
-        # Calculate dividend
-        savings = chitfund.total_pool_amount - winning_bid - chitfund.commission_amount
-        self.dividend_per_member = savings / (chitfund.member_count - 1)  # Exclude winner
-        
-        # Update winner's savings
-        winner = User.query.get(winner_id)
-        winner.savings += winning_bid
-        
-        # Update other members' savings
-        for member in chitfund.members:
-            if member.id != winner_id:
-                member.savings += self.dividend_per_member
-        
-        self.status = 'completed'
-        self.end_date = datetime.utcnow()
-        db.session.commit()
+        from settlement import settle_round
+        return settle_round(self.id, winner_id=winner_id, winning_bid=winning_bid)
 
 class Bid(db.Model):
     __tablename__ = 'bid'
+    __table_args__ = (
+        db.Index('uq_bid_round_user', 'round_id', 'user_id', unique=True),  # One bid per user per round
+        db.Index('ix_bid_round_amount', 'round_id', 'amount_paise'),  # Lowest bid lookup
+        db.Index('uq_bid_user_idempotency_key', 'user_id', 'idempotency_key', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     chitfund_id = db.Column(db.Integer, db.ForeignKey('chit_fund.id'), nullable=False)
     round_id = db.Column(db.Integer, db.ForeignKey('round.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)  # Amount user is willing to take
+    amount_paise = db.Column(db.BigInteger, nullable=False)  # Amount user is willing to take
+    amount = rupees('amount_paise')
+    idempotency_key = db.Column(db.String(64))  # Client-supplied key that makes retries safe
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
@@ -147,20 +185,110 @@ class Bid(db.Model):
 
 class Payment(db.Model):
     __tablename__ = 'payment'
+    __table_args__ = (
+        db.Index('uq_payment_round_user', 'round_id', 'user_id', unique=True),  # One payment per user per round
+        db.Index('ix_payment_round_status', 'round_id', 'status'),
+        db.Index('ix_payment_transaction_id', 'transaction_id'),  # Statement lines already imported
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     chitfund_id = db.Column(db.Integer, db.ForeignKey('chit_fund.id'), nullable=False)
     round_id = db.Column(db.Integer, db.ForeignKey('round.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount_paise = db.Column(db.BigInteger, nullable=False)
+    amount = rupees('amount_paise')
     payment_method = db.Column(db.String(20))  # upi, bank_transfer, cash
     transaction_id = db.Column(db.String(100))
     status = db.Column(db.String(20), default='pending')  # pending, completed
     payment_date = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    def mark_completed(self):
+        """Mark payment as completed and update the round's counters, without committing.
+        
+        Returns False if the payment had already been completed.
+        """
+        if self.id is None:
+            db.session.flush()
+        
+        # Conditional update so a payment is only ever counted once
+        updated = Payment.query.filter(
+            Payment.id == self.id,
+            Payment.status != 'completed'
+        ).update({
+            Payment.status: 'completed',
+            Payment.payment_date: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.expire(self, ['status', 'payment_date'])
+        
+        if updated:
+            self.round.record_payment(self.amount_paise)
+        return bool(updated)
+    
     def complete_payment(self):
         """Mark payment as completed"""
-        self.status = 'completed'
-        self.payment_date = datetime.utcnow()
+        self.mark_completed()
         db.session.commit()
+
+class LedgerEntry(db.Model):
+    """One change to a user's savings; rows are only ever appended (see ledger.py)"""
+    __tablename__ = 'ledger_entry'
+    __table_args__ = (
+        db.Index('ix_ledger_entry_user', 'user_id', 'id'),  # Tail after a snapshot
+        db.Index('ix_ledger_entry_user_created', 'user_id', 'created_at'),  # Statements by date
+        db.Index('ix_ledger_entry_round_user', 'round_id', 'user_id'),  # Crediting a settled round
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    chitfund_id = db.Column(db.Integer, db.ForeignKey('chit_fund.id'))
+    round_id = db.Column(db.Integer, db.ForeignKey('round.id'))
+    reason = db.Column(db.String(30), nullable=False)  # winning_bid, dividend, final_payout, opening_balance
+    credit_paise = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    debit_paise = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    credit = rupees('credit_paise')
+    debit = rupees('debit_paise')
+
+    def __repr__(self):
+        return f'<LedgerEntry {self.id} {self.reason} user {self.user_id}>'
+
+class BalanceSnapshot(db.Model):
+    """A user's balance after every ledger entry up to and including entry_id"""
+    __tablename__ = 'balance_snapshot'
+    __table_args__ = (
+        db.Index('uq_balance_snapshot_user_entry', 'user_id', 'entry_id', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    entry_id = db.Column(db.Integer, db.ForeignKey('ledger_entry.id'), nullable=False)
+    balance_paise = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    balance = rupees('balance_paise')
+
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),  # Next runnable job
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # Handler name, e.g. settle_round
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON arguments
+    dedup_key = db.Column(db.String(100), unique=True)  # At most one job per key, e.g. settle:42
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Retry backoff
+    locked_at = db.Column(db.DateTime)  # When a worker claimed it
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text(2 ** 24 - 1))  # JSON of what the handler returned (MEDIUMTEXT on MySQL)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
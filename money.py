@@ -0,0 +1,59 @@
+"""Money is stored as integer paise (1 rupee = 100 paise).
+
+Columns are named ``<field>_paise``; models expose each one in rupees under
+the old name (``User.savings``, ``Round.winning_bid`` ...) through
+``rupees()``, so templates and JSON keep showing rupees. Arithmetic on
+balances happens in paise, in SQL, and never drifts.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from sqlalchemy.ext.hybrid import hybrid_property
+
+_PAISA = Decimal('0.01')
+
+def to_paise(rupees):
+    """Rupees (number or string) to integer paise, rounding half up to the nearest paisa"""
+    if rupees is None:
+        return None
+    try:
+        # Through str so 0.1 means 10 paise, not 0.1000000000000000055...
+        value = Decimal(str(rupees)).quantize(_PAISA, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError(f'Not an amount of money: {rupees!r}')
+    if not value.is_finite():
+        raise ValueError(f'Not an amount of money: {rupees!r}')
+    return int(value * 100)
+
+def to_rupees(paise):
+    return None if paise is None else paise / 100
+
+def format_paise(paise):
+    """Exact rupees as text, e.g. 123456 -> '1234.56'"""
+    if paise is None:
+        return None
+    sign = '-' if paise < 0 else ''
+    rupees, paise = divmod(abs(paise), 100)
+    return f'{sign}{rupees}.{paise:02d}'
+
+def split(total, count):
+    """Split `total` paise into `count` shares that differ by at most one paisa.
+
+    Returns (base, remainder): every share is `base`, and the first
+    `remainder` shares (members in ascending user id order) get one paisa
+    more, so the shares always add up to exactly `total`.
+    """
+    if count <= 0:
+        return 0, 0
+    return divmod(total, count)
+
+def rupees(paise_attr):
+    """Model attribute reading and writing an integer paise column in rupees"""
+    def fget(self):
+        return to_rupees(getattr(self, paise_attr))
+
+    def fset(self, value):
+        setattr(self, paise_attr, to_paise(value))
+
+    def expr(cls):
+        return getattr(cls, paise_attr) / 100.0
+
+    return hybrid_property(fget, fset, expr=expr)
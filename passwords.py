@@ -0,0 +1,155 @@
+"""Password hashing and verification off the request thread.
+
+Hashes are computed by a small worker pool (threads by default; PBKDF2 and
+bcrypt both release the GIL) so a burst of logins can use at most
+PASSWORD_WORKERS cores. At most PASSWORD_MAX_QUEUE more requests may wait
+for a worker; beyond that ``HashingBusy`` is raised straight away and the
+route answers 503 instead of tying up every web worker.
+
+Supported algorithms are Werkzeug's PBKDF2-SHA256 (the historical format,
+cost = iterations) and bcrypt (cost = log2 rounds, needs the optional
+``bcrypt`` package). Hashes made with another algorithm or cost still
+verify, and ``User.check_password`` replaces them after a successful login.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_COSTS = {
+    'pbkdf2': 260000,  # Werkzeug's default iteration count
+    'bcrypt': 12,
+}
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full or a hash took too long"""
+
+def _require_bcrypt():
+    try:
+        import bcrypt
+    except ImportError:
+        raise RuntimeError('bcrypt password hashes need the bcrypt package (pip install bcrypt)')
+    return bcrypt
+
+# The two functions below run inside the pool, so they must be module level
+# (picklable) for the process pool
+
+def _hash_password(algorithm, cost, password):
+    if algorithm == 'bcrypt':
+        bcrypt = _require_bcrypt()
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(cost)).decode('ascii')
+    return generate_password_hash(password, method=f'pbkdf2:sha256:{cost}')
+
+def _verify_password(password_hash, password):
+    if password_hash.startswith('$2'):
+        bcrypt = _require_bcrypt()
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('ascii'))
+    return check_password_hash(password_hash, password)
+
+def hash_parameters(password_hash):
+    """(algorithm, cost) of a stored hash; cost is None when it cannot be told"""
+    if password_hash.startswith('$2'):
+        # $2b$12$<salt+hash>
+        return 'bcrypt', int(password_hash.split('$')[2])
+
+    method = password_hash.split('$', 1)[0]
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2' and len(parts) == 3 and parts[1] == 'sha256':
+        return 'pbkdf2', int(parts[2])
+    return method, None
+
+class PasswordHasher:
+    """Bounded pool that hashes and verifies passwords"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._settings = None
+        self.submitted = 0
+        self.rejected = 0
+        self.configure()
+
+    def configure(self, algorithm='pbkdf2', cost=0, pool='thread', workers=2, max_queue=32, timeout=10.0):
+        """Apply settings; the pool is (re)started lazily on the next hash"""
+        if algorithm not in DEFAULT_COSTS:
+            raise ValueError(f'Unknown password algorithm {algorithm!r}')
+        if algorithm == 'bcrypt':
+            _require_bcrypt()
+        if pool not in ('thread', 'process'):
+            raise ValueError(f'PASSWORD_POOL must be thread or process, not {pool!r}')
+
+        settings = (algorithm, cost or DEFAULT_COSTS[algorithm], pool, workers, max_queue, timeout)
+        with self._lock:
+            if settings == self._settings:
+                return
+            if self._executor:
+                self._executor.shutdown(wait=False)
+            self._executor = None
+            self._settings = settings
+            self.algorithm, self.cost, self.pool, self.workers, self.max_queue, self.timeout = settings
+            # Running plus waiting work is capped at workers + max_queue
+            self._slots = threading.BoundedSemaphore(workers + max_queue) if workers else None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                executor_class = ProcessPoolExecutor if self.pool == 'process' else ThreadPoolExecutor
+                self._executor = executor_class(max_workers=self.workers)
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            # PASSWORD_WORKERS=0 hashes inline on the calling thread
+            return fn(*args)
+
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy('Too many password checks in progress')
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        self.submitted += 1
+        future.add_done_callback(lambda _: slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy(f'Password hashing took longer than {self.timeout}s')
+
+    def hash(self, password):
+        return self._run(_hash_password, self.algorithm, self.cost, password)
+
+    def verify(self, password_hash, password):
+        if not password_hash or password is None:
+            return False
+        return self._run(_verify_password, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if the hash was made with a different algorithm or cost"""
+        return hash_parameters(password_hash) != (self.algorithm, self.cost)
+
+    def stats(self):
+        return {
+            'algorithm': self.algorithm,
+            'cost': self.cost,
+            'pool': self.pool,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+        }
+
+hasher = PasswordHasher()
+
+def init_app(app):
+    hasher.configure(
+        algorithm=app.config['PASSWORD_ALGORITHM'],
+        cost=app.config['PASSWORD_COST'],
+        pool=app.config['PASSWORD_POOL'],
+        workers=app.config['PASSWORD_WORKERS'],
+        max_queue=app.config['PASSWORD_MAX_QUEUE'],
+        timeout=app.config['PASSWORD_TIMEOUT']
+    )
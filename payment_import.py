@@ -0,0 +1,395 @@
+"""Complete pending payments from bank and UPI statement exports (CSV).
+
+A statement is read once, line by line:
+
+- The header row is found by its column names, since bank exports often
+  open with a few lines of account details. Common spellings are
+  understood for the amount (or credit), the reference (UTR, RRN, ...), the
+  payer (mobile number or VPA, else a mobile number in the narration), the
+  date, and optionally our round_id. Debit lines are skipped.
+- Pending payments of the open rounds are loaded once into an in-memory
+  hash index keyed by (reference, amount), (mobile, amount, round) and
+  (mobile, amount). A line matches by a reference given in advance, else by
+  its payer and amount in the round it names, else in the payer's oldest
+  open round. Each line is one dictionary lookup.
+- Lines are handled --batch-size at a time. One query finds the references
+  already recorded, so importing a statement twice completes nothing
+  twice. The batch's matches are completed in one transaction with one
+  counter UPDATE per round.
+- When the whole statement is in, each affected round is advanced once
+  (opened for bidding, or paid out if it is the last) rather than once per
+  line.
+
+Every line needs a reference: it is stored as Payment.transaction_id and is
+what makes re-imports safe.
+
+Usage:
+    python payment_import.py STATEMENT.csv [--fund ID] [--method upi|bank_transfer|cash]
+        [--batch-size 500] [--dry-run] [--unmatched FILE]
+"""
+import argparse
+import csv
+import logging
+import re
+import sys
+from collections import Counter, defaultdict, deque, namedtuple
+from datetime import datetime
+from models import db, User, Round, Payment
+from money import to_paise
+from settlement import advance_round
+from events import publish_fund_event
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+METHODS = ('upi', 'bank_transfer', 'cash')
+OPEN_ROUND_STATUSES = ('upcoming', 'bidding')
+
+# Header spellings after normalising (lowercase, runs of other characters
+# as "_"); the first one present wins, so credit beats a signed amount
+COLUMNS = {
+    'amount': ('credit', 'credit_amount', 'deposit', 'deposit_amount', 'amount', 'amount_inr',
+               'amount_rs', 'txn_amount', 'transaction_amount'),
+    'reference': ('utr', 'utr_no', 'utr_number', 'reference', 'reference_no', 'reference_number',
+                  'ref_no', 'rrn', 'upi_ref_no', 'upi_transaction_id', 'transaction_id', 'txn_id',
+                  'chq_ref_no', 'cheque_ref_no'),
+    'mobile': ('mobile', 'mobile_number', 'phone', 'payer_mobile', 'payer_phone', 'vpa',
+               'payer_vpa', 'upi_id', 'from_vpa'),
+    'narration': ('narration', 'description', 'remarks', 'particulars', 'details'),
+    'date': ('date', 'txn_date', 'transaction_date', 'value_date'),
+    'type': ('type', 'dr_cr', 'cr_dr', 'txn_type', 'transaction_type'),
+    'method': ('method', 'payment_method', 'mode'),
+    'round_id': ('round_id',),
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%d-%m-%y', '%d-%b-%Y',
+                '%d %b %Y', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M')
+
+# An Indian mobile number, with or without the country code or trunk 0
+_MOBILE = re.compile(r'(?<!\d)(?:\+?91[- ]?|0)?([6-9]\d{9})(?!\d)')
+
+StatementLine = namedtuple(
+    'StatementLine', 'number row reference amount_paise mobile round_id paid_at method problem'
+)
+
+def _normalise_header(name):
+    return re.sub(r'[^a-z0-9]+', '_', name.strip().lower()).strip('_')
+
+def normalise_mobile(value, digits_only=True):
+    """The 10-digit mobile number in a phone number or VPA (or, with
+    digits_only=False, anywhere in free text such as a narration), or None"""
+    if not value:
+        return None
+    match = _MOBILE.search(re.sub(r'\D', '', value) if digits_only else value)
+    return match.group(1) if match else None
+
+def parse_amount(text):
+    """(paise, is_debit) from amounts like '1,000.00', 'Rs. 500', '250.00 Cr' or '-300'; raises ValueError"""
+    value = text.strip().lower().replace(',', '').replace('₹', '')
+    for prefix in ('inr', 'rs.', 'rs'):
+        if value.startswith(prefix):
+            value = value[len(prefix):].strip()
+    debit = False
+    if value.endswith(('cr', 'dr')):
+        debit = value.endswith('dr')
+        value = value[:-2].strip()
+    if value.startswith('-'):
+        debit = True
+        value = value[1:]
+    return to_paise(value), debit
+
+def _parse_date(text):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    return None
+
+def _method(text, default):
+    text = text.lower()
+    if 'upi' in text:
+        return 'upi'
+    if any(word in text for word in ('neft', 'imps', 'rtgs', 'transfer')):
+        return 'bank_transfer'
+    if 'cash' in text:
+        return 'cash'
+    return default
+
+def _find_header(reader):
+    """Column positions from the first row that looks like a header"""
+    for row in reader:
+        names = [_normalise_header(cell) for cell in row]
+        columns = {}
+        for field, aliases in COLUMNS.items():
+            for alias in aliases:
+                if alias in names:
+                    columns[field] = names.index(alias)
+                    break
+        if 'amount' in columns and columns.keys() & {'reference', 'mobile', 'narration'}:
+            return columns
+    raise ValueError('No header row with an amount column and a reference or payer column')
+
+def _cell(row, columns, field):
+    index = columns.get(field)
+    return row[index].strip() if index is not None and index < len(row) else ''
+
+def read_statement(stream, method='upi'):
+    """Yield a StatementLine for each non-blank line after the header.
+
+    Lines that cannot be matched (debits, no reference, unreadable amount)
+    come with `problem` set to the reason.
+    """
+    reader = csv.reader(stream)
+    columns = _find_header(reader)
+
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        cell = lambda field: _cell(row, columns, field)
+
+        problem = None
+        amount_paise = None
+        amount_text = cell('amount')
+        if not amount_text:
+            problem = 'no credit amount'
+        else:
+            try:
+                amount_paise, debit = parse_amount(amount_text)
+                if debit or cell('type').lower().startswith('d') or amount_paise <= 0:
+                    problem = 'not a credit'
+            except ValueError:
+                problem = f'unreadable amount {amount_text!r}'
+
+        reference = cell('reference').replace(' ', '')
+        if not problem and not reference:
+            problem = 'no reference'
+        elif not problem and len(reference) > Payment.transaction_id.type.length:
+            problem = 'reference too long'
+
+        narration = cell('narration')
+        round_id = cell('round_id')
+        yield StatementLine(
+            number=reader.line_num,
+            row=row,
+            reference=reference,
+            amount_paise=amount_paise,
+            mobile=normalise_mobile(cell('mobile')) or normalise_mobile(narration, digits_only=False),
+            round_id=int(round_id) if round_id.isdigit() else None,
+            paid_at=_parse_date(cell('date')),
+            method=_method(cell('method') or narration, method),
+            problem=problem
+        )
+
+class PendingPayments:
+    """Hash index of the pending payments in open rounds.
+
+    Loaded with one query driven by the open rounds; matching claims a
+    payment so that no two lines complete the same one.
+    """
+
+    def __init__(self, fund_id=None):
+        self.rounds = {}  # payment_id -> round_id
+        self.by_reference = {}  # (reference, amount) -> payment_id
+        self.by_round = defaultdict(deque)  # (mobile, amount, round_id) -> payment ids
+        self.by_payer = defaultdict(deque)  # (mobile, amount) -> payment ids, oldest round first
+        self.claimed = set()
+
+        query = db.session.query(
+            Payment.id, Payment.round_id, Payment.amount_paise, Payment.transaction_id, User.mobile_number
+        ).join(Round, Round.id == Payment.round_id).join(User, User.id == Payment.user_id).filter(
+            Round.status.in_(OPEN_ROUND_STATUSES),
+            Payment.status == 'pending'
+        )
+        if fund_id is not None:
+            query = query.filter(Round.chitfund_id == fund_id)
+
+        for payment_id, round_id, amount, reference, mobile in query.order_by(Payment.round_id, Payment.id):
+            self.rounds[payment_id] = round_id
+            if reference:
+                # A reference the payer gave before the money arrived
+                self.by_reference[(reference, amount)] = payment_id
+            mobile = normalise_mobile(mobile)
+            if mobile:
+                self.by_round[(mobile, amount, round_id)].append(payment_id)
+                self.by_payer[(mobile, amount)].append(payment_id)
+
+    def __len__(self):
+        return len(self.rounds)
+
+    def _claim_from(self, candidates):
+        while candidates:
+            payment_id = candidates.popleft()
+            if payment_id not in self.claimed:
+                self.claimed.add(payment_id)
+                return payment_id
+        return None
+
+    def match(self, line):
+        """Claim the pending payment a statement line pays for; returns its id or None"""
+        payment_id = self.by_reference.get((line.reference, line.amount_paise))
+        if payment_id is not None and payment_id not in self.claimed:
+            self.claimed.add(payment_id)
+            return payment_id
+        if not line.mobile:
+            return None
+        if line.round_id is not None:
+            return self._claim_from(self.by_round.get((line.mobile, line.amount_paise, line.round_id)))
+        return self._claim_from(self.by_payer.get((line.mobile, line.amount_paise)))
+
+def _import_batch(lines, index, seen, counts, affected, dry_run, on_unmatched):
+    references = {line.reference for line in lines}
+    # References already on a completed payment, from an earlier import of this
+    # statement or another (a pending payment may carry the reference it expects)
+    recorded = {
+        reference for (reference,) in db.session.query(Payment.transaction_id).filter(
+            Payment.transaction_id.in_(references),
+            Payment.status == 'completed'
+        )
+    }
+
+    matches = []
+    for line in lines:
+        if line.reference in recorded or line.reference in seen:
+            counts['duplicate'] += 1
+            on_unmatched(line, 'reference already imported')
+            continue
+        seen.add(line.reference)
+        payment_id = index.match(line)
+        if payment_id is None:
+            counts['unmatched'] += 1
+            on_unmatched(line, 'no pending payment matches')
+            continue
+        matches.append((line, payment_id))
+    counts['matched'] += len(matches)
+
+    if dry_run or not matches:
+        db.session.rollback()
+        return
+
+    now = datetime.utcnow()
+    totals = defaultdict(lambda: [0, 0])  # round_id -> [payments, paise]
+    for line, payment_id in matches:
+        # Conditional, like Payment.mark_completed(), in case the member paid in the app meanwhile
+        updated = Payment.query.filter(
+            Payment.id == payment_id,
+            Payment.status != 'completed'
+        ).update({
+            Payment.status: 'completed',
+            Payment.payment_date: line.paid_at or now,
+            Payment.transaction_id: line.reference,
+            Payment.payment_method: line.method
+        }, synchronize_session=False)
+        if not updated:
+            counts['already_paid'] += 1
+            on_unmatched(line, 'payment already completed')
+            continue
+        round_total = totals[index.rounds[payment_id]]
+        round_total[0] += 1
+        round_total[1] += line.amount_paise
+
+    for round in Round.query.filter(Round.id.in_(totals)):
+        count, amount = totals[round.id]
+        round.record_payment(amount, count)
+    db.session.commit()
+
+    counts['completed'] += sum(count for count, _ in totals.values())
+    affected.update(totals)
+
+def import_statement(stream, fund_id=None, method='upi', batch_size=BATCH_SIZE, dry_run=False,
+                     on_unmatched=None):
+    """Match a CSV statement against pending payments and complete the matches.
+
+    `on_unmatched(line, reason)` is called for every line that completes
+    nothing. Returns a summary dict: counts of lines by outcome, and the
+    rounds advanced (opened for bidding or paid out) as a result.
+    Raises ValueError if the statement has no recognisable header.
+    """
+    on_unmatched = on_unmatched or (lambda line, reason: None)
+    index = PendingPayments(fund_id)
+    db.session.rollback()  # End the read; batches run in their own transactions
+
+    counts = Counter()
+    seen = set()
+    affected = set()
+    batch = []
+    for line in read_statement(stream, method):
+        counts['lines'] += 1
+        if line.problem:
+            counts['skipped'] += 1
+            on_unmatched(line, line.problem)
+            continue
+        batch.append(line)
+        if len(batch) >= batch_size:
+            _import_batch(batch, index, seen, counts, affected, dry_run, on_unmatched)
+            batch = []
+    if batch:
+        _import_batch(batch, index, seen, counts, affected, dry_run, on_unmatched)
+
+    advanced = {}
+    for round_id in sorted(affected):
+        status, result = advance_round(round_id)
+        round = Round.query.get(round_id)
+        publish_fund_event(round.chitfund_id, 'payment_completed', round_id=round_id, paid_count=round.paid_count)
+        if status == 'bidding':
+            publish_fund_event(round.chitfund_id, 'round_opened', **result)
+        if status == 'completed':
+            publish_fund_event(round.chitfund_id, 'round_settled', round_id=round_id, **result)
+        if status:
+            advanced[round_id] = status
+
+    summary = {
+        key: counts[key]
+        for key in ('lines', 'matched', 'completed', 'duplicate', 'unmatched', 'already_paid', 'skipped')
+    }
+    summary['pending_payments'] = len(index)
+    summary['rounds_updated'] = len(affected)
+    summary['rounds_advanced'] = advanced
+    summary['dry_run'] = dry_run
+    logger.info('Statement imported', extra={
+        'fund_id': fund_id,
+        **{key: value for key, value in summary.items() if key != 'rounds_advanced'}
+    })
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Complete pending payments from a bank or UPI statement')
+    parser.add_argument('statement', help='CSV export of the statement')
+    parser.add_argument('--fund', type=int, help='Only match payments of this chit fund')
+    parser.add_argument('--method', choices=METHODS, default='upi',
+                        help='Payment method when a line does not say')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Lines completed per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='Match lines but complete nothing')
+    parser.add_argument('--unmatched', help='Write lines that completed nothing, with the reason, to this CSV')
+    args = parser.parse_args(argv)
+
+    from app import app
+    unmatched_file = open(args.unmatched, 'w', newline='') if args.unmatched else None
+    writer = csv.writer(unmatched_file) if unmatched_file else None
+
+    def on_unmatched(line, reason):
+        if writer:
+            writer.writerow([line.number, reason] + line.row)
+
+    try:
+        with open(args.statement, newline='', encoding='utf-8-sig') as stream, app.app_context():
+            summary = import_statement(
+                stream, args.fund, args.method, args.batch_size, args.dry_run, on_unmatched
+            )
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if unmatched_file:
+            unmatched_file.close()
+
+    print(f"{summary['lines']} lines: {summary['matched']} matched, {summary['completed']} completed, "
+          f"{summary['duplicate']} already imported, {summary['unmatched']} unmatched, "
+          f"{summary['already_paid']} already paid, {summary['skipped']} skipped")
+    for round_id, status in summary['rounds_advanced'].items():
+        print(f"Round {round_id}: {'opened for bidding' if status == 'bidding' else 'paid out'}")
+    if args.dry_run:
+        print("Dry run: nothing was completed")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
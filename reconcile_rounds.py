@@ -0,0 +1,88 @@
+import sys
+from sqlalchemy import func
+from app import app
+from models import db, Round, Payment, Bid
+
+def compute_round_aggregates():
+    """Recompute every round's counters from the raw payment and bid rows"""
+    payments = db.session.query(
+        Payment.round_id,
+        func.count(Payment.id),
+        func.coalesce(func.sum(Payment.amount_paise), 0)
+    ).filter(
+        Payment.status == 'completed'
+    ).group_by(Payment.round_id).all()
+
+    bids = db.session.query(
+        Bid.round_id,
+        func.count(func.distinct(Bid.user_id)),
+        func.min(Bid.amount_paise)
+    ).group_by(Bid.round_id).all()
+
+    aggregates = {}
+    for round_id, paid_count, pooled_amount in payments:
+        aggregates.setdefault(round_id, {})
+        aggregates[round_id].update(paid_count=paid_count, pooled_amount_paise=int(pooled_amount))
+    for round_id, bid_count, min_bid in bids:
+        aggregates.setdefault(round_id, {})
+        aggregates[round_id].update(bid_count=bid_count, min_bid_paise=min_bid)
+    return aggregates
+
+def reconcile_round_counters(fix=False):
+    """Compare the maintained round counters against the raw rows.
+
+    Returns a list of (round_id, field, stored, actual) mismatches. With
+    fix=True the stored counters are overwritten with the recomputed values.
+    """
+    aggregates = compute_round_aggregates()
+    mismatches = []
+
+    rounds = db.session.query(
+        Round.id, Round.paid_count, Round.pooled_amount_paise, Round.bid_count, Round.min_bid_paise
+    ).order_by(Round.id)
+
+    for round_id, paid_count, pooled_amount, bid_count, min_bid in rounds:
+        actual = aggregates.get(round_id, {})
+        expected = {
+            'paid_count': actual.get('paid_count', 0),
+            'pooled_amount_paise': actual.get('pooled_amount_paise', 0),
+            'bid_count': actual.get('bid_count', 0),
+            'min_bid_paise': actual.get('min_bid_paise')
+        }
+        stored = {
+            'paid_count': paid_count,
+            'pooled_amount_paise': pooled_amount,
+            'bid_count': bid_count,
+            'min_bid_paise': min_bid
+        }
+
+        round_mismatches = [
+            (round_id, field, stored[field], expected[field])
+            for field in expected
+            if stored[field] != expected[field]
+        ]
+        mismatches.extend(round_mismatches)
+
+        if fix and round_mismatches:
+            Round.query.filter_by(id=round_id).update(expected, synchronize_session=False)
+
+    if fix:
+        db.session.commit()
+    return mismatches
+
+if __name__ == '__main__':
+    fix = '--fix' in sys.argv[1:]
+
+    with app.app_context():
+        mismatches = reconcile_round_counters(fix=fix)
+
+        for round_id, field, stored, actual in mismatches:
+            print(f"Round {round_id}: {field} is {stored}, raw rows give {actual}")
+
+        if not mismatches:
+            print("All round counters match the payment and bid rows")
+        elif fix:
+            print(f"Fixed {len(mismatches)} mismatched counters")
+        else:
+            print(f"Found {len(mismatches)} mismatched counters (run with --fix to repair)")
+            sys.exit(1)
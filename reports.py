@@ -0,0 +1,277 @@
+"""Admin reports over the whole database, streamed.
+
+Each report is one SELECT that resolves names through joins (and counts
+through maintained counters or grouped subqueries), so it issues a single
+query however many rows it covers. Rows are fetched in batches of
+--batch-size (``yield_per``) over a server-side cursor (``stream_results``) and written as
+they arrive: CSV, JSON lines, or tables printed --page-size rows at a time.
+Memory stays bounded by one batch plus one page, whatever the table size.
+
+Usage:
+    python reports.py {users,chitfunds,rounds,payments,bids}
+        [--fund ID] [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--status STATUS]
+        [--format table|csv|jsonl] [--output FILE] [--page-size 50] [--batch-size 1000]
+
+--since/--until filter on the report's date column (created_at for users,
+chitfunds and payments, start_date for rounds, timestamp for bids); --until
+is exclusive. --status applies to rounds and payments.
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import date, datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+from tabulate import tabulate
+from money import format_paise
+from models import db, User, ChitFund, Round, Bid, Payment, chitfund_members
+
+FORMATS = ('table', 'csv', 'jsonl')
+
+class Report:
+    """A named SELECT with its column labels; money columns hold paise"""
+
+    def __init__(self, columns, statement, money=(), fund_column=None, date_column=None, status_column=None):
+        self.columns = columns
+        self.statement = statement
+        self.money = {columns.index(name) for name in money}
+        self.fund_column = fund_column
+        self.date_column = date_column
+        self.status_column = status_column
+
+    def filtered(self, fund_id=None, since=None, until=None, status=None):
+        statement = self.statement
+        if fund_id is not None:
+            statement = statement.where(self.fund_column(fund_id))
+        if since is not None:
+            statement = statement.where(self.date_column >= since)
+        if until is not None:
+            statement = statement.where(self.date_column < until)
+        if status is not None:
+            if self.status_column is None:
+                raise ValueError('This report has no status to filter on')
+            statement = statement.where(self.status_column == status)
+        return statement
+
+def _in_rounds_of_fund(column):
+    # Payments and bids are found through the fund's rounds, which are indexed by fund
+    return lambda fund_id: column.in_(select(Round.id).where(Round.chitfund_id == fund_id))
+
+def users_report():
+    created = select(
+        ChitFund.creator_id.label('user_id'), func.count().label('count')
+    ).group_by(ChitFund.creator_id).subquery()
+    member_of = select(
+        chitfund_members.c.user_id, func.count().label('count')
+    ).group_by(chitfund_members.c.user_id).subquery()
+    statement = select(
+        User.id, User.username, User.full_name, User.mobile_number, User.created_at,
+        User.savings_paise,
+        func.coalesce(created.c.count, 0),
+        func.coalesce(member_of.c.count, 0)
+    ).outerjoin(created, created.c.user_id == User.id).outerjoin(
+        member_of, member_of.c.user_id == User.id
+    ).order_by(User.id)
+    return Report(
+        ['id', 'username', 'full_name', 'mobile', 'created_at', 'savings', 'created_funds', 'member_of'],
+        statement,
+        money=['savings'],
+        fund_column=lambda fund_id: User.id.in_(
+            select(chitfund_members.c.user_id).where(chitfund_members.c.chitfund_id == fund_id)
+        ),
+        date_column=User.created_at
+    )
+
+def chitfunds_report():
+    creator = aliased(User)
+    members = select(
+        chitfund_members.c.chitfund_id,
+        func.count().label('count'),
+        func.group_concat(User.username).label('usernames')
+    ).join(User, User.id == chitfund_members.c.user_id).group_by(
+        chitfund_members.c.chitfund_id
+    ).subquery()
+    statement = select(
+        ChitFund.id, ChitFund.name, creator.username, ChitFund.member_count,
+        ChitFund.monthly_contribution_paise, ChitFund.duration, ChitFund.current_round,
+        ChitFund.start_date, ChitFund.created_at,
+        func.coalesce(members.c.count, 0), members.c.usernames
+    ).outerjoin(creator, creator.id == ChitFund.creator_id).outerjoin(
+        members, members.c.chitfund_id == ChitFund.id
+    ).order_by(ChitFund.id)
+    return Report(
+        ['id', 'name', 'creator', 'member_count', 'monthly_contribution', 'duration',
+         'current_round', 'start_date', 'created_at', 'actual_members', 'members'],
+        statement,
+        money=['monthly_contribution'],
+        fund_column=lambda fund_id: ChitFund.id == fund_id,
+        date_column=ChitFund.created_at
+    )
+
+def rounds_report():
+    statement = select(
+        Round.id, ChitFund.name, Round.round_number, Round.status,
+        Round.start_date, Round.bidding_deadline, Round.end_date, User.username,
+        Round.winning_bid_paise, Round.dividend_per_member_paise, Round.pooled_amount_paise,
+        Round.paid_count, Round.bid_count
+    ).join(ChitFund, ChitFund.id == Round.chitfund_id).outerjoin(
+        User, User.id == Round.winner_id
+    ).order_by(Round.id)
+    return Report(
+        ['id', 'chitfund', 'round_number', 'status', 'start_date', 'bidding_deadline', 'end_date',
+         'winner', 'winning_bid', 'dividend_per_member', 'pooled', 'payments', 'bids'],
+        statement,
+        money=['winning_bid', 'dividend_per_member', 'pooled'],
+        fund_column=lambda fund_id: Round.chitfund_id == fund_id,
+        date_column=Round.start_date,
+        status_column=Round.status
+    )
+
+def payments_report():
+    statement = select(
+        Payment.id, Payment.chitfund_id, Round.round_number, User.username,
+        Payment.amount_paise, Payment.status, Payment.payment_method, Payment.transaction_id,
+        Payment.payment_date, Payment.created_at
+    ).join(Round, Round.id == Payment.round_id).join(
+        User, User.id == Payment.user_id
+    ).order_by(Payment.id)
+    return Report(
+        ['id', 'chitfund_id', 'round_number', 'user', 'amount', 'status', 'method',
+         'transaction_id', 'payment_date', 'created_at'],
+        statement,
+        money=['amount'],
+        fund_column=_in_rounds_of_fund(Payment.round_id),
+        date_column=Payment.created_at,
+        status_column=Payment.status
+    )
+
+def bids_report():
+    statement = select(
+        Bid.id, Bid.chitfund_id, Round.round_number, User.username, Bid.amount_paise, Bid.timestamp
+    ).join(Round, Round.id == Bid.round_id).join(
+        User, User.id == Bid.user_id
+    ).order_by(Bid.id)
+    return Report(
+        ['id', 'chitfund_id', 'round_number', 'user', 'amount', 'timestamp'],
+        statement,
+        money=['amount'],
+        fund_column=_in_rounds_of_fund(Bid.round_id),
+        date_column=Bid.timestamp
+    )
+
+REPORTS = {
+    'users': users_report,
+    'chitfunds': chitfunds_report,
+    'rounds': rounds_report,
+    'payments': payments_report,
+    'bids': bids_report,
+}
+
+def stream_rows(statement, batch_size=1000):
+    """Yield result rows, fetched batch_size at a time over a server-side cursor"""
+    connection = db.session.connection().execution_options(stream_results=True)
+    result = connection.execute(statement)
+    try:
+        yield from result.yield_per(batch_size)
+    finally:
+        result.close()
+
+def _plain_values(report, row):
+    values = []
+    for index, value in enumerate(row):
+        if index in report.money:
+            value = format_paise(value)
+        elif isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        values.append(value)
+    return values
+
+def _table_values(report, row):
+    values = []
+    for index, value in enumerate(row):
+        if index in report.money:
+            value = f"Rs.{value / 100:,.2f}" if value is not None else 'Rs.0.00'
+        elif isinstance(value, datetime):
+            value = value.strftime('%Y-%m-%d %H:%M:%S')
+        elif value is None:
+            value = 'N/A'
+        values.append(value)
+    return values
+
+def write_csv(report, rows, out):
+    writer = csv.writer(out)
+    writer.writerow(report.columns)
+    count = 0
+    for row in rows:
+        writer.writerow(_plain_values(report, row))
+        count += 1
+    return count
+
+def write_jsonl(report, rows, out):
+    count = 0
+    for row in rows:
+        out.write(json.dumps(dict(zip(report.columns, _plain_values(report, row)))) + '\n')
+        count += 1
+    return count
+
+def write_table(report, rows, out, page_size=50):
+    """Print rows as grid tables of page_size rows, so only one page is held"""
+    count = 0
+    page = []
+    for row in rows:
+        page.append(_table_values(report, row))
+        count += 1
+        if len(page) == page_size:
+            out.write(tabulate(page, headers=report.columns, tablefmt='grid', disable_numparse=True) + '\n')
+            page = []
+    if page or not count:
+        out.write(tabulate(page, headers=report.columns, tablefmt='grid', disable_numparse=True) + '\n')
+    return count
+
+def run_report(name, out=sys.stdout, fmt='table', fund_id=None, since=None, until=None,
+               status=None, page_size=50, batch_size=1000):
+    """Write one report to `out`; returns the number of rows written"""
+    report = REPORTS[name]()
+    statement = report.filtered(fund_id, since, until, status)
+    rows = stream_rows(statement, batch_size)
+    if fmt == 'csv':
+        return write_csv(report, rows, out)
+    if fmt == 'jsonl':
+        return write_jsonl(report, rows, out)
+    return write_table(report, rows, out, page_size)
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stream an admin report')
+    parser.add_argument('report', choices=sorted(REPORTS))
+    parser.add_argument('--fund', type=int, help='Only rows belonging to this chit fund')
+    parser.add_argument('--since', type=_date, help='On or after this date (YYYY-MM-DD)')
+    parser.add_argument('--until', type=_date, help='Before this date (YYYY-MM-DD)')
+    parser.add_argument('--status', help='Round or payment status')
+    parser.add_argument('--format', choices=FORMATS, default='table')
+    parser.add_argument('--output', help='Write to this file instead of stdout')
+    parser.add_argument('--page-size', type=int, default=50, help='Rows per table page')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows fetched per round trip')
+    args = parser.parse_args(argv)
+
+    from app import app
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        with app.app_context():
+            count = run_report(
+                args.report, out, args.format, args.fund, args.since, args.until,
+                args.status, args.page_size, args.batch_size
+            )
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if args.output:
+            out.close()
+    print(f"{count} rows", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,16 @@
 from app import create_app, db
-from models import ChitFund, Payment, Bid, Round
+from models import ChitFund, Payment, Bid, Round, LedgerEntry, BalanceSnapshot
 
 def reset_data():
     app = create_app()
     with app.app_context():
         try:
-            # Delete all bids first (child records)
+            # Delete the savings ledger first; it references rounds and funds
+            BalanceSnapshot.query.delete()
+            LedgerEntry.query.delete()
+            print("Deleted the savings ledger")
+            
+            # Delete all bids (child records)
             Bid.query.delete()
             print("Deleted all bids")
             
@@ -22,7 +27,7 @@ def reset_data():
             print("Deleted all chit funds")
             
             # Reset user savings to 0
-            db.session.execute('UPDATE user SET savings = 0')
+            db.session.execute('UPDATE user SET savings_paise = 0')
             print("Reset user savings to 0")
             
             # Commit the changes
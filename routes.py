@@ -1,10 +1,32 @@
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash
-from models import db, User, ChitFund, Round, Bid, Payment, chitfund_members
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, session, redirect, url_for, flash
+from models import db, User, Round, Bid, Payment, Job
+from dashboard_loader import load_dashboard_funds, fund_state
+from settlement import settle_round, advance_round
+from ledger import statement as ledger_statement
+from jobs import job_handler, enqueue, dispatch
+from deadlines import request_close, extend_deadline
+from fund_creation import create_funds, fund_spec_from_json, fund_spec_from_form
+from payment_import import import_statement, METHODS as PAYMENT_METHODS
+from forecast import (fund_params, cached, cached_forecast, remember, params_to_json, params_from_json,
+                      cost as forecast_cost, job_key as forecast_job_key)
+from search_index import member_index, search_members as find_members
+from identity_cache import get_session_user, get_chitfund, get_round
+from events import broker, publish_fund_event, DEFAULT_QUEUE_SIZE, DEFAULT_HEARTBEAT_SECONDS, DEFAULT_MAX_STREAMS
+from passwords import HashingBusy
+from money import to_paise, to_rupees
+from learn_content import FINANCIAL_LITERACY, GOVERNMENT_SCHEMES, BANK_ACCOUNT
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from functools import wraps
-import uuid
+import io
+import json
+import logging
 
 routes = Blueprint('routes', __name__)
+logger = logging.getLogger(__name__)
+
+# Unmatched lines listed in an import's response (`python payment_import.py --unmatched` writes them all)
+MAX_UNMATCHED_REPORTED = 100
 
 def login_required(f):
     @wraps(f)
@@ -17,7 +39,7 @@ def login_required(f):
 
 def get_current_user():
     if 'user_id' in session:
-        return User.query.get(session['user_id'])
+        return get_session_user(session['user_id'])
     return None
 
 @routes.route('/')
@@ -60,11 +82,16 @@ def register():
             
             db.session.add(user)
             db.session.commit()
+            member_index.add_user(user)
             
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('routes.login'))
             
-        except Exception as e:
+        except HashingBusy:
+            db.session.rollback()
+            flash('Too many people are signing up right now. Please try again in a moment.', 'error')
+            return render_template('register.html'), 503
+        except Exception:
             db.session.rollback()
             flash('Error creating account. Please try again.', 'error')
             return redirect(url_for('routes.register'))
@@ -81,7 +108,16 @@ def login():
         password = request.form.get('password')
         
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except HashingBusy:
+            flash('Too many people are signing in right now. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+
+        if valid:
+            if db.session.is_modified(user):
+                # check_password upgraded an outdated hash
+                db.session.commit()
             session['user_id'] = user.id
             flash('Successfully logged in!', 'success')
             return redirect(url_for('routes.dashboard'))
@@ -104,239 +140,212 @@ def dashboard():
         if not user:
             return redirect(url_for('routes.login'))
         
-        # Get all chitfunds where the user is a member
-        user_chitfunds = db.session.query(ChitFund).join(
-            chitfund_members
-        ).filter(
-            chitfund_members.c.user_id == user.id
-        ).all()
-        
-        funds_info = []
-        for fund in user_chitfunds:
-            # Get current round
-            current_round = Round.query.filter_by(
-                chitfund_id=fund.id,
-                round_number=fund.current_round
-            ).first()
-            
-            # Get payment status for current round
-            payment = None
-            can_bid = False
-            total_pooled = 0
-            
-            if current_round:
-                # Calculate total pooled amount from completed payments
-                completed_payments = Payment.query.filter_by(
-                    chitfund_id=fund.id,
-                    round_id=current_round.id,
-                    status='completed'
-                ).all()
-                
-                total_pooled = sum(payment.amount for payment in completed_payments)
-                
-                payment = Payment.query.filter_by(
-                    chitfund_id=fund.id,
-                    round_id=current_round.id,
-                    user_id=user.id
-                ).first()
-                
-                # If no payment record exists, create one
-                if not payment and current_round.status != 'completed':
-                    payment = Payment(
-                        chitfund_id=fund.id,
-                        round_id=current_round.id,
-                        user_id=user.id,
-                        amount=fund.monthly_contribution,
-                        status='pending'
-                    )
-                    db.session.add(payment)
-                    db.session.commit()
-                
-                # Check if user can bid
-                if current_round.status == 'bidding' and payment and payment.status == 'completed':
-                    # Check if all users have made their payments
-                    total_members = fund.member_count
-                    completed_payments_count = len(completed_payments)
-                    all_payments_made = total_members == completed_payments_count
-
-                    if not all_payments_made:
-                        can_bid = False
-                    else:
-                        # Check if user has already bid
-                        existing_bid = Bid.query.filter_by(
-                            chitfund_id=fund.id,
-                            round_id=current_round.id,
-                            user_id=user.id
-                        ).first()
-                        
-                        # Check if user has already won a round
-                        previous_wins = Round.query.filter_by(
-                            chitfund_id=fund.id,
-                            winner_id=user.id,
-                            status='completed'
-                        ).count()
-                        
-                        # User can bid if they haven't bid in this round and haven't won before
-                        can_bid = not existing_bid and previous_wins == 0
-                
-                # Get all bids for the current round
-                current_round.bids = Bid.query.filter_by(
-                    chitfund_id=fund.id,
-                    round_id=current_round.id
-                ).all()
-                
-                # Get all payments for the current round
-                current_round.payments = Payment.query.filter_by(
-                    chitfund_id=fund.id,
-                    round_id=current_round.id
-                ).all()
-                
-                # If round is completed, get winner info
-                if current_round.status == 'completed' and current_round.winner_id:
-                    current_round.winner = User.query.get(current_round.winner_id)
-            
-            # Get previous completed rounds
-            previous_rounds = Round.query.filter(
-                Round.chitfund_id == fund.id,
-                Round.status == 'completed',
-                Round.round_number < fund.current_round
-            ).order_by(Round.round_number.desc()).all()
-            
-            funds_info.append({
-                'fund': fund,
-                'current_round': current_round,
-                'payment': payment,
-                'can_bid': can_bid,
-                'total_pooled': total_pooled,
-                'previous_rounds': previous_rounds
-            })
+        funds_info = load_dashboard_funds(user)
         
         return render_template('dashboard.html', user=user, funds=funds_info)
         
-    except Exception as e:
-        print(f"Error in dashboard: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception('Error loading dashboard', extra={'user_id': session.get('user_id')})
         flash('An error occurred while loading the dashboard', 'error')
         return redirect(url_for('routes.index'))
 
+@routes.route('/api/fund/<int:chitfund_id>/state')
+@login_required
+def get_fund_state(chitfund_id):
+    """Current state of one of the user's fund cards, for patching the dashboard in place"""
+    try:
+        user = get_current_user()
+        if not user:
+            return jsonify({'error': 'Not logged in'}), 401
+        
+        funds_info = load_dashboard_funds(user, fund_ids=[chitfund_id])
+        if not funds_info:
+            return jsonify({'error': 'Chit fund not found'}), 404
+        
+        fund_info = funds_info[0]
+        state = fund_state(fund_info)
+        state['savings'] = user.savings or 0
+        state['html'] = render_template('fund_card.html', fund_info=fund_info, user=user)
+        
+        # Let clients revalidate with If-None-Match and get a 304 when nothing changed
+        response = jsonify(state)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.add_etag()
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        logger.exception('Error loading fund state', extra={
+            'fund_id': chitfund_id,
+            'user_id': session.get('user_id')
+        })
+        return jsonify({'error': str(e)}), 500
+
+@routes.route('/api/savings/statement')
+@login_required
+def savings_statement():
+    """The user's savings ledger entries with running balances; ?since= and ?until= take YYYY-MM-DD"""
+    try:
+        dates = {
+            name: datetime.strptime(request.args[name], '%Y-%m-%d') if request.args.get(name) else None
+            for name in ('since', 'until')
+        }
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    try:
+        opening, entries = ledger_statement(session['user_id'], dates['since'], dates['until'])
+        return jsonify({
+            'opening_balance': to_rupees(opening),
+            'closing_balance': to_rupees(entries[-1]['balance_paise'] if entries else opening),
+            'entries': [{
+                'date': entry['created_at'].isoformat(),
+                'reason': entry['reason'],
+                'chitfund_id': entry['chitfund_id'],
+                'round_id': entry['round_id'],
+                'credit': to_rupees(entry['credit_paise']),
+                'debit': to_rupees(entry['debit_paise']),
+                'balance': to_rupees(entry['balance_paise'])
+            } for entry in entries]
+        })
+    except Exception as e:
+        logger.exception('Error loading savings statement', extra={'user_id': session.get('user_id')})
+        return jsonify({'error': str(e)}), 500
+
+@job_handler('forecast')
+def forecast_job(payload):
+    """Run a forecast too large for a request; the result is stored on the job"""
+    return cached_forecast(params_from_json(payload))
+
+def _forecast(params):
+    """The forecast for these parameters, or None while a job computes it.
+
+    Small ones run here; larger ones go to one `forecast` job per parameter
+    set, whose stored result later requests (in any process) pick up.
+    """
+    result = cached(params)
+    if result is not None:
+        return result
+    if forecast_cost(params) <= current_app.config['FORECAST_INLINE_COST']:
+        return cached_forecast(params)
+
+    key = forecast_job_key(params)
+    failed = Job.query.filter_by(dedup_key=key, status='failed').first()
+    if failed:
+        raise RuntimeError(f'Forecast failed: {failed.last_error}')
+    try:
+        job = enqueue('forecast', params_to_json(params), dedup_key=key)
+        db.session.commit()
+    except IntegrityError:
+        # Another request queued it first
+        db.session.rollback()
+        return None
+    if job.status == 'done' and job.result:
+        result = json.loads(job.result)
+    else:
+        status, result = dispatch(job.id)  # Runs it now in inline mode
+        if status != 'done':
+            return None
+    remember(params, result)
+    return result
+
+@routes.route('/api/fund/<int:chitfund_id>/forecast')
+@login_required
+def fund_forecast(chitfund_id):
+    """Simulated payouts and IRRs by winning round and by member.
+
+    ?scenarios= asks for a sample size (rounded up to a fixed step). Large
+    forecasts answer 202 while a background job runs them; ask again.
+    """
+    try:
+        scenarios = int(request.args['scenarios']) if request.args.get('scenarios') else None
+    except ValueError:
+        return jsonify({'error': 'scenarios must be a whole number'}), 400
+
+    try:
+        chitfund = get_chitfund(chitfund_id)
+        if not chitfund:
+            return jsonify({'error': 'Chit fund not found'}), 404
+        params, member_ids = fund_params(chitfund, scenarios)
+        if session['user_id'] not in member_ids:
+            return jsonify({'error': 'Chit fund not found'}), 404
+
+        result = _forecast(params)
+        if result is None:
+            response = jsonify({'status': 'running', 'scenarios': params.scenarios})
+            response.headers['Retry-After'] = '5'
+            return response, 202
+
+        result = dict(result)
+        result['by_member'] = [
+            dict(member, user_id=user_id) for user_id, member in zip(member_ids, result['by_member'])
+        ]
+        result['you'] = result['by_member'][member_ids.index(session['user_id'])]
+        return jsonify(result)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.exception('Error forecasting fund', extra={
+            'fund_id': chitfund_id,
+            'user_id': session.get('user_id')
+        })
+        return jsonify({'error': str(e)}), 500
+
 @routes.route('/create-chitfund', methods=['GET', 'POST'])
 @login_required
 def create_chitfund():
     if request.method == 'GET':
         return render_template('create_chitfund.html')
         
+    creator_id = session.get('user_id')
+    batch = False
     try:
-        print("\n=== Creating Chit Fund ===")
-        
-        # Handle both JSON and form data
+        # Handle both JSON (one fund, or an array of funds) and form data
         if request.is_json:
             data = request.get_json()
-            name = data.get('name')
-            member_ids = data.get('members', [])
-            monthly_contribution = float(data.get('monthly_contribution', 0))
-            duration = int(data.get('duration', 0))
+            batch = isinstance(data, list)
+            specs = [fund_spec_from_json(item) for item in (data if batch else [data])]
         else:
-            name = request.form.get('name')
-            member_ids = request.form.get('member_ids', '').strip().split(',')
-            member_ids = [int(id) for id in member_ids if id.strip()]  # Convert to integers
-            monthly_contribution = float(request.form.get('monthly_contribution', 0))
-            duration = int(request.form.get('duration', 0))
-        
-        print(f"Name: {name}")
-        print(f"Member IDs: {member_ids}")
-        print(f"Monthly Contribution: {monthly_contribution}")
-        print(f"Duration: {duration}")
-        
-        if not all([name, monthly_contribution, duration]):
-            error_msg = 'Missing required fields'
-            if request.is_json:
-                return jsonify({'error': error_msg}), 400
-            flash(error_msg, 'error')
-            return redirect(url_for('routes.create_chitfund'))
-        
-        # Add creator to members if not already included
-        creator_id = session.get('user_id')
-        if creator_id not in member_ids:
-            member_ids.append(creator_id)
+            specs = [fund_spec_from_form(request.form)]
+    except (TypeError, ValueError) as e:
+        error_msg = f'Invalid chit fund details: {str(e)}'
+        if request.is_json:
+            return jsonify({'error': error_msg}), 400
+        flash(error_msg, 'error')
+        return redirect(url_for('routes.create_chitfund'))
+    
+    try:
+        logger.debug('Creating chit funds', extra={'user_id': creator_id, 'funds': specs})
+        success, result = create_funds(creator_id, specs)
         
-        # Validate member count matches duration
-        member_count = len(member_ids)
-        if member_count != duration:
-            error_msg = f'Number of members ({member_count}) must match duration ({duration})'
+        if not success:
             if request.is_json:
-                return jsonify({'error': error_msg}), 400
-            flash(error_msg, 'error')
+                return jsonify({'error': result}), 400
+            flash(result, 'error')
             return redirect(url_for('routes.create_chitfund'))
         
-        # Create new chit fund
-        chitfund = ChitFund(
-            name=name,
-            creator_id=creator_id,
-            member_count=member_count,  # Set the member_count
-            monthly_contribution=monthly_contribution,
-            duration=duration,
-            current_round=1,  # Start with round 1
-            start_date=datetime.utcnow(),
-            created_at=datetime.utcnow()
-        )
-        db.session.add(chitfund)
-        db.session.flush()  # Get chitfund.id without committing
-        print(f"Created chit fund with ID: {chitfund.id}")
-        
-        # Add members to chitfund
-        for member_id in member_ids:
-            stmt = chitfund_members.insert().values(
-                chitfund_id=chitfund.id,
-                user_id=member_id
-            )
-            db.session.execute(stmt)
-            print(f"Added member {member_id} to chit fund")
-        
-        # Create first round
-        first_round = Round(
-            chitfund_id=chitfund.id,
-            round_number=1,
-            status='bidding',
-            start_date=datetime.utcnow()
-        )
-        db.session.add(first_round)
-        db.session.flush()  # Get first_round.id without committing
-        print(f"Created first round with ID: {first_round.id}")
-        
-        # Create payment records for first round
-        for member_id in member_ids:
-            payment = Payment(
-                chitfund_id=chitfund.id,
-                round_id=first_round.id,
-                user_id=member_id,
-                amount=monthly_contribution,
-                status='pending',
-                created_at=datetime.utcnow()
-            )
-            db.session.add(payment)
-            print(f"Created payment record for member {member_id}")
+        logger.info('Chit funds created', extra={
+            'user_id': creator_id,
+            'fund_ids': [fund['chitfund_id'] for fund in result],
+            'member_count': sum(fund['member_count'] for fund in result)
+        })
         
-        # Commit all changes
-        db.session.commit()
-        print("Successfully committed all changes")
+        if batch:
+            return jsonify({
+                'message': f'{len(result)} chit funds created successfully!',
+                'funds': result
+            })
         
         success_msg = 'Chit fund created successfully!'
         if request.is_json:
-            return jsonify({
-                'message': success_msg,
-                'chitfund_id': chitfund.id,
-                'first_round_id': first_round.id,
-                'member_count': member_count
-            })
+            return jsonify(dict(result[0], message=success_msg))
         
         flash(success_msg, 'success')
         return redirect(url_for('routes.dashboard'))
         
     except Exception as e:
-        print(f"Error creating chit fund: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error creating chit fund', extra={'user_id': creator_id})
         db.session.rollback()
         
         error_msg = f'Error creating chit fund: {str(e)}'
@@ -354,21 +363,8 @@ def search_members():
         if len(query) < 3:
             return jsonify([])
         
-        print(f"\n=== Searching Members ===")
-        print(f"Query: {query}")
-        
-        # Search for users by username, full name, or mobile number
-        # Exclude the current user from results
-        users = User.query.filter(
-            User.id != session.get('user_id'),  # Exclude current user
-            db.or_(  # Use db.or_ instead of or_
-                User.username.ilike(f'%{query}%'),
-                User.full_name.ilike(f'%{query}%'),
-                User.mobile_number.ilike(f'%{query}%')
-            )
-        ).limit(10).all()
-        
-        print(f"Found {len(users)} users")
+        # Prefix lookup in the in-memory member index (no table scan)
+        users = find_members(query, limit=10, exclude_user_id=session.get('user_id'))
         
         result = [{
             'id': user.id,
@@ -377,13 +373,10 @@ def search_members():
             'mobile_number': user.mobile_number
         } for user in users]
         
-        print(f"Returning results: {result}")
         return jsonify(result)
         
     except Exception as e:
-        print(f"Error searching members: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error searching members', extra={'user_id': session.get('user_id')})
         return jsonify({'error': str(e)}), 500
 
 @routes.route('/api/place_bid', methods=['POST'])
@@ -396,66 +389,52 @@ def place_bid():
             
         chitfund_id = data.get('chitfund_id')
         round_id = data.get('round_id')
-        bid_amount = float(data.get('amount'))
+        bid_paise = to_paise(data.get('amount'))
+        bid_amount = to_rupees(bid_paise)
         user_id = session.get('user_id')
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
         
         if not all([chitfund_id, round_id, bid_amount]):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        print("\n=== Processing Bid ===")
-        print(f"ChitFund ID: {chitfund_id}")
-        print(f"Round ID: {round_id}")
-        print(f"Bid Amount: Rs.{bid_amount}")
-        print(f"User ID: {user_id}")
+        if idempotency_key and len(idempotency_key) > 64:
+            return jsonify({'error': 'Idempotency key must be at most 64 characters'}), 400
         
         # Validate bid
-        chitfund = ChitFund.query.get(chitfund_id)
+        chitfund = get_chitfund(chitfund_id)
         if not chitfund:
             return jsonify({'error': 'Invalid chit fund'}), 400
         
-        round = Round.query.get(round_id)
+        # Lock the round so bids on it are checked and counted one at a time
+        round = Round.query.filter_by(
+            id=round_id,
+            chitfund_id=chitfund_id
+        ).with_for_update().populate_existing().first()
+        
+        # A retried request returns the outcome of the original bid
+        if idempotency_key:
+            replay = replay_bid(user_id, idempotency_key)
+            if replay:
+                return replay
+        
         if not round or round.status != 'bidding':
             return jsonify({'error': 'Round not open for bidding'}), 400
         
-        # Get all members in the chit fund using the association table
-        total_members = db.session.query(User).join(
-            chitfund_members
-        ).filter(
-            chitfund_members.c.chitfund_id == chitfund_id
-        ).count()
-        print(f"Total members in chit fund: {total_members}")
+        deadline = round.bidding_deadline
+        if deadline and deadline <= datetime.utcnow():
+            # Release the round lock, then close the round in case nothing else has
+            db.session.rollback()
+            request_close(round.id, deadline)
+            return jsonify({'error': 'Bidding for this round has closed'}), 400
         
-        # For rounds after first round, get count of members who haven't won yet
-        if round.round_number > 1:
-            # Get list of users who have already won
-            previous_winners = db.session.query(Round.winner_id).filter(
-                Round.chitfund_id == chitfund_id,
-                Round.status == 'completed'
-            ).all()
-            previous_winner_ids = [w[0] for w in previous_winners]
-            print(f"Previous winners: {previous_winner_ids}")
-            
-            # Count eligible members (those who haven't won)
-            eligible_members = db.session.query(User).join(
-                chitfund_members
-            ).filter(
-                chitfund_members.c.chitfund_id == chitfund_id,
-                ~User.id.in_(previous_winner_ids)
-            ).count()
-            print(f"Eligible members for this round: {eligible_members}")
-        else:
-            eligible_members = total_members
-            print(f"First round - all members eligible: {eligible_members}")
+        # Every completed round has produced exactly one winner, and winners
+        # cannot bid again, so the remaining members are the eligible bidders
+        total_members = chitfund.member_count
+        eligible_members = total_members - (round.round_number - 1)
         
-        # Calculate current pool amount from all completed payments
-        completed_payments = Payment.query.filter_by(
-            chitfund_id=chitfund_id,
-            round_id=round_id,
-            status='completed'
-        ).all()
-        
-        total_pooled = sum(payment.amount for payment in completed_payments)
-        if bid_amount >= total_pooled:
+        # Current pool amount is maintained on the round as payments complete
+        total_pooled = round.pooled_amount
+        if bid_paise >= round.pooled_amount_paise:
             return jsonify({
                 'error': f'Bid amount (Rs.{bid_amount:,.2f}) must be less than current pool amount (Rs.{total_pooled:,.2f})'
             }), 400
@@ -490,6 +469,8 @@ def place_bid():
         ).first()
         
         if existing_bid:
+            if idempotency_key and existing_bid.idempotency_key == idempotency_key:
+                return replay_bid(user_id, idempotency_key)
             return jsonify({'error': 'You have already placed a bid in this round'}), 400
         
         # Create new bid
@@ -497,39 +478,73 @@ def place_bid():
             chitfund_id=chitfund_id,
             round_id=round_id,
             user_id=user_id,
-            amount=bid_amount,
+            amount_paise=bid_paise,
+            idempotency_key=idempotency_key,
             timestamp=datetime.utcnow()
         )
         db.session.add(bid)
-        db.session.commit()
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # A concurrent request from the same user won the unique index
+            db.session.rollback()
+            if idempotency_key:
+                replay = replay_bid(user_id, idempotency_key)
+                if replay:
+                    return replay
+            return jsonify({'error': 'You have already placed a bid in this round'}), 400
+        round.record_bid(bid_paise)
+        
+        # Read the counters inside the transaction, so only the request that
+        # placed the final bid sees the round as complete
+        paid_members_count = round.paid_count
+        unique_bidders = round.bid_count
         
-        # Get counts of paid members and bidders
-        paid_members_count = len(completed_payments)
+        # Settle in the background once all eligible members have bid. The job
+        # commits with the bid, and its dedup key allows one job per round
+        settle_job_id = None
+        if unique_bidders == eligible_members:
+            settle_job_id = enqueue(
+                'settle_round', {'round_id': round_id}, dedup_key=f'settle:{round_id}'
+            ).id
+        db.session.commit()
         
-        # Count unique bidders after adding the new bid
-        unique_bidders = db.session.query(Bid.user_id).filter(
-            Bid.chitfund_id == chitfund_id,
-            Bid.round_id == round_id,
-            ~Bid.user_id.in_(previous_winner_ids) if round.round_number > 1 else True
-        ).distinct().count()
+        publish_fund_event(
+            chitfund_id, 'bid_placed',
+            round_id=round_id,
+            bids_received=unique_bidders,
+            total_expected=eligible_members
+        )
         
-        print(f"\nTotal members in fund: {total_members}")
-        print(f"Eligible members: {eligible_members}")
-        print(f"Paid members: {paid_members_count}")
-        print(f"Total unique bidders: {unique_bidders}")
+        logger.info('Bid placed', extra={
+            'fund_id': chitfund_id,
+            'round_id': round_id,
+            'user_id': user_id,
+            'amount': bid_amount,
+            'bids_received': unique_bidders,
+            'eligible_members': eligible_members,
+            'paid_members': paid_members_count,
+            'job_id': settle_job_id
+        })
         
-        # Check if all eligible members have bid
-        if unique_bidders == eligible_members:
-            print("\nAll eligible members have bid - ending round...")
-            success, message = end_round_bidding(round_id)
-            if success:
+        if settle_job_id:
+            # Runs here when JOBS_INLINE is set, otherwise on a worker
+            status, result = dispatch(settle_job_id)
+            if status == 'done':
                 return jsonify({
                     'message': 'Bid placed successfully and round completed',
                     'round_completed': True,
-                    'round_result': message
+                    'round_result': result
                 })
-            else:
-                return jsonify({'error': f'Error ending round: {message}'}), 500
+            return jsonify({
+                'message': 'Bid placed successfully; the round is being settled',
+                'bid_amount': bid_amount,
+                'bids_received': unique_bidders,
+                'total_expected': eligible_members,
+                'round_completed': False,
+                'settlement_queued': True,
+                'job_id': settle_job_id
+            })
         
         return jsonify({
             'message': 'Bid placed successfully',
@@ -542,176 +557,84 @@ def place_bid():
         })
         
     except Exception as e:
-        print(f"Error in place_bid: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error placing bid', extra={'user_id': session.get('user_id')})
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-def end_round_bidding(round_id):
+def replay_bid(user_id, idempotency_key):
+    """Response for a bid request that was already processed, or None"""
+    bid = Bid.query.filter_by(
+        user_id=user_id,
+        idempotency_key=idempotency_key
+    ).first()
+    if not bid:
+        return None
+    
+    return jsonify({
+        'message': 'Bid placed successfully',
+        'bid_amount': bid.amount,
+        'round_completed': bid.round.status == 'completed',
+        'replayed': True
+    })
+
+def end_round_bidding(round_id, partial=False):
     """End the bidding for a round and determine the winner"""
-    try:
-        print(f"\n=== Ending Round {round_id} Bidding ===")
-        
-        round = Round.query.get(round_id)
-        if not round:
-            return False, "Round not found"
-        
-        if round.status != 'bidding':
-            return False, "Round is not in bidding status"
-        
-        chitfund = ChitFund.query.get(round.chitfund_id)
-        if not chitfund:
-            return False, "Chit fund not found"
-        
-        # Get all members in the chit fund
-        total_members = db.session.query(User).join(
-            chitfund_members
-        ).filter(
-            chitfund_members.c.chitfund_id == round.chitfund_id
-        ).count()
-        print(f"Total members in chit fund: {total_members}")
-        
-        # Get all completed payments for this round
-        completed_payments = Payment.query.filter_by(
-            chitfund_id=round.chitfund_id,
-            round_id=round.id,
-            status='completed'
-        ).all()
-        paid_members = [payment.user_id for payment in completed_payments]
-        print(f"Paid members: {paid_members}")
-        
-        # For rounds after first round, get list of previous winners
-        previous_winner_ids = []
-        if round.round_number > 1:
-            previous_winners = db.session.query(Round.winner_id).filter(
-                Round.chitfund_id == round.chitfund_id,
-                Round.status == 'completed'
-            ).all()
-            previous_winner_ids = [w[0] for w in previous_winners]
-            print(f"Previous winners: {previous_winner_ids}")
-        
-        # Get all bids for this round
-        bids = Bid.query.filter_by(
-            chitfund_id=round.chitfund_id,
-            round_id=round.id
-        ).all()
-        
-        # Get unique bidders who are eligible (not previous winners)
-        unique_bidders = set()
-        for bid in bids:
-            if round.round_number == 1 or bid.user_id not in previous_winner_ids:
-                unique_bidders.add(bid.user_id)
-        print(f"Unique eligible bidders: {unique_bidders}")
-        
-        # For rounds after first round, we only need bids from non-winners
-        if round.round_number > 1:
-            eligible_members = set(paid_members) - set(previous_winner_ids)
-            print(f"Eligible members for this round: {eligible_members}")
-            
-            if not unique_bidders.issuperset(eligible_members):
-                missing_bidders = eligible_members - unique_bidders
-                print(f"Missing bids from eligible members: {missing_bidders}")
-                return False, "Not all eligible members have placed their bids"
-        else:
-            # First round - need bids from all paid members
-            if not unique_bidders.issuperset(set(paid_members)):
-                missing_bidders = set(paid_members) - unique_bidders
-                print(f"Missing bids from paid members: {missing_bidders}")
-                return False, "Not all paid members have placed their bids"
-        
-        # Find the winning bid (lowest bid amount)
-        valid_bids = [bid for bid in bids if bid.user_id in unique_bidders]
-        if not valid_bids:
-            return False, "No valid bids found"
-        
-        winning_bid = min(valid_bids, key=lambda x: x.amount)
-        print(f"\nWinning bid: Rs.{winning_bid.amount} by user {winning_bid.user_id}")
-        
-        # Calculate total pool and dividend
-        total_pool = sum(payment.amount for payment in completed_payments)
-        dividend_per_member = (total_pool - winning_bid.amount) / (len(completed_payments) - 1)  # Exclude winner from dividend
-        print(f"Total pool: Rs.{total_pool}")
-        print(f"Dividend per member: Rs.{dividend_per_member}")
-        
-        # Update round with winner
-        round.status = 'completed'
-        round.winner_id = winning_bid.user_id
-        round.winning_bid = winning_bid.amount
-        round.dividend_per_member = dividend_per_member
-        round.end_date = datetime.utcnow()
-        
-        # Update winner's savings with their winning bid
-        winner = User.query.get(winning_bid.user_id)
-        if winner:
-            winner.savings += winning_bid.amount
-            print(f"Updated winner's savings: Rs.{winner.savings}")
-        
-        # Update all other members' savings with their dividend
-        for payment in completed_payments:
-            if payment.user_id != winning_bid.user_id:  # Skip winner
-                user = User.query.get(payment.user_id)
-                if user:
-                    user.savings += dividend_per_member
-                    print(f"Updated {user.username}'s savings with dividend: Rs.{dividend_per_member}")
-        
-        # Update chitfund current round
-        chitfund.current_round = round.round_number
-        
-        # If this is not the last round, create next round
-        if round.round_number < chitfund.duration:
-            next_round = Round(
-                chitfund_id=round.chitfund_id,
-                round_number=round.round_number + 1,
-                status='bidding',
-                start_date=datetime.utcnow()
+    success, result = settle_round(round_id, partial=partial)
+    if success:
+        if not result.get('already_settled'):
+            chitfund_id = get_round(round_id).chitfund_id
+            logger.info('Round settled', extra={
+                'fund_id': chitfund_id,
+                'round_id': round_id,
+                'user_id': result['winner_id'],
+                'amount': result['winning_bid'],
+                'dividend': result['dividend_per_member'],
+                'partial': partial
+            })
+            publish_fund_event(chitfund_id, 'round_settled', round_id=round_id, **result)
+            if result['next_round']:
+                # Created upcoming; round_opened follows once every member has paid
+                publish_fund_event(chitfund_id, 'round_created', round_number=result['next_round'])
+    else:
+        logger.error('Error ending round', extra={'round_id': round_id, 'error': result})
+    return success, result
+
+@job_handler('settle_round')
+def settle_round_job(payload):
+    success, result = end_round_bidding(payload['round_id'])
+    if not success:
+        raise RuntimeError(f'Error ending round: {result}')
+    return result
+
+@job_handler('close_round')
+def close_round_job(payload):
+    """Settle a round whose bidding deadline has passed with the bids so far"""
+    round = Round.query.get(payload['round_id'])
+    deadline = round.bidding_deadline if round else None
+    # Already settled, or the deadline moved since the job was queued
+    if not round or round.status != 'bidding' or not deadline or deadline > datetime.utcnow():
+        return {'closed': False}
+
+    if not round.bid_count or round.paid_count < 2:
+        # Nobody has bid yet (or nobody would share the dividend); give the
+        # members another window
+        extended = extend_deadline(round.id, deadline)
+        if extended:
+            logger.info('Bidding deadline extended', extra={
+                'fund_id': round.chitfund_id,
+                'round_id': round.id,
+                'deadline': extended.isoformat()
+            })
+            publish_fund_event(
+                round.chitfund_id, 'deadline_extended',
+                round_id=round.id, bidding_deadline=extended.isoformat()
             )
-            db.session.add(next_round)
-            
-            # Update chitfund's current round
-            chitfund.current_round = next_round.round_number
-            
-            # Commit to get the next_round.id
-            db.session.commit()
-            print(f"\nCreated round {next_round.round_number}")
-            
-            # Now create pending payments for next round
-            print("Creating pending payments for next round...")
-            for member_id in paid_members:
-                payment = Payment(
-                    chitfund_id=round.chitfund_id,
-                    round_id=next_round.id,
-                    user_id=member_id,
-                    amount=round.chitfund.monthly_contribution,
-                    status='pending',
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(payment)
-                print(f"Created pending payment for user {member_id}")
-            
-            # Commit the payments
-            db.session.commit()
-            print("All pending payments created successfully")
-            print(f"Chit fund current round updated to {chitfund.current_round}")
-        else:
-            # Just commit the round completion
-            db.session.commit()
-            print("Final round completed")
-        
-        return True, {
-            'winner_id': winning_bid.user_id,
-            'winning_bid': winning_bid.amount,
-            'total_pool': total_pool,
-            'dividend_per_member': dividend_per_member,
-            'next_round': round.round_number + 1 if round.round_number < chitfund.duration else None
-        }
-        
-    except Exception as e:
-        print(f"Error ending round: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        db.session.rollback()
-        return False, str(e)
+        return {'closed': False, 'bidding_deadline': extended.isoformat() if extended else None}
+
+    success, result = end_round_bidding(round.id, partial=True)
+    if not success:
+        raise RuntimeError(f'Error closing round: {result}')
+    return dict(result, closed=True)
 
 @routes.route('/api/make_payment', methods=['POST'])
 @login_required
@@ -729,8 +652,8 @@ def make_payment():
             return jsonify({'error': 'Missing required fields'}), 400
         
         # Get the chitfund and round
-        chitfund = ChitFund.query.get(chitfund_id)
-        current_round = Round.query.get(round_id)
+        chitfund = get_chitfund(chitfund_id)
+        current_round = get_round(round_id)
         
         if not chitfund or not current_round:
             return jsonify({'error': 'Invalid chitfund or round'}), 400
@@ -750,88 +673,123 @@ def make_payment():
                 chitfund_id=chitfund_id,
                 round_id=round_id,
                 user_id=user_id,
-                amount=chitfund.monthly_contribution,
-                status='completed',
-                timestamp=datetime.utcnow()
+                amount_paise=chitfund.monthly_contribution_paise,
+                status='pending',
+                created_at=datetime.utcnow()
             )
             db.session.add(payment)
-        else:
-            payment.status = 'completed'
-            payment.timestamp = datetime.utcnow()
         
+        newly_completed = payment.mark_completed()
         db.session.commit()
-
-        # Check if this is the last round and all payments are complete
-        if current_round.round_number == chitfund.duration:
-            # Count completed payments for this round
-            completed_payments = Payment.query.filter_by(
-                chitfund_id=chitfund_id,
+        
+        if newly_completed:
+            publish_fund_event(
+                chitfund_id, 'payment_completed',
                 round_id=round_id,
-                status='completed'
-            ).count()
-
-            # Get total members in the chitfund
-            total_members = db.session.query(User).join(
-                chitfund_members
-            ).filter(
-                chitfund_members.c.chitfund_id == chitfund_id
-            ).count()
-
-            # If all members have paid in the last round
-            if completed_payments == total_members:
-                # Find the user who hasn't won yet
-                previous_winners = db.session.query(Round.winner_id).filter(
-                    Round.chitfund_id == chitfund_id,
-                    Round.status == 'completed'
-                ).all()
-                previous_winner_ids = [w[0] for w in previous_winners]
-
-                last_user = db.session.query(User).join(
-                    chitfund_members
-                ).filter(
-                    chitfund_members.c.chitfund_id == chitfund_id,
-                    ~User.id.in_(previous_winner_ids)
-                ).first()
-
-                if last_user:
-                    # Calculate total pool amount
-                    total_pool = completed_payments * chitfund.monthly_contribution
-                    
-                    # Update round with winner
-                    current_round.winner_id = last_user.id
-                    current_round.winning_bid = 0  # No bid for last round
-                    current_round.status = 'completed'
-                    current_round.dividend_per_member = 0  # No dividend in last round
-                    
-                    # Update user's savings
-                    last_user.savings = (last_user.savings or 0) + total_pool
-                    
-                    db.session.commit()
-                    
-                    return jsonify({
-                        'message': 'Payment successful and round completed automatically'
-                    })
-
-        # Check if all members have paid for regular rounds
-        total_paid = Payment.query.filter_by(
-            chitfund_id=chitfund_id,
-            round_id=round_id,
-            status='completed'
-        ).count()
+                paid_count=current_round.paid_count
+            )
         
-        if total_paid == chitfund.member_count and current_round.round_number < chitfund.duration:
-            current_round.status = 'bidding'
-            db.session.commit()
+        # Open bidding, or pay out the final round, once everyone has paid
+        status, result = advance_round(current_round.id)
+        if status == 'bidding':
+            publish_fund_event(chitfund.id, 'round_opened', **result)
+        if status == 'completed':
+            publish_fund_event(chitfund.id, 'round_settled', round_id=current_round.id, **result)
+            return jsonify({
+                'message': 'Payment successful and round completed automatically'
+            })
         
         return jsonify({'message': 'Payment successful'})
         
     except Exception as e:
-        print(f"Error in make_payment: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error making payment', extra={'user_id': session.get('user_id')})
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@routes.route('/api/payments/import', methods=['POST'])
+@login_required
+def import_payments():
+    """Complete a fund's pending payments from an uploaded bank or UPI statement (CSV).
+
+    Only the fund's organiser may import. Form fields: statement (the
+    file), chitfund_id, and optionally method and dry_run.
+    """
+    upload = request.files.get('statement')
+    chitfund_id = request.form.get('chitfund_id', type=int)
+    method = request.form.get('method', 'upi')
+    if not upload or not chitfund_id:
+        return jsonify({'error': 'Missing required fields'}), 400
+    if method not in PAYMENT_METHODS:
+        return jsonify({'error': f"Method must be one of {', '.join(PAYMENT_METHODS)}"}), 400
+
+    chitfund = get_chitfund(chitfund_id)
+    if not chitfund:
+        return jsonify({'error': 'Chit fund not found'}), 404
+    if chitfund.creator_id != session['user_id']:
+        return jsonify({'error': 'Only the fund organiser can import statements'}), 403
+
+    unmatched = []
+
+    def report_unmatched(line, reason):
+        if len(unmatched) < MAX_UNMATCHED_REPORTED:
+            unmatched.append({'line': line.number, 'reference': line.reference, 'reason': reason})
+
+    try:
+        # Werkzeug spools large uploads to disk; the statement is read as a stream
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        summary = import_statement(
+            stream,
+            fund_id=chitfund.id,
+            method=method,
+            dry_run=request.form.get('dry_run') in ('1', 'true', 'yes'),
+            on_unmatched=report_unmatched
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        return jsonify({'error': f'Could not read the statement: {e}'}), 400
+    except Exception as e:
+        logger.exception('Error importing statement', extra={
+            'fund_id': chitfund_id,
+            'user_id': session.get('user_id')
+        })
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+    summary['unmatched_lines'] = unmatched
+    return jsonify(summary)
+
+@routes.route('/api/events')
+@login_required
+def events_stream():
+    """Server-Sent Events stream of updates for every fund the user belongs to"""
+    subscription = broker.subscribe(
+        session['user_id'],
+        current_app.config.get('EVENT_QUEUE_SIZE', DEFAULT_QUEUE_SIZE),
+        current_app.config.get('EVENT_MAX_STREAMS', DEFAULT_MAX_STREAMS)
+    )
+    if subscription is None:
+        # Every stream holds a worker thread; refuse rather than starve other requests
+        logger.warning('Event stream limit reached', extra={
+            'user_id': session.get('user_id'),
+            'open_streams': broker.open_streams()
+        })
+        response = jsonify({'error': 'Too many live update streams are open; updates will arrive by polling'})
+        response.headers['Retry-After'] = '60'
+        return response, 503
+    heartbeat = current_app.config.get('EVENT_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS)
+    
+    response = Response(
+        broker.stream(subscription, heartbeat),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+        }
+    )
+    # The stream's own cleanup never runs if the client leaves before the first frame
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
+
 @routes.route('/learn')
 @login_required
 def learn():
@@ -839,125 +797,8 @@ def learn():
     if not user:
         return redirect(url_for('routes.login'))
 
-    financial_literacy = {
-        'title': 'Financial Literacy',
-        'description': 'Understanding the basics of money management',
-        'topics': [
-            {
-                'title': 'Budgeting Basics',
-                'description': 'Learn how to create and maintain a monthly budget',
-                'key_points': [
-                    'Track your income and expenses',
-                    'Set financial goals',
-                    'Create an emergency fund',
-                    'Reduce unnecessary expenses'
-                ]
-            },
-            {
-                'title': 'Smart Saving Strategies',
-                'description': 'Effective ways to save money and grow your wealth',
-                'key_points': [
-                    'Start saving early',
-                    'Set up automatic savings',
-                    'Choose the right savings account',
-                    'Understand compound interest'
-                ]
-            },
-            {
-                'title': 'Investment Fundamentals',
-                'description': 'Basic concepts of investing for long-term growth',
-                'key_points': [
-                    'Different types of investments',
-                    'Risk and return relationship',
-                    'Diversification importance',
-                    'Long-term investment strategies'
-                ]
-            }
-        ]
-    }
-    
-    government_schemes = {
-        'title': 'Government Schemes',
-        'description': 'Financial assistance programs and benefits',
-        'schemes': [
-            {
-                'name': 'Pradhan Mantri Jan Dhan Yojana (PMJDY)',
-                'description': 'National mission for financial inclusion providing access to financial services',
-                'benefits': [
-                    'Zero balance savings account',
-                    'RuPay debit card',
-                    'Accident insurance cover',
-                    'Overdraft facility'
-                ]
-            },
-            {
-                'name': 'Sukanya Samriddhi Yojana',
-                'description': 'Government savings scheme for girl child education and marriage expenses',
-                'benefits': [
-                    'Higher interest rates',
-                    'Tax benefits under section 80C',
-                    'Partial withdrawal for education',
-                    'Long-term savings plan'
-                ]
-            },
-            {
-                'name': 'Atal Pension Yojana',
-                'description': 'Pension scheme for unorganized sector workers',
-                'benefits': [
-                    'Guaranteed pension after 60 years',
-                    'Low premium amounts',
-                    'Government co-contribution',
-                    'Multiple pension options'
-                ]
-            }
-        ]
-    }
-    
-    bank_account = {
-        'title': 'Bank Account Creation',
-        'description': 'Step-by-step guide to opening a bank account',
-        'steps': [
-            {
-                'title': 'Choose Account Type',
-                'details': [
-                    'Savings Account - For personal savings and daily transactions',
-                    'Current Account - For business purposes',
-                    'Fixed Deposit - For long-term savings with higher interest',
-                    'Recurring Deposit - For regular monthly savings'
-                ]
-            },
-            {
-                'title': 'Required Documents',
-                'details': [
-                    'Identity Proof (Aadhaar, PAN, Voter ID)',
-                    'Address Proof (Utility bills, Passport)',
-                    'Passport size photographs',
-                    'PAN card or Form 60'
-                ]
-            },
-            {
-                'title': 'Account Opening Process',
-                'details': [
-                    'Visit nearest bank branch or apply online',
-                    'Fill account opening form',
-                    'Submit required documents',
-                    'Initial deposit (if required)'
-                ]
-            }
-        ]
-    }
-    
     return render_template('learn.html', 
-                         financial_literacy=financial_literacy,
-                         government_schemes=government_schemes,
-                         bank_account=bank_account,
+                         financial_literacy=FINANCIAL_LITERACY,
+                         government_schemes=GOVERNMENT_SCHEMES,
+                         bank_account=BANK_ACCOUNT,
                          user=user)
-
-# Template context processor to get payment status
-@routes.app_template_global()
-def get_payment_status(chitfund_id, round_number, user_id):
-    return Payment.query.filter_by(
-        chitfund_id=chitfund_id,
-        round_id=Round.query.filter_by(chitfund_id=chitfund_id, round_number=round_number).first().id,  # Use round_id instead of round_number
-        user_id=user_id
-    ).first()
@@ -0,0 +1,217 @@
+"""Prefix search over the user directory for the member picker.
+
+The index keeps every searchable term (username, full name, each later word
+of the full name, mobile number) in one sorted list, so a prefix lookup is
+a binary search plus a short scan instead of a table scan. Only user ids
+are held in memory; the handful of matching rows is fetched by primary key.
+
+Matching is by prefix of a term, not by substring as the old ILIKE '%q%'
+search was: "pri" finds "Priya Sharma" and "Anu Priya", but "iya" and the
+middle digits of a mobile number no longer match anything.
+
+New registrations in this process are added immediately; users registered
+through other workers are picked up incrementally (by id) at most every
+REFRESH_SECONDS. Ids are assigned at insert but become visible at commit, so
+a slow transaction can commit a lower id after a higher one was loaded; each
+refresh looks back RESCAN_IDS ids below the highest it has seen and adds any
+it missed. The refresh query runs outside the index lock, so searches keep
+using the current index while it loads and the new terms are merged in
+afterwards.
+"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from models import db, User
+
+REFRESH_SECONDS = 5
+RESCAN_IDS = 1000
+CACHE_TTL_SECONDS = 30
+CACHE_SIZE = 1024
+MAX_CANDIDATES = 500
+
+# Lower rank sorts first: username matches beat name matches beat mobile matches
+USERNAME, FULL_NAME, NAME_WORD, MOBILE = range(4)
+
+def _terms(username, full_name, mobile_number):
+    full_name = (full_name or '').lower().strip()
+    terms = [((username or '').lower(), USERNAME), (full_name, FULL_NAME)]
+    terms.extend((word, NAME_WORD) for word in full_name.split()[1:])
+    terms.append(((mobile_number or '').replace(' ', ''), MOBILE))
+    return [(term, kind) for term, kind in terms if term]
+
+def _entries(rows):
+    """Sorted (term, user_id * 4 + kind) pairs for (id, username, full_name, mobile_number) rows"""
+    entries = [
+        (term, user_id * 4 + kind)
+        for user_id, username, full_name, mobile_number in rows
+        for term, kind in _terms(username, full_name, mobile_number)
+    ]
+    entries.sort()
+    return entries
+
+class MemberSearchIndex:
+    """Sorted term index with a small TTL cache of recent prefixes"""
+
+    def __init__(self, cache_ttl=CACHE_TTL_SECONDS, cache_size=CACHE_SIZE, refresh_seconds=REFRESH_SECONDS):
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()  # One refresh query at a time
+        self._generation = 0
+        self.reset()
+
+    def reset(self):
+        """Forget everything; the next search reloads from the database"""
+        with self._lock:
+            self._terms = []
+            self._refs = array('q')  # user_id * 4 + kind, parallel to _terms
+            self._last_user_id = 0
+            self._recent_ids = set()  # Indexed ids within RESCAN_IDS of _last_user_id
+            self._loaded = False
+            self._refreshed_at = 0.0
+            self._cache = OrderedDict()
+            self._generation += 1  # A refresh already loading is discarded
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._terms)
+
+    def bulk_add(self, rows):
+        """Add (id, username, full_name, mobile_number) rows, sorted outside the lock"""
+        entries = _entries(rows)
+        with self._lock:
+            self._merge(entries)
+            self._remember(sorted(row[0] for row in rows))
+
+    def _remember(self, user_ids):
+        # Callers hold the lock; user_ids are sorted and now indexed
+        if user_ids:
+            self._last_user_id = max(self._last_user_id, user_ids[-1])
+        floor = self._last_user_id - RESCAN_IDS
+        self._recent_ids = {user_id for user_id in self._recent_ids if user_id > floor}
+        self._recent_ids.update(user_ids[bisect_right(user_ids, floor):])
+
+    def _merge(self, entries):
+        # Callers hold the lock; both sides are sorted, so this is one linear pass
+        if self._terms:
+            entries = list(heapq.merge(zip(self._terms, self._refs), entries))
+        self._terms = [term for term, _ in entries]
+        self._refs = array('q', (ref for _, ref in entries))
+        self._cache.clear()
+
+    def _insert(self, user_id, username, full_name, mobile_number):
+        for term, kind in _terms(username, full_name, mobile_number):
+            position = bisect_left(self._terms, term)
+            self._terms.insert(position, term)
+            self._refs.insert(position, user_id * 4 + kind)
+
+    def add_user(self, user):
+        """Index a newly registered user"""
+        with self._lock:
+            if not self._loaded:
+                return  # The initial load will pick the user up
+            self._insert(user.id, user.username, user.full_name, user.mobile_number)
+            # Leave _last_user_id alone so lower ids from other workers still load
+            self._recent_ids.add(user.id)
+            self._cache.clear()
+
+    def _due(self, force):
+        return force or not self._loaded or time.monotonic() - self._refreshed_at >= self.refresh_seconds
+
+    def refresh(self, force=False):
+        """Load users that were added to the database since the last load"""
+        if not self._due(force):
+            return
+        # Before the first load there is nothing to search, so wait for it;
+        # afterwards, search the current index while another thread refreshes
+        if not self._refresh_lock.acquire(blocking=not self._loaded):
+            return
+        try:
+            if not self._due(force):
+                return  # Loaded by the thread we waited for
+            now = time.monotonic()
+            with self._lock:
+                since, generation = self._last_user_id, self._generation
+                known = set(self._recent_ids)
+
+            rows = db.session.query(
+                User.id, User.username, User.full_name, User.mobile_number
+            ).filter(
+                User.id > since - RESCAN_IDS
+            ).order_by(User.id).yield_per(10000).all()
+            rows = [row for row in rows if row[0] not in known]
+            bulk = not self._loaded or len(rows) > 1000
+            entries = _entries(rows) if bulk else None
+
+            with self._lock:
+                if generation != self._generation:
+                    return  # reset() while loading
+                added = self._recent_ids - known  # By add_user() while we queried
+                if added:
+                    rows = [row for row in rows if row[0] not in added]
+                    if bulk:
+                        entries = [entry for entry in entries if entry[1] // 4 not in added]
+                if bulk:
+                    self._merge(entries)
+                else:
+                    for row in rows:
+                        self._insert(*row)
+                    if rows:
+                        self._cache.clear()
+                self._remember([row[0] for row in rows])
+                self._loaded = True
+                self._refreshed_at = now
+        finally:
+            self._refresh_lock.release()
+
+    def search(self, query, limit=10, exclude_user_id=None):
+        """Ids of users matching a prefix, best matches first"""
+        prefix = query.lower().strip()
+        if not prefix:
+            return []
+        self.refresh()
+
+        with self._lock:
+            cached = self._cache.get(prefix)
+            if cached and cached[0] > time.monotonic():
+                self._cache.move_to_end(prefix)
+                self.hits += 1
+                ranked = cached[1]
+            else:
+                self.misses += 1
+                ranked = self._rank(prefix)
+                self._cache[prefix] = (time.monotonic() + self.cache_ttl, ranked)
+                self._cache.move_to_end(prefix)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [user_id for user_id in ranked if user_id != exclude_user_id][:limit]
+
+    def _rank(self, prefix):
+        best = {}
+        position = bisect_left(self._terms, prefix)
+        end = min(len(self._terms), position + MAX_CANDIDATES)
+        while position < end and self._terms[position].startswith(prefix):
+            term = self._terms[position]
+            user_id, kind = divmod(self._refs[position], 4)
+            # Exact matches first, then by field, then shorter (closer) terms
+            score = (term != prefix, kind, len(term), user_id)
+            if user_id not in best or score < best[user_id]:
+                best[user_id] = score
+            position += 1
+        return sorted(best, key=best.get)
+
+member_index = MemberSearchIndex()
+
+def search_members(query, limit=10, exclude_user_id=None):
+    """Matching users in rank order, fetched by primary key"""
+    user_ids = member_index.search(query, limit, exclude_user_id)
+    if not user_ids:
+        return []
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))}
+    return [users[user_id] for user_id in user_ids if user_id in users]
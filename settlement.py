@@ -0,0 +1,287 @@
+from datetime import datetime
+from sqlalchemy import and_, case, literal, select
+from models import db, ChitFund, Round, Bid, Payment, chitfund_members
+from deadlines import bidding_deadline
+from ledger import post, post_from_select, credit_round
+from money import split, to_paise, to_rupees
+
+
+def _settled_result(round, chitfund, already_settled=False):
+    result = {
+        'winner_id': round.winner_id,
+        'winning_bid': round.winning_bid,
+        'total_pool': round.pooled_amount,
+        'dividend_per_member': round.dividend_per_member,
+        'next_round': round.round_number + 1 if round.round_number < chitfund.duration else None
+    }
+    if already_settled:
+        result['already_settled'] = True
+    return result
+
+
+def settle_round(round_id, winner_id=None, winning_bid=None, partial=False):
+    """Settle a bidding round in a single transaction.
+
+    Locks the round, picks the lowest bid (unless a winner is given), posts
+    the winner's bid and every other payer's dividend to the savings ledger
+    and credits them all with one UPDATE, opens the next round and
+    provisions its pending payments with one INSERT ... SELECT.
+    Amounts are integer paise; the dividend is split exactly with
+    money.split(), the remainder going to the lowest user ids.
+
+    Normally every eligible member must have bid; with ``partial`` (used
+    when the bidding deadline has passed) the bids received so far decide.
+    Either way at least two members must have paid, so that the rest of the
+    pool has someone to go to.
+
+    Safe to call more than once: a round that is already completed returns
+    its stored result instead of being settled again.
+
+    Returns (success, result) where result is a dict on success and an error
+    message otherwise.
+    """
+    try:
+        success, result = _settle_locked(round_id, winner_id, winning_bid, partial)
+    except Exception as e:
+        db.session.rollback()
+        return False, str(e)
+
+    # Release the row lock on every path that did not commit a settlement
+    if not success or result.get('already_settled'):
+        db.session.rollback()
+    return success, result
+
+
+def _settle_locked(round_id, winner_id, winning_bid, partial):
+    # Lock the round row and re-read it so concurrent settlements serialize
+    round = Round.query.filter_by(id=round_id).with_for_update().populate_existing().first()
+    if not round:
+        return False, "Round not found"
+
+    chitfund = ChitFund.query.get(round.chitfund_id)
+    if not chitfund:
+        return False, "Chit fund not found"
+
+    if round.status == 'completed':
+        return True, _settled_result(round, chitfund, already_settled=True)
+
+    if round.status != 'bidding':
+        return False, "Round is not in bidding status"
+
+    # The pool less the winning bid is shared among the other payers; with
+    # none it would belong to nobody
+    if round.paid_count < 2:
+        return False, "At least two members must have paid to settle a round"
+
+    if winner_id is None:
+        # Previous winners cannot bid, so every paid member who has not
+        # won yet must have bid before the round can be settled
+        eligible_members = round.paid_count - (round.round_number - 1)
+        if round.bid_count < eligible_members and not partial:
+            if round.round_number > 1:
+                return False, "Not all eligible members have placed their bids"
+            return False, "Not all paid members have placed their bids"
+
+        # Find the winning bid (lowest bid amount)
+        bid = Bid.query.filter_by(
+            round_id=round.id,
+            amount_paise=round.min_bid_paise
+        ).order_by(Bid.id).first()
+        if not bid:
+            return False, "No valid bids found"
+        winner_id, winning_bid = bid.user_id, bid.amount_paise
+    else:
+        winning_bid = to_paise(winning_bid)
+
+    total_pool = round.pooled_amount_paise
+    # Exclude winner from dividend
+    dividend_per_member, remainder = split(total_pool - winning_bid, round.paid_count - 1)
+    now = datetime.utcnow()
+
+    # Claim the round; if another settlement got here first nothing matches
+    claimed = Round.query.filter(
+        Round.id == round.id,
+        Round.status == 'bidding'
+    ).update({
+        Round.status: 'completed',
+        Round.winner_id: winner_id,
+        Round.winning_bid_paise: winning_bid,
+        Round.dividend_per_member_paise: dividend_per_member,
+        Round.end_date: now
+    }, synchronize_session=False)
+    if not claimed:
+        db.session.rollback()
+        round = Round.query.get(round_id)
+        return True, _settled_result(round, chitfund, already_settled=True)
+
+    # Post the winner's bid to the ledger
+    post([{
+        'user_id': winner_id,
+        'chitfund_id': round.chitfund_id,
+        'round_id': round.id,
+        'reason': 'winning_bid',
+        'credit_paise': winning_bid,
+        'debit_paise': 0,
+        'created_at': now
+    }])
+
+    # Post every other payer's dividend in one statement
+    payer_filter = and_(
+        Payment.round_id == round.id,
+        Payment.status == 'completed',
+        Payment.user_id != winner_id
+    )
+    share = literal(dividend_per_member)
+    if remainder:
+        # The leftover paise go one each to the payers with the lowest ids.
+        # The extra derived table is for MySQL, which rejects LIMIT in IN (...)
+        first_payers = select(Payment.user_id).where(payer_filter).order_by(
+            Payment.user_id
+        ).limit(remainder).subquery()
+        share = share + case((Payment.user_id.in_(select(first_payers.c.user_id)), 1), else_=0)
+    if dividend_per_member or remainder:
+        post_from_select(
+            ['user_id', 'chitfund_id', 'round_id', 'reason', 'credit_paise', 'debit_paise', 'created_at'],
+            select(
+                Payment.user_id,
+                literal(round.chitfund_id),
+                literal(round.id),
+                literal('dividend'),
+                share,
+                literal(0),
+                literal(now)
+            ).where(payer_filter)
+        )
+
+    # Credit the winner and the payers from those entries with one UPDATE
+    credit_round(round.id)
+
+    next_round_number = None
+    if round.round_number < chitfund.duration:
+        next_round_number = round.round_number + 1
+        # Collecting payments does not eat into the bidding window:
+        # advance_round() opens bidding, with its deadline, once all are in
+        next_round = Round(
+            chitfund_id=round.chitfund_id,
+            round_number=next_round_number,
+            status='upcoming',
+            start_date=now
+        )
+        db.session.add(next_round)
+        db.session.flush()  # Get next_round.id without committing
+
+        # Provision pending payments for every member
+        db.session.execute(Payment.__table__.insert().from_select(
+            ['chitfund_id', 'round_id', 'user_id', 'amount_paise', 'status', 'created_at'],
+            select(
+                literal(round.chitfund_id),
+                literal(next_round.id),
+                chitfund_members.c.user_id,
+                literal(chitfund.monthly_contribution_paise),
+                literal('pending'),
+                literal(now)
+            ).where(chitfund_members.c.chitfund_id == round.chitfund_id)
+        ))
+
+    # Update chitfund current round
+    chitfund.current_round = next_round_number or round.round_number
+
+    db.session.commit()
+
+    return True, {
+        'winner_id': winner_id,
+        'winning_bid': to_rupees(winning_bid),
+        'total_pool': to_rupees(total_pool),
+        'dividend_per_member': to_rupees(dividend_per_member),
+        'next_round': next_round_number
+    }
+
+
+def advance_round(round_id):
+    """Move a round on once all of its payments are in; call after committing them.
+
+    A regular round opens for bidding, its deadline a full window from now.
+    The final round, which has no bidding, pays the whole pool to the one
+    member who has not won yet. Safe to call again or concurrently: both
+    claim the round with a conditional UPDATE, so each happens once.
+
+    Returns (status, result): ('bidding', {round_id, round_number,
+    bidding_deadline}), ('completed', result dict as from settle_round), or
+    (None, None) if the round stays as it is.
+    """
+    round = Round.query.filter_by(id=round_id).populate_existing().first()
+    if not round or round.status == 'completed':
+        return None, None
+    chitfund = ChitFund.query.get(round.chitfund_id)
+    if round.paid_count < chitfund.member_count:
+        return None, None
+
+    if round.round_number < chitfund.duration:
+        deadline = bidding_deadline(round.round_number, chitfund.duration)
+        opened = Round.query.filter(
+            Round.id == round.id,
+            Round.status == 'upcoming'
+        ).update({
+            Round.status: 'bidding',
+            Round.bidding_deadline: deadline
+        }, synchronize_session=False)
+        db.session.commit()
+        if not opened:
+            return None, None
+        return 'bidding', {
+            'round_id': round.id,
+            'round_number': round.round_number,
+            'bidding_deadline': deadline.isoformat()
+        }
+
+    # The member who has not won yet takes the final round
+    previous_winners = select(Round.winner_id).where(
+        Round.chitfund_id == chitfund.id,
+        Round.status == 'completed',
+        Round.winner_id.isnot(None)
+    )
+    last_member = db.session.query(chitfund_members.c.user_id).filter(
+        chitfund_members.c.chitfund_id == chitfund.id,
+        chitfund_members.c.user_id.notin_(previous_winners)
+    ).order_by(chitfund_members.c.user_id).limit(1).scalar()
+    if last_member is None:
+        db.session.rollback()
+        return None, None
+
+    total_pool = round.pooled_amount_paise
+    now = datetime.utcnow()
+    claimed = Round.query.filter(
+        Round.id == round.id,
+        Round.status != 'completed'
+    ).update({
+        Round.status: 'completed',
+        Round.winner_id: last_member,
+        Round.winning_bid_paise: 0,  # No bid for the last round
+        Round.dividend_per_member_paise: 0,
+        Round.end_date: now
+    }, synchronize_session=False)
+    if not claimed:
+        db.session.rollback()
+        return None, None
+
+    # Post the payout to the ledger and credit it in SQL, so a stale
+    # in-memory balance is never written back
+    post([{
+        'user_id': last_member,
+        'chitfund_id': chitfund.id,
+        'round_id': round.id,
+        'reason': 'final_payout',
+        'credit_paise': total_pool,
+        'debit_paise': 0,
+        'created_at': now
+    }])
+    credit_round(round.id)
+    db.session.commit()
+
+    return 'completed', {
+        'winner_id': last_member,
+        'winning_bid': 0,
+        'total_pool': to_rupees(total_pool),
+        'dividend_per_member': 0,
+        'next_round': None
+    }
@@ -0,0 +1,225 @@
+"""Opt-in per-request SQL profiling (SQL_PROFILING=true).
+
+Engine cursor events time every statement run while a request is being
+handled. For each request the profiler:
+
+- adds a Server-Timing header (``db`` with the query count, ``app`` in total)
+  that browser dev tools show next to the request
+- warns about N+1 patterns, i.e. one statement shape run
+  SQL_NPLUSONE_THRESHOLD or more times
+- logs a "Slow request" record with the slowest statements when the request
+  takes SLOW_REQUEST_MS or longer
+
+Totals per endpoint, and the identity cache's process-wide hit and miss
+counts, are served at /metrics in the Prometheus text format, which requires ``Authorization: Bearer <METRICS_TOKEN>``. Without a
+METRICS_TOKEN, /metrics answers 404.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import identity_cache
+
+logger = logging.getLogger(__name__)
+
+_listening = False
+_sequence = itertools.count()
+
+class RequestProfile:
+    """Statements run during one request"""
+
+    def __init__(self, keep_slowest):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_ms = 0.0
+        self.shapes = {}  # statement text -> times run
+        self.slowest = []  # min-heap of (ms, sequence, statement)
+        self.keep_slowest = keep_slowest
+
+    def record(self, statement, ms):
+        self.query_count += 1
+        self.db_ms += ms
+        self.shapes[statement] = self.shapes.get(statement, 0) + 1
+        entry = (ms, next(_sequence), statement)
+        if len(self.slowest) < self.keep_slowest:
+            heapq.heappush(self.slowest, entry)
+        elif ms > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def slowest_statements(self):
+        return [
+            {'ms': round(ms, 2), 'statement': statement}
+            for ms, _, statement in sorted(self.slowest, reverse=True)
+        ]
+
+    def repeated_shapes(self, threshold):
+        """Statements run at least `threshold` times, most repeated first"""
+        repeated = [(count, statement) for statement, count in self.shapes.items() if count >= threshold]
+        return sorted(repeated, reverse=True)
+
+class EndpointMetrics:
+    """Process-wide totals per endpoint"""
+
+    FIELDS = ('requests', 'duration_ms', 'queries', 'db_ms', 'max_queries', 'n_plus_one', 'slow')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def add(self, endpoint, duration_ms, profile, n_plus_one, slow):
+        with self._lock:
+            totals = self._endpoints.setdefault(endpoint, dict.fromkeys(self.FIELDS, 0))
+            totals['requests'] += 1
+            totals['duration_ms'] += duration_ms
+            totals['queries'] += profile.query_count
+            totals['db_ms'] += profile.db_ms
+            totals['max_queries'] = max(totals['max_queries'], profile.query_count)
+            totals['n_plus_one'] += bool(n_plus_one)
+            totals['slow'] += bool(slow)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: dict(totals) for endpoint, totals in self._endpoints.items()}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+metrics = EndpointMetrics()
+
+# (metric name, type, help, field)
+PROMETHEUS_METRICS = [
+    ('sakhi_requests_total', 'counter', 'Requests served', 'requests'),
+    ('sakhi_request_duration_ms_total', 'counter', 'Time spent handling requests', 'duration_ms'),
+    ('sakhi_db_queries_total', 'counter', 'SQL statements executed', 'queries'),
+    ('sakhi_db_time_ms_total', 'counter', 'Time spent in SQL statements', 'db_ms'),
+    ('sakhi_db_queries_max', 'gauge', 'Most SQL statements seen in one request', 'max_queries'),
+    ('sakhi_n_plus_one_requests_total', 'counter', 'Requests that repeated a statement shape', 'n_plus_one'),
+    ('sakhi_slow_requests_total', 'counter', 'Requests over SLOW_REQUEST_MS', 'slow'),
+]
+
+# (metric name, help, stats() key) for identity_cache.stats()
+IDENTITY_CACHE_METRICS = [
+    ('sakhi_identity_cache_hits_total', 'Primary-key lookups served from the request identity map', 'hits'),
+    ('sakhi_identity_cache_misses_total', 'Primary-key lookups that queried the database', 'misses'),
+    ('sakhi_profile_cache_hits_total', 'Session user profiles served from the PROFILE_CACHE_TTL cache', 'profile_hits'),
+    ('sakhi_profile_cache_misses_total', 'Session user profiles loaded from the database', 'profile_misses'),
+]
+
+def render_prometheus(snapshot, cache_stats=None):
+    lines = []
+    for name, metric_type, help_text, field in PROMETHEUS_METRICS:
+        lines.append(f'# HELP {name} {help_text}, by endpoint')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for endpoint, totals in sorted(snapshot.items()):
+            value = totals[field]
+            value = f'{value:.3f}' if isinstance(value, float) else value
+            lines.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+    for name, help_text, key in IDENTITY_CACHE_METRICS if cache_stats else ():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name} {cache_stats[key]}')
+    return '\n'.join(lines) + '\n'
+
+def _current_profile():
+    if has_request_context():
+        return g.get('sql_profile')
+    return None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile() is not None:
+        conn.info.setdefault('sql_profile_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('sql_profile_started')
+    if not started:
+        return
+    ms = (time.perf_counter() - started.pop()) * 1000
+    profile = _current_profile()
+    if profile is not None:
+        profile.record(statement, ms)
+
+def _handle_error(context):
+    # after_cursor_execute never runs for a failed statement, so pop its start
+    # here; otherwise the next statement on the connection gets the wrong one
+    if context.connection is None or context.statement is None:
+        return
+    started = context.connection.info.get('sql_profile_started')
+    if not started:
+        return
+    ms = (time.perf_counter() - started.pop()) * 1000
+    profile = _current_profile()
+    if profile is not None:
+        profile.record(context.statement, ms)
+
+def _listen():
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening = True
+
+def init_app(app):
+    if not app.config['SQL_PROFILING']:
+        return
+    _listen()
+
+    keep_slowest = app.config['SQL_PROFILE_SLOWEST']
+    threshold = app.config['SQL_NPLUSONE_THRESHOLD']
+    slow_ms = app.config['SLOW_REQUEST_MS']
+    token = app.config['METRICS_TOKEN']
+
+    @app.before_request
+    def start_sql_profile():
+        g.sql_profile = RequestProfile(keep_slowest)
+
+    @app.after_request
+    def finish_sql_profile(response):
+        profile = g.pop('sql_profile', None)
+        if profile is None or request.endpoint == 'sql_profiler_metrics':
+            return response
+
+        duration_ms = (time.perf_counter() - profile.started) * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={profile.db_ms:.2f};desc="{profile.query_count} queries", app;dur={duration_ms:.2f}'
+        )
+
+        fields = {
+            'route': request.url_rule.rule if request.url_rule else None,
+            'endpoint': request.endpoint,
+            'query_count': profile.query_count,
+            'db_ms': round(profile.db_ms, 2),
+            'duration_ms': round(duration_ms, 2),
+        }
+
+        repeated = profile.repeated_shapes(threshold)
+        for count, statement in repeated:
+            logger.warning('Repeated query shape (possible N+1)', extra=dict(
+                fields, times=count, statement=statement
+            ))
+
+        slow = duration_ms >= slow_ms
+        if slow:
+            logger.warning('Slow request', extra=dict(
+                fields, slowest_queries=profile.slowest_statements()
+            ))
+
+        metrics.add(request.endpoint or 'unknown', duration_ms, profile, repeated, slow)
+        return response
+
+    @app.route('/metrics', endpoint='sql_profiler_metrics')
+    def sql_profiler_metrics():
+        if not token:
+            abort(404)
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+        return Response(
+            render_prometheus(metrics.snapshot(), identity_cache.stats()),
+            mimetype='text/plain; version=0.0.4'
+        )
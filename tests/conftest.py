@@ -0,0 +1,90 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import create_app
+from fund_creation import create_funds
+from models import db, User
+
+PASSWORD = 'test-password'
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a fresh SQLite file (a file, so threads share it), with jobs run inline"""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'TESTING': True,
+        'SECRET_KEY': 'test',
+        'JOBS_INLINE': True,
+        'DEADLINE_SCHEDULER': False,
+        'PASSWORD_WORKERS': 0,
+        'PASSWORD_COST': 1000,
+        'LOG_REQUESTS': False,
+        'LOG_LEVEL': 'WARNING',
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def make_users(app):
+    """make_users(count) -> user ids of new members user0, user1, ..."""
+    def make_users(count):
+        start = User.query.count()
+        users = [
+            User(username=f'user{i}', full_name=f'User {i}', mobile_number=f'9{i:09d}', savings=0.0)
+            for i in range(start, start + count)
+        ]
+        for user in users:
+            user.set_password(PASSWORD)
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+    return make_users
+
+@pytest.fixture
+def make_fund(app):
+    """make_fund(member_ids, contribution_paise=100000) -> chit fund id; the first member creates it"""
+    def make_fund(member_ids, contribution_paise=100000, name='Test fund'):
+        ok, created = create_funds(member_ids[0], [{
+            'name': name,
+            'member_ids': list(member_ids),
+            'monthly_contribution_paise': contribution_paise,
+            'duration': len(member_ids)
+        }])
+        assert ok, created
+        return created[0]['chitfund_id']
+    return make_fund
+
+@pytest.fixture
+def login(app):
+    """login(user_id) -> a test client with that user's session"""
+    def login(user_id):
+        client = app.test_client()
+        username = db.session.get(User, user_id).username
+        response = client.post('/login', data={'username': username, 'password': PASSWORD})
+        assert response.status_code == 302
+        return client
+    return login
+
+@pytest.fixture
+def count_queries(app):
+    """with count_queries() as statements: ... -> the SQL statements run in the block"""
+    @contextmanager
+    def count_queries():
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return count_queries
@@ -0,0 +1,55 @@
+import threading
+import uuid
+from models import db, Bid, Job, Payment, Round
+from settlement import advance_round
+
+def _open_round(fund_id):
+    round = Round.query.filter_by(chitfund_id=fund_id, round_number=1).one()
+    for payment in Payment.query.filter_by(round_id=round.id).all():
+        payment.mark_completed()
+    db.session.commit()
+    status, _ = advance_round(round.id)
+    assert status == 'bidding'
+    return round.id, round.pooled_amount
+
+def test_concurrent_final_bids_settle_the_round_once(make_users, make_fund, login):
+    member_ids = make_users(8)
+    fund_id = make_fund(member_ids)
+    round_id, pool = _open_round(fund_id)
+    clients = [login(user_id) for user_id in member_ids]
+    db.session.remove()  # Release the fixture's connection to the threads
+
+    # Every member bids at the same moment, and every bid is sent twice with
+    # the same idempotency key to mimic a client retry
+    barrier = threading.Barrier(len(clients) * 2)
+    responses = []
+    lock = threading.Lock()
+
+    def bid(client, amount, key):
+        barrier.wait()
+        response = client.post('/api/place_bid', json={
+            'chitfund_id': fund_id,
+            'round_id': round_id,
+            'amount': amount
+        }, headers={'Idempotency-Key': key})
+        with lock:
+            responses.append((response.status_code, response.get_json()))
+
+    threads = []
+    for i, client in enumerate(clients):
+        key = str(uuid.uuid4())
+        for _ in range(2):
+            threads.append(threading.Thread(target=bid, args=(client, pool / 2 + i, key)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [status for status, _ in responses] == [200] * len(threads)
+    assert any(body.get('round_completed') for _, body in responses)
+
+    assert Bid.query.filter_by(round_id=round_id).count() == len(member_ids)
+    assert Job.query.filter_by(dedup_key=f'settle:{round_id}').count() == 1
+    assert Round.query.filter_by(chitfund_id=fund_id, status='completed').count() == 1
+    assert db.session.get(Round, round_id).status == 'completed'
+    assert Round.query.filter_by(chitfund_id=fund_id).count() == 2
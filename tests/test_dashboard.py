@@ -0,0 +1,58 @@
+from models import db, User, Round, Payment
+from dashboard_loader import load_dashboard_funds
+from settlement import advance_round, settle_round
+
+# A dashboard render, or a fund card refresh: the session user, the missing
+# pending payments check, then funds, rounds, payments and bids
+QUERIES_PER_RENDER = 6
+
+def _play_first_round(fund_id, winner_id):
+    """Pay every member in and settle round 1, so the fund has history"""
+    round = Round.query.filter_by(chitfund_id=fund_id, round_number=1).one()
+    for payment in Payment.query.filter_by(round_id=round.id):
+        payment.mark_completed()
+    db.session.commit()
+    advance_round(round.id)
+    success, result = settle_round(round.id, winner_id=winner_id, winning_bid=2500, partial=True)
+    assert success, result
+
+def _member_of(count, make_users, make_fund):
+    """A user in `count` funds (each with two other members), one round played in each"""
+    user_id, *others = make_users(3)
+    for number in range(count):
+        fund_id = make_fund([user_id] + others, name=f'Fund {number}')
+        _play_first_round(fund_id, others[0])
+    return db.session.get(User, user_id)
+
+def _load_dashboard(app, user, count_queries):
+    db.session.refresh(user)  # Fresh, as a request's user is, not expired by the setup's commits
+    with app.test_request_context(), count_queries() as statements:
+        funds = load_dashboard_funds(user)
+    return len(funds), len(statements)
+
+def test_dashboard_queries_do_not_grow_with_funds(app, make_users, make_fund, count_queries):
+    one = _member_of(1, make_users, make_fund)
+    many = _member_of(8, make_users, make_fund)
+
+    one_funds, one_queries = _load_dashboard(app, one, count_queries)
+    many_funds, many_queries = _load_dashboard(app, many, count_queries)
+
+    assert (one_funds, many_funds) == (1, 8)
+    assert one_queries == many_queries
+
+def _render(app, client, url, count_queries):
+    # A fresh app context (and so flask.g) and an empty session, as every request has
+    db.session.remove()
+    with app.app_context(), count_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200
+    return len(statements)
+
+def test_queries_per_dashboard_render_are_pinned(app, make_users, make_fund, login, count_queries):
+    for fund_count in (1, 8):
+        user = _member_of(fund_count, make_users, make_fund)
+        client = login(user.id)
+        fund_id = user.member_funds[0].id
+
+        assert _render(app, client, '/dashboard', count_queries) == QUERIES_PER_RENDER
+        assert _render(app, client, f'/api/fund/{fund_id}/state', count_queries) == QUERIES_PER_RENDER
@@ -0,0 +1,65 @@
+import sys
+import pytest
+from events import broker
+from models import db, Round
+
+@pytest.fixture
+def max_streams(app):
+    app.config['EVENT_MAX_STREAMS'] = 2
+    yield 2
+    assert broker.open_streams() == 0
+
+def test_streams_beyond_the_limit_get_a_503(max_streams, make_users, login):
+    clients = [login(user_id) for user_id in make_users(max_streams + 1)]
+    streams = [client.get('/api/events', buffered=False) for client in clients[:max_streams]]
+    assert [stream.status_code for stream in streams] == [200] * max_streams
+    assert broker.open_streams() == max_streams
+
+    refused = clients[-1].get('/api/events')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == '60'
+    assert 'polling' in refused.get_json()['error']
+
+    # A client that disconnects frees its slot
+    streams[0].close()
+    assert broker.open_streams() == max_streams - 1
+    stream = clients[-1].get('/api/events', buffered=False)
+    assert stream.status_code == 200
+    for stream in [stream] + streams[1:]:
+        stream.close()
+
+def test_last_payment_publishes_round_opened_with_its_deadline(make_users, make_fund, login):
+    member_ids = make_users(2)
+    fund_id = make_fund(member_ids)
+    round_id = Round.query.filter_by(chitfund_id=fund_id, round_number=1).one().id
+    subscription = broker.subscribe(member_ids[0])
+    try:
+        for user_id in member_ids:
+            response = login(user_id).post('/api/make_payment', json={'chitfund_id': fund_id, 'round_id': round_id})
+            assert response.status_code == 200
+        events = []
+        while (event := subscription.get(timeout=0)) is not None:
+            events.append(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+    opened = [event['data'] for event in events if event['type'] == 'round_opened']
+    deadline = db.session.get(Round, round_id).bidding_deadline
+    assert opened == [{
+        'chitfund_id': fund_id,
+        'round_id': round_id,
+        'round_number': 1,
+        'bidding_deadline': deadline.isoformat()
+    }]
+
+def test_gevent_workers_raise_the_stream_limit(monkeypatch, tmp_path):
+    import types
+    from config import load_config
+    assert load_config(str(tmp_path))['EVENT_MAX_STREAMS'] == 16
+
+    monkey = types.SimpleNamespace(is_module_patched=lambda name: name == 'socket')
+    monkeypatch.setitem(sys.modules, 'gevent.monkey', monkey)
+    config = load_config(str(tmp_path))
+    assert config['EVENT_MAX_STREAMS'] == 3000
+    assert config['JOBS_WORKERS'] == 0
+    assert config['PASSWORD_POOL'] == 'process'
@@ -0,0 +1,84 @@
+import pytest
+import forecast
+import jobs
+from models import Job
+from money import split
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    forecast._cache.clear()
+    yield
+    forecast._cache.clear()
+
+def test_scenario_counts_are_rounded_to_steps_and_capped_by_cost(app):
+    app.config.update(FORECAST_SCENARIOS=2000, FORECAST_MAX_COST=50_000_000)
+    assert forecast.scenario_count(10) == 2000
+    assert forecast.scenario_count(10, 1) == 500
+    assert forecast.scenario_count(10, 1234) == 2000
+    assert forecast.scenario_count(10, 10 ** 9) == 20000
+    # 2000 x 300^2 is over the cap, so the default comes down to the largest step under it
+    assert forecast.scenario_count(300) == 500
+    with pytest.raises(ValueError):
+        forecast.scenario_count(100, 20000)
+    with pytest.raises(ValueError):
+        forecast.scenario_count(400)
+
+def test_forecast_for_members_only(make_users, make_fund, login):
+    member_ids = make_users(4)
+    outsider_id, = make_users(1)
+    fund_id = make_fund(member_ids)
+
+    response = login(member_ids[1]).get(f'/api/fund/{fund_id}/forecast')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['scenarios'] == 2000
+    assert len(data['by_round']) == 4
+    assert data['you']['user_id'] == member_ids[1]
+    assert data['by_round'][-1]['payout']['mean'] == 4000.0  # The last member takes the pool
+
+    assert login(outsider_id).get(f'/api/fund/{fund_id}/forecast').status_code == 404
+
+def test_odd_scenario_counts_share_a_cache_entry(make_users, make_fund, login):
+    member_ids = make_users(3)
+    client = login(member_ids[0])
+    fund_id = make_fund(member_ids)
+
+    for scenarios in (1500, 1999, 2000):
+        assert client.get(f'/api/fund/{fund_id}/forecast?scenarios={scenarios}').status_code == 200
+    assert forecast.stats()['size'] == 1
+    assert client.get(f'/api/fund/{fund_id}/forecast?scenarios=lots').status_code == 400
+
+def test_large_forecast_runs_as_a_job(app, make_users, make_fund, login):
+    app.config.update(FORECAST_INLINE_COST=0, JOBS_INLINE=False)
+    member_ids = make_users(3)
+    client = login(member_ids[0])
+    fund_id = make_fund(member_ids)
+
+    response = client.get(f'/api/fund/{fund_id}/forecast')
+    assert response.status_code == 202
+    assert client.get(f'/api/fund/{fund_id}/forecast').status_code == 202
+    assert Job.query.filter_by(kind='forecast').count() == 1
+
+    assert jobs.run_next('test')
+    forecast._cache.clear()  # Served from the job's stored result, as another process would be
+    response = client.get(f'/api/fund/{fund_id}/forecast')
+    assert response.status_code == 200
+    assert len(response.get_json()['by_member']) == 3
+
+def test_simulated_dividends_are_split_like_settlement():
+    contribution, pool = 100001, 4 * 100001
+    # Every bidding round settled: (winner index, winning bid in paise)
+    history = ((2, 300002), (0, 310000), (3, 350003))
+    params = forecast.ForecastParams(4, contribution, history, forecast.calibrate([]), 10, 0)
+    _, payout, received, net, _ = forecast.member_outcomes(params, *forecast.simulate(params))
+
+    expected = [0] * 4
+    for winner, bid in history:
+        base, remainder = split(pool - bid, 3)
+        others = [member for member in range(4) if member != winner]
+        for rank, member in enumerate(others):
+            expected[member] += base + (rank < remainder)
+    assert received[0].tolist() == expected
+    assert payout[0].tolist() == [310000, pool, 300002, 350003]
+    # Every paisa paid in is paid out
+    assert (payout + received).sum(axis=1).tolist() == [4 * pool] * 10
@@ -0,0 +1,35 @@
+import io
+from models import db, User, Payment, Round
+from payment_import import import_statement
+
+def _statement(*lines):
+    return io.StringIO('Date,UTR,Credit,Mobile\n' + ''.join(f'{line}\n' for line in lines))
+
+def test_pending_payment_completed_by_its_reference(make_users, make_fund):
+    member_ids = make_users(3)
+    fund_id = make_fund(member_ids)
+    payment = Payment.query.filter_by(chitfund_id=fund_id, user_id=member_ids[1]).one()
+    payment.transaction_id = 'UTR123'  # Given by the payer before the money arrived
+    db.session.commit()
+
+    # No payer on the line: only the reference can match it
+    summary = import_statement(_statement('2024-05-01,UTR123,1000.00,'), fund_id=fund_id)
+
+    assert summary['completed'] == 1
+    assert summary['duplicate'] == 0
+    payment = db.session.get(Payment, payment.id)
+    assert payment.status == 'completed'
+    assert db.session.get(Round, payment.round_id).paid_count == 1
+
+def test_reimport_completes_nothing_twice(make_users, make_fund):
+    member_ids = make_users(3)
+    fund_id = make_fund(member_ids)
+    payer = db.session.get(User, member_ids[2])
+    statement = f'2024-05-01,UTR9,1000.00,{payer.mobile_number}'
+
+    first = import_statement(_statement(statement), fund_id=fund_id)
+    second = import_statement(_statement(statement), fund_id=fund_id)
+
+    assert first['completed'] == 1
+    assert second['completed'] == 0
+    assert second['duplicate'] == 1
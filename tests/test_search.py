@@ -0,0 +1,75 @@
+import threading
+import pytest
+from sqlalchemy import event
+from models import db, User
+from search_index import member_index, search_members
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    member_index.reset()
+    yield
+    member_index.reset()
+
+def _add_user(username, full_name, mobile_number):
+    # Inserted directly, as a registration on another worker would be
+    user = User(username=username, full_name=full_name, mobile_number=mobile_number, savings=0.0)
+    user.set_password('test-password')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def test_search_matches_term_prefixes(app):
+    priya = _add_user('priya', 'Priya Sharma', '9876543210')
+    anu = _add_user('anu', 'Anu Priya', '9123456789')
+
+    assert [user.id for user in search_members('pri')] == [priya, anu]
+    assert [user.id for user in search_members('98765')] == [priya]
+    assert search_members('iya') == []  # Not a substring search
+    assert search_members('6543') == []
+
+def test_refresh_queries_outside_the_index_lock(app):
+    first = _add_user('first', 'First Member', '9000000001')
+    assert [user.id for user in search_members('first')] == [first]
+    second = _add_user('second', 'Second Member', '9000000002')
+
+    lock_free = []
+
+    def try_lock():
+        acquired = member_index._lock.acquire(timeout=1)
+        if acquired:
+            member_index._lock.release()
+        lock_free.append(acquired)
+
+    def check_lock(conn, cursor, statement, *args):
+        if 'FROM user' in statement:
+            # Another thread must be able to search while the refresh query runs
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+
+    event.listen(db.engine, 'before_cursor_execute', check_lock)
+    try:
+        member_index.refresh(force=True)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', check_lock)
+
+    assert lock_free == [True]
+    assert [user.id for user in search_members('second')] == [second]
+    assert member_index.search('first') == [first]  # Not indexed twice
+    assert len(member_index) == 2 * 4  # Username, full name, last name and mobile of each
+
+def test_refresh_finds_ids_committed_out_of_order(app):
+    first = _add_user('first', 'First Member', '9000000001')
+    # Id first + 2 commits before first + 1, as a slow MySQL transaction can
+    late, early = first + 1, first + 2
+    db.session.add(User(id=early, username='early', full_name='Early Member', mobile_number='9000000003', savings=0.0))
+    db.session.commit()
+    assert [user.id for user in search_members('early')] == [early]
+
+    db.session.add(User(id=late, username='late', full_name='Late Member', mobile_number='9000000002', savings=0.0))
+    db.session.commit()
+    member_index.refresh(force=True)
+
+    assert member_index.search('late') == [late]
+    assert member_index.search('early') == [early]  # Not indexed twice
+    assert len(member_index) == 3 * 4
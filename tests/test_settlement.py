@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from models import db, ChitFund, Round, Payment, LedgerEntry
+from settlement import advance_round, settle_round
+
+def _pay_all(round_id):
+    payments = Payment.query.filter_by(round_id=round_id).all()
+    for payment in payments:
+        payment.mark_completed()
+    db.session.commit()
+    return advance_round(round_id)
+
+def _current_round(fund_id):
+    fund = db.session.get(ChitFund, fund_id)
+    return Round.query.filter_by(chitfund_id=fund_id, round_number=fund.current_round).one()
+
+def test_rounds_open_for_bidding_when_the_last_payment_arrives(app, make_users, make_fund):
+    fund_id = make_fund(make_users(3))
+    first = _current_round(fund_id)
+    assert first.status == 'upcoming'
+    assert first.bidding_deadline is None
+
+    # One payment short: still collecting, no deadline running
+    payments = Payment.query.filter_by(round_id=first.id).order_by(Payment.user_id).all()
+    for payment in payments[:-1]:
+        payment.mark_completed()
+    db.session.commit()
+    assert advance_round(first.id) == (None, None)
+    assert db.session.get(Round, first.id).bidding_deadline is None
+
+    opened_at = datetime.utcnow()
+    payments[-1].mark_completed()
+    db.session.commit()
+    status, opened = advance_round(first.id)
+    assert advance_round(first.id) == (None, None)  # Opened once
+
+    first = Round.query.populate_existing().get(first.id)
+    window = timedelta(hours=app.config['BIDDING_WINDOW_HOURS'])
+    assert status == 'bidding'
+    assert opened == {
+        'round_id': first.id,
+        'round_number': 1,
+        'bidding_deadline': first.bidding_deadline.isoformat()
+    }
+    assert first.status == 'bidding'
+    assert opened_at + window <= first.bidding_deadline <= datetime.utcnow() + window
+
+def test_next_round_waits_for_its_payments(make_users, make_fund):
+    member_ids = make_users(3)
+    fund_id = make_fund(member_ids)
+    first = _current_round(fund_id)
+    _pay_all(first.id)
+
+    success, result = settle_round(first.id, winner_id=member_ids[0], winning_bid=2500, partial=True)
+    assert success, result
+
+    second = _current_round(fund_id)
+    assert second.round_number == 2
+    assert second.status == 'upcoming'
+    assert second.bidding_deadline is None
+
+def test_round_with_a_single_payer_is_not_settled(make_users, make_fund):
+    member_ids = make_users(3)
+    fund_id = make_fund(member_ids)
+    round = _current_round(fund_id)
+    Payment.query.filter_by(round_id=round.id, user_id=member_ids[0]).one().mark_completed()
+    round.status = 'bidding'
+    db.session.commit()
+
+    success, result = settle_round(round.id, winner_id=member_ids[0], winning_bid=500, partial=True)
+
+    assert not success
+    assert 'two members' in result
+    round = Round.query.populate_existing().get(round.id)
+    assert round.status == 'bidding'
+    assert LedgerEntry.query.filter_by(round_id=round.id).count() == 0
@@ -0,0 +1,56 @@
+import pytest
+from flask import g
+from sqlalchemy.exc import OperationalError
+import identity_cache
+from app import create_app
+from models import db
+from sql_profiler import RequestProfile
+
+@pytest.fixture
+def profiled_app(tmp_path):
+    def profiled_app(**config):
+        return create_app(dict({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'profiled.db'}",
+            'TESTING': True,
+            'SECRET_KEY': 'test',
+            'DEADLINE_SCHEDULER': False,
+            'PASSWORD_WORKERS': 0,
+            'LOG_REQUESTS': False,
+            'LOG_LEVEL': 'WARNING',
+            'SQL_PROFILING': True,
+        }, **config))
+    return profiled_app
+
+def test_metrics_are_hidden_without_a_token(profiled_app):
+    client = profiled_app(METRICS_TOKEN=None).test_client()
+    assert client.get('/metrics').status_code == 404
+
+def test_metrics_require_the_token(profiled_app):
+    client = profiled_app(METRICS_TOKEN='secret').test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+def test_metrics_report_identity_cache_counters(profiled_app):
+    client = profiled_app(METRICS_TOKEN='secret').test_client()
+    before = identity_cache.stats()
+    body = client.get('/metrics', headers={'Authorization': 'Bearer secret'}).get_data(as_text=True)
+    assert f"sakhi_identity_cache_hits_total {before['hits']}\n" in body
+    assert f"sakhi_identity_cache_misses_total {before['misses']}\n" in body
+    assert '# TYPE sakhi_profile_cache_hits_total counter' in body
+
+def test_failed_statement_does_not_skew_later_timings(profiled_app):
+    app = profiled_app()
+    with app.test_request_context():
+        g.sql_profile = profile = RequestProfile(keep_slowest=3)
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(db.text('SELECT * FROM no_such_table'))
+            assert conn.info.get('sql_profile_started') == []
+            conn.execute(db.text('SELECT 1'))
+            assert conn.info.get('sql_profile_started') == []
+
+    assert profile.query_count == 2
+    assert profile.shapes == {'SELECT * FROM no_such_table': 1, 'SELECT 1': 1}
@@ -0,0 +1,24 @@
+"""Startup-optimized WSGI entry point (used by vercel.json).
+
+Importing this module only pulls in the standard library. Flask, SQLAlchemy,
+the models and the routes are imported, and the app is built, when the first
+request arrives; the database engine is created later still, on the first
+query. Nothing here writes to the filesystem.
+"""
+import threading
+
+_app = None
+_lock = threading.Lock()
+
+def get_app():
+    """Build the Flask app once, on first use"""
+    global _app
+    if _app is None:
+        with _lock:
+            if _app is None:
+                from app import create_app
+                _app = create_app()
+    return _app
+
+def app(environ, start_response):
+    return get_app()(environ, start_response)